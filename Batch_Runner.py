@@ -0,0 +1,216 @@
+"""This module runs filter jobs without asking the user for any input. A job describes everything that
+Meteorite_Filter.get_input_from_user() would normally collect at runtime. Jobs can be read from a JSON or CSV job file
+so that many filters can be scripted, and every data file is only read once no matter how many jobs use it"""
+import csv
+import json
+import math
+import os
+from Meteorite_Filter import *
+
+job_fields = ['file', 'parameter', 'lower_bound', 'upper_bound', 'output_format']
+# a job with conditions in "where" or a "nearest" search only needs these fields, since the parameter and bounds
+# become optional
+query_job_fields = ['file', 'output_format']
+# the fields of a job that must be text when they are given, and the fields that may be text or a number
+text_job_fields = ['file', 'parameter', 'output_format', 'group_by']
+number_job_fields = ['lower_bound', 'upper_bound', 'limit']
+
+
+def read_jobs_from_file(job_file_name):
+    """Reads a list of jobs from a job file. A .json file must hold either a list of job objects or an object with a
+    "jobs" list. Any other file is read as CSV with a header row naming the job fields. Either kind of job may also
+    have a "where" field of query conditions, given as a list in JSON or separated by semicolons in CSV, and a
+    "nearest" field of "latitude,longitude,count" to keep only the meteorites closest to a point, and a "group_by"
+    field to output a summary table instead of the meteorites. A "limit" field prints only that many rows of a
+    "console table".
+    Returns a list of jobs, which are checked one at a time when they are run. Raises a ValueError if a .json file is
+    not valid JSON or does not hold a list of jobs"""
+    with open(job_file_name, newline='') as job_file:
+        if job_file_name.lower().endswith('.json'):
+            try:
+                jobs = json.load(job_file)
+            except json.JSONDecodeError as error:
+                raise ValueError(f'"{job_file_name}" is not valid JSON: {error}') from None
+            if isinstance(jobs, dict):
+                jobs = jobs.get('jobs', [])
+            if not isinstance(jobs, list):
+                raise ValueError(f'"{job_file_name}" does not hold a list of jobs')
+            return jobs
+        return list(csv.DictReader(job_file))
+
+
+def check_job_types(job):
+    """Raises a ValueError if a job is not a dictionary or if one of its fields has a type that no valid job can have,
+    such as a number where a file name belongs. JSON jobs can hold any type, while CSV jobs only ever hold text. The
+    values of the fields are checked afterwards by Batch_Runner.create_filter_from_job()"""
+    if not isinstance(job, dict):
+        raise ValueError('a job must be an object of job fields')
+    for field in text_job_fields:
+        if job.get(field) is not None and not isinstance(job[field], str):
+            raise ValueError(f'{field} must be text')
+    for field in number_job_fields:
+        if job.get(field) is not None and not _is_text_or_number(job[field]):
+            raise ValueError(f'{field} must be a number')
+    where = job.get('where')
+    if where is not None and not isinstance(where, str) and \
+            not (isinstance(where, list) and all(isinstance(condition, str) for condition in where)):
+        raise ValueError('where must be text or a list of conditions')
+    nearest = job.get('nearest')
+    if nearest is not None and not isinstance(nearest, str) and \
+            not (isinstance(nearest, list) and all(_is_text_or_number(value) for value in nearest)):
+        raise ValueError('nearest must be text or a list of a latitude, longitude and count')
+
+
+class Batch_Runner:
+    """A Batch_Runner keeps every meteorite table it loads so that later jobs on the same file can be run against
+    the data that is already in memory"""
+    def __init__(self, streaming=False, worker_count=1, use_cache=True, backend='python', statistics=False,
+                 group_by=None, result_cache=None, console_limit=None, console_page_size=None):
+        """loaded_tables maps the absolute path of each data file to the Meteorite_Table that was read from it, and
+        sharded_catalogs maps each folder or glob pattern of shards to its Sharded_Catalog.
+        When streaming is True, nothing is kept in memory and every job streams its file straight to its output
+        instead. worker_count is the number of processes used to parse each file, and use_cache turns the on-disk
+        cache of parsed files on or off. backend chooses how filters are worked out, and statistics prints a summary
+        of each job's results after they are output. group_by outputs a summary table grouped by that column in place
+        of the meteorites of every job that does not have a "group_by" field of its own. A Result_Cache given as
+        result_cache is shared by every job, so a job repeating an earlier filter is answered from memory.
+        console_limit and console_page_size set how many rows a "console table" shows and how often it is paged,
+        unless a job has a "limit" field of its own"""
+        self.loaded_tables = {}
+        self.sharded_catalogs = {}
+        self.streaming = streaming
+        self.worker_count = worker_count
+        self.use_cache = use_cache
+        self.backend = backend
+        self.statistics = statistics
+        self.group_by = group_by
+        self.result_cache = result_cache
+        self.console_limit = console_limit
+        self.console_page_size = console_page_size
+
+    def run_jobs(self, jobs):
+        """Runs every job in order. A job that is not valid prints an error message and is skipped so that the rest
+        of the jobs can still run. Returns the number of jobs that completed"""
+        completed_jobs = 0
+        for job_number in range(len(jobs)):
+            try:
+                self.run_job(jobs[job_number])
+                completed_jobs = completed_jobs + 1
+            except (ValueError, OSError) as error:
+                print(f'ERROR: job {job_number + 1} skipped: {error}')
+        if self.result_cache is not None and len(jobs) > 1:
+            statistics = self.result_cache.get_statistics()
+            print(f'Result cache: {statistics["hits"]} hits, {statistics["misses"]} misses')
+        return completed_jobs
+
+    def run_job(self, job):
+        """Filters and outputs the data for a single job, returning the Meteorite_Filter that was used"""
+        meteorite_filter = self.create_filter_from_job(job)
+        if self.streaming and meteorite_filter.nearest is not None:
+            raise ValueError('a nearest meteorite search needs the whole file loaded and can not be streamed')
+        if self.streaming and meteorite_filter.group_by is not None:
+            meteorite_filter.output_group_summary(
+                meteorite_filter.create_group_summary(meteorite_filter.stream_filtered_meteorites()))
+            return meteorite_filter
+        if self.streaming:
+            meteorite_filter.stream_meteorite_list()
+            return meteorite_filter
+        meteorite_filter.meteorite_table = self.get_meteorite_table(meteorite_filter)
+        meteorite_filter.filter_meteorite_list()
+        if meteorite_filter.group_by is not None:
+            meteorite_filter.output_group_summary(meteorite_filter.create_group_summary())
+        else:
+            meteorite_filter.output_meteorite_list()
+        if self.statistics:
+            meteorite_filter.print_statistics()
+        return meteorite_filter
+
+    def get_meteorite_table(self, meteorite_filter):
+        """Returns the table for the filter's file, only reading the file if no earlier job has loaded it already. The
+        shards of a folder or glob pattern are kept in a Sharded_Catalog instead, since each job may need a different
+        set of them, and every shard is still only read once"""
+        table_key = os.path.abspath(meteorite_filter.file_name)
+        if is_shard_pattern(meteorite_filter.file_name):
+            if table_key not in self.sharded_catalogs:
+                self.sharded_catalogs[table_key] = meteorite_filter.get_sharded_catalog()
+            meteorite_filter.sharded_catalog = self.sharded_catalogs[table_key]
+            meteorite_filter.create_meteorite_list()
+            return meteorite_filter.meteorite_table
+        if table_key not in self.loaded_tables:
+            meteorite_filter.create_meteorite_list()
+            self.loaded_tables[table_key] = meteorite_filter.meteorite_table
+        return self.loaded_tables[table_key]
+
+    def create_filter_from_job(self, job):
+        """Creates a Meteorite_Filter with all of its settings taken from a job instead of from user input.
+        Raises a ValueError describing the first setting that is not valid"""
+        check_job_types(job)
+        where = job.get('where') or []
+        if isinstance(where, str):
+            where = [condition for condition in where.split(';') if condition.strip()]
+        required_fields = job_fields
+        nearest = job.get('nearest')
+        if (where or nearest) and job.get('parameter') in (None, ''):
+            required_fields = query_job_fields
+        missing_fields = [field for field in required_fields if job.get(field) in (None, '')]
+        if missing_fields:
+            raise ValueError(f'missing {", ".join(missing_fields)}')
+        meteorite_filter = Meteorite_Filter()
+        meteorite_filter.file_name = job['file']
+        meteorite_filter.file_mode = 'r'
+        meteorite_filter.worker_count = self.worker_count
+        meteorite_filter.use_cache = self.use_cache
+        meteorite_filter.backend = self.backend
+        meteorite_filter.result_cache = self.result_cache
+        if not is_file_name(meteorite_filter.file_name) and not is_shard_file_name(meteorite_filter.file_name):
+            raise ValueError(f'"{meteorite_filter.file_name}" is not a valid file name')
+        if required_fields is job_fields:
+            self.set_filtering_parameter_from_job(meteorite_filter, job)
+        if where:
+            meteorite_filter.query = Meteorite_Query([parse_predicate(condition) for condition in where])
+            if meteorite_filter.filtering_parameter is not None:
+                meteorite_filter.query.add_predicate(Range_Predicate(
+                    meteorite_filter.filtering_parameter, meteorite_filter.lower_bound, meteorite_filter.upper_bound))
+        if nearest:
+            meteorite_filter.nearest = self.get_nearest_from_job(nearest)
+        meteorite_filter.group_by = job.get('group_by') or self.group_by
+        if meteorite_filter.group_by is not None and meteorite_filter.group_by not in group_by_options:
+            raise ValueError(f'"{meteorite_filter.group_by}" is not a valid grouping')
+        meteorite_filter.console_limit = self.console_limit
+        if job.get('limit') not in (None, ''):
+            limit = convert_string_to_numerical(str(job['limit']))
+            if limit is None or not math.isfinite(limit) or limit < 0 or limit != int(limit):
+                raise ValueError(f'"{job["limit"]}" is not a valid limit')
+            meteorite_filter.console_limit = int(limit)
+        meteorite_filter.console_page_size = self.console_page_size
+        meteorite_filter.output_format = job['output_format']
+        if meteorite_filter.output_format not in Meteorite_Filter.all_output_format_options:
+            raise ValueError(f'"{meteorite_filter.output_format}" is not a valid output format')
+        return meteorite_filter
+
+    def get_nearest_from_job(self, nearest):
+        """turns the "latitude,longitude,count" of a job's nearest field into numbers, raising a ValueError if it
+        can not be understood"""
+        values = [convert_string_to_numerical(value) for value in (nearest.split(',') if isinstance(nearest, str)
+                                                                    else nearest)]
+        if len(values) != 3 or None in values or not all(math.isfinite(value) for value in values) or values[2] < 1:
+            raise ValueError(f'"{nearest}" is not a latitude, longitude and count')
+        return values[0], values[1], int(values[2])
+
+    def set_filtering_parameter_from_job(self, meteorite_filter, job):
+        """sets the filtering parameter and bounds of a filter from a job, raising a ValueError if they are not valid"""
+        meteorite_filter.filtering_parameter = job['parameter']
+        if meteorite_filter.filtering_parameter not in Meteorite_Filter.filtering_options:
+            raise ValueError(f'"{meteorite_filter.filtering_parameter}" is not a valid filtering parameter')
+        meteorite_filter.lower_bound = convert_string_to_numerical(job['lower_bound'])
+        meteorite_filter.upper_bound = convert_string_to_numerical(job['upper_bound'])
+        # an infinite bound leaves that end of the range open, but nan would quietly match nothing
+        if meteorite_filter.lower_bound is None or meteorite_filter.upper_bound is None or \
+                math.isnan(meteorite_filter.lower_bound) or math.isnan(meteorite_filter.upper_bound):
+            raise ValueError(f'"{job["lower_bound"]}" and "{job["upper_bound"]}" must both be numbers')
+
+
+def _is_text_or_number(value):
+    """returns True for a string, int or float, which are the types a number can be given as in a job. True and False
+    are ints in Python, but are never numbers in a job"""
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
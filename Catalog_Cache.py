@@ -0,0 +1,61 @@
+"""This module keeps a parsed copy of a meteorite data file on disk so that the text only has to be parsed the first
+time a file is used. The cache is a columnar file saved next to the data file. It records the size, modification time
+and SHA-256 hash of the data file it was built from, and is ignored as soon as any of those change"""
+import hashlib
+import os
+from Columnar_File import *
+
+
+def get_cache_file_name(file_name):
+    """returns the name of the cache file that belongs to a data file"""
+    return f'{file_name}.cache'
+
+
+def get_source_identity(file_name):
+    """returns the size, modification time and content hash of a data file as a dictionary"""
+    file_status = os.stat(file_name)
+    file_hash = hashlib.sha256()
+    with open(file_name, 'rb') as data_file:
+        for block in iter(lambda: data_file.read(1 << 20), b''):
+            file_hash.update(block)
+    return {'size': file_status.st_size, 'mtime_ns': file_status.st_mtime_ns, 'sha256': file_hash.hexdigest()}
+
+
+def load_cached_meteorite_table(file_name, source_identity=None):
+    """Returns the Meteorite_Table saved in the cache for a data file, or None if there is no cache or the data file
+    has changed since the cache was written. The size and modification time are checked before the file is hashed.
+    A caller that has already worked out the source_identity of the file can pass it in so the file is not hashed
+    again"""
+    if not is_cache_valid(file_name, source_identity):
+        return None
+    try:
+        return read_meteorite_table(get_cache_file_name(file_name))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def is_cache_valid(file_name, source_identity=None):
+    """returns True if the cache of a data file exists and was built from the data file as it is now"""
+    try:
+        cached_identity = read_columnar_header(get_cache_file_name(file_name))['extra'].get('source')
+        file_status = os.stat(file_name)
+        if cached_identity is None or cached_identity['size'] != file_status.st_size or \
+                cached_identity['mtime_ns'] != file_status.st_mtime_ns:
+            return False
+        return cached_identity == (source_identity or get_source_identity(file_name))
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def save_meteorite_table_to_cache(file_name, meteorite_table, source_identity):
+    """Saves a Meteorite_Table as the cache for a data file. source_identity should come from get_source_identity()
+    before the data file was read, so that a file changing while it is read is never cached as unchanged. A cache
+    that can not be written is skipped, since the table can always be parsed from the data file again"""
+    cache_file_name = get_cache_file_name(file_name)
+    temporary_file_name = f'{cache_file_name}.{os.getpid()}.tmp'
+    try:
+        write_meteorite_table(meteorite_table, temporary_file_name, {'source': source_identity})
+        os.replace(temporary_file_name, cache_file_name)
+    except OSError:
+        if os.path.exists(temporary_file_name):
+            os.remove(temporary_file_name)
@@ -0,0 +1,192 @@
+"""This module saves a Meteorite_Table to a compact binary file and loads it back without parsing any text. Every
+column is written as the raw bytes of its array so that loading is just a copy out of a memory mapped file.
+
+A columnar file starts with an 8 byte marker and the length of a JSON header. The header describes where each column
+is stored, along with the small pieces of the table that are not arrays, such as the distinct values of the encoded
+string columns, and the smallest and largest value of every column with a sorted index. The column data follows the header, with every column starting on an 8 byte boundary"""
+import json
+import mmap
+import sys
+from array import array
+from Meteorite_Table import *
+from Sorted_Index import *
+
+columnar_file_marker = b'METCOL01'
+# the extension given to filtered results exported as columnar files
+columnar_file_extension = '.metcol'
+array_column_names = ['ids', 'masses', 'years', 'rec_lats', 'rec_longs']
+encoded_column_names = ['name_types', 'rec_classes', 'falls', 'states', 'counties']
+
+
+def is_columnar_file(file_name):
+    """returns True if the file starts with the columnar file marker"""
+    try:
+        with open(file_name, 'rb') as data_file:
+            return data_file.read(len(columnar_file_marker)) == columnar_file_marker
+    except OSError:
+        return False
+
+
+def write_meteorite_table(meteorite_table, file_name, extra_header=None):
+    """Writes every column of a Meteorite_Table, along with its sorted indexes, to a columnar file. Anything in
+    extra_header is saved in the JSON header and handed back by read_columnar_header()"""
+    sections = {}
+    for column_name in array_column_names:
+        sections[column_name] = getattr(meteorite_table, column_name)
+    for column_name in encoded_column_names:
+        sections[f'{column_name}.codes'] = getattr(meteorite_table, column_name).codes
+    sections['names'] = '\0'.join(name or '' for name in meteorite_table.names).encode('utf-8')
+    for parameter, sorted_index in meteorite_table.sorted_indexes.items():
+        sections[f'{parameter}_index.row_indices'] = sorted_index.row_indices
+        sections[f'{parameter}_index.sorted_values'] = sorted_index.sorted_values
+        sections[f'{parameter}_index.missing_rows'] = sorted_index.missing_rows
+    header = {'byteorder': sys.byteorder, 'row_count': len(meteorite_table), 'sections': {},
+              'encoded_values': {column_name: getattr(meteorite_table, column_name).values
+                                 for column_name in encoded_column_names},
+              'missing_names': [index for index in range(len(meteorite_table)) if meteorite_table.names[index] is None],
+              'geo_location_overrides': meteorite_table.geo_location_overrides,
+              'number_overrides': meteorite_table.number_overrides,
+              'sorted_indexes': list(meteorite_table.sorted_indexes),
+              'value_ranges': {parameter: [sorted_index.sorted_values[0], sorted_index.sorted_values[-1]]
+                               if len(sorted_index) else None
+                               for parameter, sorted_index in meteorite_table.sorted_indexes.items()},
+              'extra': extra_header or {}}
+    offset = 0
+    for section_name, section in sections.items():
+        section_bytes = memoryview(section).nbytes
+        header['sections'][section_name] = [offset, section_bytes, getattr(section, 'typecode', 'B')]
+        offset = offset + _round_up_to_eight(section_bytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+    with open(file_name, 'wb') as columnar_file:
+        columnar_file.write(columnar_file_marker)
+        columnar_file.write(len(header_bytes).to_bytes(8, 'little'))
+        columnar_file.write(header_bytes)
+        columnar_file.write(b'\0' * (_round_up_to_eight(len(header_bytes)) - len(header_bytes)))
+        for section in sections.values():
+            section_bytes = memoryview(section).nbytes
+            columnar_file.write(section)
+            columnar_file.write(b'\0' * (_round_up_to_eight(section_bytes) - section_bytes))
+
+
+def read_columnar_header(file_name):
+    """Reads only the JSON header of a columnar file and returns it as a dictionary, without loading any columns.
+    Raises a ValueError if the file is not a columnar file"""
+    with open(file_name, 'rb') as columnar_file:
+        return _read_header(columnar_file)[0]
+
+
+def read_meteorite_table(file_name):
+    """Loads a Meteorite_Table, including its sorted indexes, from a columnar file. The file is memory mapped and
+    each column is copied straight into its array. Raises a ValueError if the file is not a columnar file"""
+    header, sections = _read_sections(file_name)
+    return _build_meteorite_table(header, sections)
+
+
+def read_columns(file_name, column_names):
+    """Loads only the given columns of a columnar file, named as in the data file header such as 'mass (g)' or
+    'recclass'. The rest of the file is never read. Returns a dictionary mapping each column name to its values. The
+    numeric columns are arrays holding nan or MISSING_INTEGER for missing values, the same as in a Meteorite_Table,
+    and the other columns are lists of strings with None for missing values. Raises a ValueError for a name that is
+    not a column or a file that is not a columnar file"""
+    section_names = set()
+    for column_name in column_names:
+        if column_name not in Meteorite_Table.column_names:
+            raise ValueError(f'"{column_name}" is not a meteorite data column')
+        if column_name == 'GeoLocation':
+            section_names.update(['rec_lats', 'rec_longs'])
+        elif column_name in Meteorite_Table.encoded_column_names:
+            section_names.add(f'{Meteorite_Table.column_attribute_names[column_name]}.codes')
+        else:
+            section_names.add(Meteorite_Table.column_attribute_names[column_name])
+    header, sections = _read_sections(file_name, section_names)
+    columns = {}
+    for column_name in column_names:
+        attribute_name = Meteorite_Table.column_attribute_names.get(column_name)
+        if header['row_count'] == 0:
+            columns[column_name] = []
+        elif column_name == 'name':
+            names = sections['names'].decode('utf-8').split('\0')
+            for index in header['missing_names']:
+                names[index] = None
+            columns[column_name] = names
+        elif column_name in Meteorite_Table.encoded_column_names:
+            values = header['encoded_values'][attribute_name]
+            columns[column_name] = [values[code] for code in sections[f'{attribute_name}.codes']]
+        elif column_name == 'GeoLocation':
+            # GeoLocation is rebuilt from reclat and reclong the same way a whole table rebuilds it
+            geo_location_table = Meteorite_Table()
+            geo_location_table.rec_lats = sections['rec_lats']
+            geo_location_table.rec_longs = sections['rec_longs']
+            geo_location_table.geo_location_overrides = {int(index): geo_location for index, geo_location in
+                                                         header['geo_location_overrides'].items()}
+            columns[column_name] = [geo_location_table.get_geo_location(index) for index in range(header['row_count'])]
+        else:
+            columns[column_name] = sections[attribute_name]
+    return columns
+
+
+def _read_sections(file_name, section_names=None):
+    """Reads the header of a columnar file and copies the data of the named sections, or of every section when no
+    names are given, out of the memory mapped file. Returns the header and a dictionary of the sections"""
+    with open(file_name, 'rb') as columnar_file:
+        header, data_start = _read_header(columnar_file)
+        sections = {}
+        if header['row_count'] == 0:
+            return header, sections
+        with mmap.mmap(columnar_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            file_view = memoryview(mapped_file)
+            for section_name, (offset, length, typecode) in header['sections'].items():
+                if section_names is not None and section_name not in section_names:
+                    continue
+                section_view = file_view[data_start + offset:data_start + offset + length]
+                if typecode == 'B':
+                    sections[section_name] = bytes(section_view)
+                else:
+                    sections[section_name] = array(typecode)
+                    sections[section_name].frombytes(section_view)
+                    if header['byteorder'] != sys.byteorder:
+                        sections[section_name].byteswap()
+                section_view.release()
+            file_view.release()
+    return header, sections
+
+
+def _read_header(columnar_file):
+    """reads the marker and JSON header from an open columnar file. Returns the header and the position where the
+    column data starts"""
+    if columnar_file.read(len(columnar_file_marker)) != columnar_file_marker:
+        raise ValueError(f'"{columnar_file.name}" is not a columnar meteorite file')
+    header_length = int.from_bytes(columnar_file.read(8), 'little')
+    header = json.loads(columnar_file.read(header_length).decode('utf-8'))
+    return header, len(columnar_file_marker) + 8 + _round_up_to_eight(header_length)
+
+
+def _build_meteorite_table(header, sections):
+    """puts the columns that were read from a columnar file back together into a Meteorite_Table"""
+    meteorite_table = Meteorite_Table()
+    if header['row_count'] == 0:
+        return meteorite_table
+    meteorite_table.names = sections['names'].decode('utf-8').split('\0')
+    for index in header['missing_names']:
+        meteorite_table.names[index] = None
+    for column_name in array_column_names:
+        setattr(meteorite_table, column_name, sections[column_name])
+    for column_name in encoded_column_names:
+        encoded_column = getattr(meteorite_table, column_name)
+        encoded_column.values = header['encoded_values'][column_name]
+        encoded_column.codes_by_value = {value: code for code, value in enumerate(encoded_column.values)}
+        encoded_column.codes = sections[f'{column_name}.codes']
+    meteorite_table.geo_location_overrides = {int(index): geo_location
+                                              for index, geo_location in header['geo_location_overrides'].items()}
+    meteorite_table.number_overrides = {int(index): {int(position): text for position, text in overrides.items()}
+                                        for index, overrides in header['number_overrides'].items()}
+    for parameter in header['sorted_indexes']:
+        meteorite_table.sorted_indexes[parameter] = Sorted_Index.from_arrays(
+            header['row_count'], sections[f'{parameter}_index.row_indices'],
+            sections[f'{parameter}_index.sorted_values'], sections[f'{parameter}_index.missing_rows'])
+    return meteorite_table
+
+
+def _round_up_to_eight(length):
+    """returns the smallest multiple of 8 that is not less than length"""
+    return (length + 7) // 8 * 8
@@ -0,0 +1,135 @@
+"""This module prints large tables to the console quickly. Every row is formatted into a single string with columns
+only as wide as the data in them, and the rows are written in blocks through a single write each instead of one write
+per row, which is what makes printing tens of thousands of rows slow over a connection such as SSH. Output can stop
+after its first rows and can be paged, waiting for the user after every screen with a count of the rows shown so far"""
+import shutil
+import sys
+from itertools import chain
+
+# the number of rows at the start of the output that the widths of the columns are worked out from
+column_sample_size = 1000
+# the widest a column is made. Longer values are cut short to this width
+max_column_width = 40
+# when the table is too wide for the terminal, no column is made narrower than this, or than its values
+min_column_width = 8
+column_gap = 2
+# the number of rows written to the console in a single write
+row_block_size = 1000
+page_prompt = '-- {shown} rows shown{total}, Enter for more or "q" to quit --'
+
+
+def get_column_widths(header, rows, max_width=max_column_width):
+    """returns the width of each column, the length of its longest value or name in rows and header, but no more
+    than max_width"""
+    column_widths = [len(name) for name in header]
+    for row in rows:
+        for index, value in enumerate(row):
+            if value is not None and len(value) > column_widths[index]:
+                column_widths[index] = len(value)
+    return [min(column_width, max_width) for column_width in column_widths]
+
+
+def fit_column_widths(column_widths, available_width):
+    """Narrows the widest columns, one character at a time, until the table fits in available_width characters or
+    every column is down to min_column_width. Returns the new list of widths"""
+    column_widths = list(column_widths)
+    total_width = sum(column_widths) + column_gap * (len(column_widths) - 1)
+    while total_width > available_width:
+        widest_index = max(range(len(column_widths)), key=column_widths.__getitem__)
+        if column_widths[widest_index] <= min_column_width:
+            break
+        column_widths[widest_index] = column_widths[widest_index] - 1
+        total_width = total_width - 1
+    return column_widths
+
+
+def create_row_format(column_widths):
+    """returns a format string that pads every value to the width of its column and cuts longer values short. The
+    last column is not padded, so no line ends in spaces"""
+    gap = ' ' * column_gap
+    column_formats = [f'{{:<{width}.{width}}}' for width in column_widths[:-1]]
+    return gap.join(column_formats + [f'{{:.{column_widths[-1]}}}']) + '\n'
+
+
+class Console_Renderer:
+    """A Console_Renderer prints a header and rows of strings as a table. limit stops the table after that many rows,
+    and page_size waits for the user after every page_size rows, with 0 meaning a page the height of the terminal.
+    The table is written to output_file, or to sys.stdout when none is given, and input_function is called with the
+    page prompt to wait for the user"""
+    def __init__(self, header, output_file=None, limit=None, page_size=None, input_function=input):
+        self.header = header
+        self.output_file = output_file
+        self.limit = limit
+        self.page_size = page_size
+        self.input_function = input_function
+        self.row_count = 0
+
+    def render(self, rows, total_row_count=None):
+        """Prints the table for an iterable of rows, such as a list or a stream of meteorites, followed by a line
+        counting the rows shown. total_row_count is the number of rows in a list, used in that line and in the page
+        prompt when not every row is shown. Returns the number of rows printed"""
+        output_file = sys.stdout if self.output_file is None else self.output_file
+        rows = iter(rows)
+        sample_rows = []
+        for row in rows:
+            sample_rows.append(row)
+            if len(sample_rows) == column_sample_size:
+                break
+        column_widths = get_column_widths(self.header, sample_rows)
+        if output_file.isatty():
+            column_widths = fit_column_widths(column_widths, shutil.get_terminal_size().columns)
+        row_format = create_row_format(column_widths)
+        output_file.write(row_format.format(*self.header))
+        output_file.write('=' * (sum(column_widths) + column_gap * (len(column_widths) - 1)) + '\n')
+        page_size = self.get_page_size()
+        self.row_count = 0
+        block = []
+        more_rows = False
+        # there is no need to wait for the user after the very last row
+        last_row_count = self.limit if total_row_count is None else min(total_row_count, self.limit or total_row_count)
+        for row in chain(sample_rows, rows):
+            if self.limit is not None and self.row_count >= self.limit:
+                more_rows = True
+                break
+            block.append(row_format.format(*['' if value is None else value for value in row]))
+            self.row_count = self.row_count + 1
+            if page_size and self.row_count % page_size == 0 and self.row_count != last_row_count:
+                output_file.write(''.join(block))
+                block = []
+                if not self.wait_for_next_page(output_file, total_row_count):
+                    more_rows = True
+                    break
+            elif len(block) == row_block_size:
+                output_file.write(''.join(block))
+                block = []
+        output_file.write(''.join(block))
+        output_file.write(self.get_count_line(more_rows, total_row_count))
+        output_file.flush()
+        return self.row_count
+
+    def get_page_size(self):
+        """returns the number of rows on a page, or None when the output is not paged"""
+        if self.page_size is None:
+            return None
+        if self.page_size > 0:
+            return self.page_size
+        # the header, the line under it and the page prompt take up three lines of the terminal
+        return max(shutil.get_terminal_size().lines - 3, 1)
+
+    def wait_for_next_page(self, output_file, total_row_count):
+        """flushes the page and prompts the user, returning False if they asked to stop or there is no more input"""
+        output_file.flush()
+        total = '' if total_row_count is None else f' of {total_row_count:,}'
+        try:
+            answer = self.input_function(page_prompt.format(shown=f'{self.row_count:,}', total=total))
+        except EOFError:
+            return False
+        return answer.strip().lower() != 'q'
+
+    def get_count_line(self, more_rows, total_row_count):
+        """returns the line printed under the table counting the rows shown"""
+        if total_row_count is not None and total_row_count != self.row_count:
+            return f'{self.row_count:,} of {total_row_count:,} rows shown\n'
+        if more_rows:
+            return f'first {self.row_count:,} rows shown\n'
+        return f'{self.row_count:,} rows\n'
@@ -0,0 +1,124 @@
+"""This module holds the two ways a Meteorite_Table can be filtered and summarized. The python backend uses the sorted
+indexes of the table and plain Python loops. The numpy backend copies mass, year, reclat and reclong into NumPy arrays
+once per table, with nan for missing values, and works on whole columns at once with boolean masks. NumPy is optional,
+and asking for the numpy backend without NumPy installed falls back to the python backend. Both backends return the
+same rows"""
+from statistics import median
+from Meteorite_Table import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+backend_options = ['python', 'numpy', 'auto']
+# the sorted index and column used by each filtering parameter
+filtering_parameter_columns = {'mass': 'mass (g)', 'year': 'year', 'reclat': 'reclat', 'reclong': 'reclong'}
+
+
+def create_filter_backend(meteorite_table, backend_name='python'):
+    """Creates the backend with the given name for a table. 'auto' and 'numpy' both use NumPy when it is installed,
+    and both fall back to the python backend when it is not"""
+    if backend_name not in backend_options:
+        raise ValueError(f'"{backend_name}" is not a valid backend')
+    if backend_name != 'python' and numpy is not None:
+        return Numpy_Backend(meteorite_table)
+    return Python_Backend(meteorite_table)
+
+
+class Python_Backend:
+    """Filters with the sorted indexes of a Meteorite_Table and summarizes rows with plain Python loops"""
+    name = 'python'
+
+    def __init__(self, meteorite_table):
+        self.meteorite_table = meteorite_table
+        self.row_count = len(meteorite_table)
+
+    def filter_rows(self, filtering_parameter, lower_bound, upper_bound):
+        """returns the rows, in table order, whose value for a filtering parameter is in [lower_bound, upper_bound)"""
+        return self.meteorite_table.get_sorted_index(filtering_parameter).range_query(lower_bound, upper_bound)
+
+    def summarize(self, row_indices, year_bin_size=10):
+        """Returns a dictionary of statistics for a list of rows: the number of rows, the count, total, mean and
+        median of the masses that are known, the number of rows in each range of year_bin_size years and the number
+        of rows for each recclass"""
+        masses = [self.meteorite_table.masses[index] for index in row_indices
+                  if not isnan(self.meteorite_table.masses[index])]
+        year_histogram = {}
+        for index in row_indices:
+            year = self.meteorite_table.get_year(index)
+            if year is not None:
+                year_bin = year // year_bin_size * year_bin_size
+                year_histogram[year_bin] = year_histogram.get(year_bin, 0) + 1
+        rec_class_histogram = {}
+        for index in row_indices:
+            rec_class = self.meteorite_table.rec_classes.get(index)
+            rec_class_histogram[rec_class] = rec_class_histogram.get(rec_class, 0) + 1
+        return _build_summary(len(row_indices), len(masses), sum(masses), median(masses) if masses else None,
+                              year_histogram, rec_class_histogram)
+
+
+def get_numpy_columns(meteorite_table):
+    """Returns NumPy copies of the mass, year, reclat and reclong columns of a table, as a dictionary keyed by
+    filtering parameter, along with a copy of its recclass codes. The copies are kept on the table so that every
+    backend for the same table shares them, and they are only copied again once rows have been added to the table"""
+    numpy_columns = meteorite_table.numpy_columns
+    if numpy_columns is None or numpy_columns[0] != len(meteorite_table):
+        years = numpy.array(meteorite_table.years, dtype=numpy.int64)
+        columns = {'mass': numpy.array(meteorite_table.masses, dtype=numpy.float64),
+                   'year': numpy.where(years == MISSING_INTEGER, numpy.nan, years.astype(numpy.float64)),
+                   'reclat': numpy.array(meteorite_table.rec_lats, dtype=numpy.float64),
+                   'reclong': numpy.array(meteorite_table.rec_longs, dtype=numpy.float64)}
+        numpy_columns = (len(meteorite_table), columns,
+                         numpy.array(meteorite_table.rec_classes.codes, dtype=numpy.int64))
+        meteorite_table.numpy_columns = numpy_columns
+    return numpy_columns[1], numpy_columns[2]
+
+
+class Numpy_Backend:
+    """Filters and summarizes with NumPy. The columns are copied into NumPy arrays the first time any backend is
+    created for a table, and again only after rows have been added to it, so creating a backend for every filter
+    costs nothing once the table is loaded"""
+    name = 'numpy'
+
+    def __init__(self, meteorite_table):
+        self.meteorite_table = meteorite_table
+        self.row_count = len(meteorite_table)
+        self.columns, self.rec_class_codes = get_numpy_columns(meteorite_table)
+
+    def get_range_mask(self, filtering_parameter, lower_bound, upper_bound):
+        """returns a boolean mask of the rows in [lower_bound, upper_bound). Comparisons with nan are always False,
+        so rows with missing values drop out on their own"""
+        column = self.columns[filtering_parameter]
+        return (column >= lower_bound) & (column < upper_bound)
+
+    def filter_rows(self, filtering_parameter, lower_bound, upper_bound):
+        """returns the rows, in table order, whose value for a filtering parameter is in [lower_bound, upper_bound)"""
+        return numpy.flatnonzero(self.get_range_mask(filtering_parameter, lower_bound, upper_bound)).tolist()
+
+    def summarize(self, row_indices, year_bin_size=10):
+        """returns the same statistics as Python_Backend.summarize(), worked out on whole arrays at once"""
+        rows = numpy.asarray(row_indices, dtype=numpy.int64)
+        masses = self.columns['mass'][rows]
+        masses = masses[~numpy.isnan(masses)]
+        years = self.columns['year'][rows]
+        years = years[~numpy.isnan(years)]
+        year_bins, year_counts = numpy.unique(numpy.floor_divide(years, year_bin_size) * year_bin_size,
+                                              return_counts=True)
+        rec_class_counts = numpy.bincount(self.rec_class_codes[rows],
+                                          minlength=len(self.meteorite_table.rec_classes.values))
+        rec_class_histogram = {self.meteorite_table.rec_classes.values[code]: int(count)
+                               for code, count in enumerate(rec_class_counts) if count}
+        return _build_summary(len(rows), len(masses), float(masses.sum()),
+                              float(numpy.median(masses)) if len(masses) else None,
+                              {int(year_bin): int(count) for year_bin, count in zip(year_bins, year_counts)},
+                              rec_class_histogram)
+
+
+def _build_summary(row_count, mass_count, mass_sum, mass_median, year_histogram, rec_class_histogram):
+    """puts the statistics worked out by a backend into a dictionary, with the histograms in sorted order"""
+    return {'count': row_count, 'mass_count': mass_count, 'mass_sum': mass_sum,
+            'mass_mean': mass_sum / mass_count if mass_count else None, 'mass_median': mass_median,
+            'year_histogram': dict(sorted(year_histogram.items())),
+            'recclass_histogram': dict(sorted(rec_class_histogram.items(), key=lambda item: (item[0] is None,
+                                                                                             item[0] or '')))}
@@ -0,0 +1,83 @@
+"""This module builds summary tables of filtered meteorites. Meteorites are grouped by recclass, fall, decade of year,
+States or Counties, and each group keeps a count of its meteorites and the total of their masses. Every summary is
+worked out in a single pass over the meteorites, so a summary of a large result can be output directly instead of
+exporting every row and pivoting it afterwards"""
+from math import isnan
+from Meteorite_Table import *
+
+group_by_options = ['recclass', 'fall', 'decade', 'States', 'Counties']
+# the column of a Meteorite_Table and the attribute of a Meteorite that each grouping reads
+group_by_attribute_names = {'recclass': 'rec_class', 'fall': 'fall', 'decade': 'year', 'States': 'states',
+                            'Counties': 'counties'}
+summary_header = ['count', 'total mass (g)']
+
+
+class Group_Summary:
+    """A Group_Summary collects the count and total mass of each group. Meteorites with no value for the grouped
+    column are counted together in a group of their own, and meteorites with no mass add to the count of their group
+    but not to its total mass"""
+    def __init__(self, group_by):
+        """groups maps the value of each group to a list of [count, total mass]. A ValueError is raised if group_by is
+        not one of group_by_options"""
+        if group_by not in group_by_options:
+            raise ValueError(f'"{group_by}" is not a valid grouping, choose from {", ".join(group_by_options)}')
+        self.group_by = group_by
+        self.groups = {}
+
+    def add_meteorite(self, meteorite):
+        """adds a single Meteorite object to its group"""
+        group = getattr(meteorite, group_by_attribute_names[self.group_by])
+        if self.group_by == 'decade' and group is not None:
+            group = group // 10 * 10
+        self._add_to_group(group, 1, meteorite.mass or 0.0)
+
+    def add_meteorites(self, meteorites):
+        """adds every meteorite from an iterable of Meteorite objects, such as a streamed file, returning the summary"""
+        for meteorite in meteorites:
+            self.add_meteorite(meteorite)
+        return self
+
+    def add_table_rows(self, meteorite_table, row_indices):
+        """Adds rows of a Meteorite_Table without creating any Meteorite objects. String columns are totalled by
+        their dictionary codes and only turned back into strings once per group. Returns the summary"""
+        masses = meteorite_table.masses
+        counts = {}
+        mass_totals = {}
+        if self.group_by == 'decade':
+            years = meteorite_table.years
+            for index in row_indices:
+                year = years[index]
+                group = None if year == MISSING_INTEGER else year // 10 * 10
+                counts[group] = counts.get(group, 0) + 1
+                if not isnan(masses[index]):
+                    mass_totals[group] = mass_totals.get(group, 0.0) + masses[index]
+        else:
+            column = getattr(meteorite_table, meteorite_table.column_attribute_names[self.group_by])
+            codes = column.codes
+            for index in row_indices:
+                code = codes[index]
+                counts[code] = counts.get(code, 0) + 1
+                if not isnan(masses[index]):
+                    mass_totals[code] = mass_totals.get(code, 0.0) + masses[index]
+            counts = {column.values[code]: count for code, count in counts.items()}
+            mass_totals = {column.values[code]: total for code, total in mass_totals.items()}
+        for group, count in counts.items():
+            self._add_to_group(group, count, mass_totals.get(group, 0.0))
+        return self
+
+    def get_rows(self):
+        """Returns the summary as a list of [group, count, total mass] rows sorted by group, with the group of
+        meteorites missing a value last and shown as an empty string"""
+        groups = sorted(self.groups, key=lambda group: (group is None, group if group is not None else ''))
+        return [['' if group is None else group] + self.groups[group] for group in groups]
+
+    def get_header(self):
+        """returns the names of the columns of the rows from get_rows()"""
+        return [self.group_by] + summary_header
+
+    def _add_to_group(self, group, count, mass_total):
+        """adds a count and a mass total to a group, creating the group the first time it is seen"""
+        if group not in self.groups:
+            self.groups[group] = [0, 0.0]
+        self.groups[group][0] = self.groups[group][0] + count
+        self.groups[group][1] = self.groups[group][1] + mass_total
@@ -0,0 +1,188 @@
+"""This module keeps a Meteorite_Table up to date with a data file that grows over time. After the first full load it
+remembers how many bytes and rows of the file it has read, and each update only parses the lines that have been
+appended since. The new rows are added to the end of the table and to its indexes in place. If the file has shrunk or
+the data that was already read has been rewritten, the whole file is loaded again instead"""
+import hashlib
+import os
+from contextlib import nullcontext
+from Catalog_Cache import *
+from Parallel_Loader import *
+
+# the number of bytes at the start of the file and just before the end of the data that was read that are kept and
+# compared on every update to notice a file that has been rewritten rather than appended to
+check_window_size = 4096
+# the number of bytes of a data file read at a time while it is hashed and parsed, so a whole file is never held in
+# memory at once
+read_block_size = 1 << 20
+
+
+def read_blocks(data_file, byte_count=None):
+    """yields the next byte_count bytes of an open file, or the rest of it when byte_count is None, in blocks of at
+    most read_block_size bytes"""
+    while byte_count is None or byte_count > 0:
+        block = data_file.read(read_block_size if byte_count is None else min(read_block_size, byte_count))
+        if not block:
+            return
+        if byte_count is not None:
+            byte_count = byte_count - len(block)
+        yield block
+
+
+class Incremental_Loader:
+    """An Incremental_Loader owns a Meteorite_Table read from a single data file. A running SHA-256 hash of every
+    byte read is kept as well, so the on-disk cache can be saved after an update without reading the file again"""
+    def __init__(self, file_name, use_cache=True, worker_count=1):
+        """Nothing is read until load() or update() is called. worker_count is the number of processes used to parse
+        the file when the whole of it has to be parsed"""
+        self.file_name = file_name
+        self.use_cache = use_cache
+        self.worker_count = worker_count
+        self.meteorite_table = None
+        self.offset = 0
+        self.row_count = 0
+        self.line_count = 0
+        self.file_hash = None
+        self.modified_time = None
+        self.head_bytes = b''
+        self.tail_bytes = b''
+        self.full_load_count = 0
+
+    def load(self):
+        """Reads the whole data file into a new table, using the cache when it matches the file, and remembers
+        where the data ends. The file is read a block at a time and never held in memory whole. With the cache
+        turned on the file is hashed first, since the hash decides whether the cache can be used, and it is only read
+        a second time if it still has to be parsed. A columnar file, or a file parsed by several processes, is also
+        hashed on its own first. Otherwise it is hashed and parsed in a single pass. Returns the table"""
+        self.file_hash = hashlib.sha256()
+        self.offset = 0
+        self.line_count = 0
+        self.head_bytes = b''
+        self.tail_bytes = b''
+        with open(self.file_name, 'rb') as data_file:
+            modified_time = os.fstat(data_file.fileno()).st_mtime_ns
+            is_columnar = data_file.read(len(columnar_file_marker)) == columnar_file_marker
+            data_file.seek(0)
+            meteorite_table = None
+            is_parsed = True
+            if is_columnar or self.use_cache or self.worker_count > 1:
+                for block in read_blocks(data_file):
+                    self.add_read_bytes(block)
+                if is_columnar:
+                    meteorite_table = read_meteorite_table(self.file_name)
+                elif self.use_cache:
+                    meteorite_table = load_cached_meteorite_table(self.file_name, self.get_source_identity(
+                        modified_time))
+                is_parsed = meteorite_table is None
+                if is_parsed:
+                    data_file.seek(0)
+                    meteorite_table = self.parse_blocks(read_blocks(data_file, self.offset))
+            else:
+                meteorite_table = self.parse_blocks(self.add_read_blocks(read_blocks(data_file)))
+        if self.use_cache and is_parsed:
+            save_meteorite_table_to_cache(self.file_name, meteorite_table, self.get_source_identity(modified_time))
+        self.meteorite_table = meteorite_table
+        self.modified_time = modified_time
+        meteorite_table.source_identity = (os.path.abspath(self.file_name), self.offset, modified_time)
+        self.row_count = len(meteorite_table)
+        self.full_load_count = self.full_load_count + 1
+        return meteorite_table
+
+    def get_source_identity(self, modified_time):
+        """returns the size, modification time and hash of the data read so far, as the cache records them"""
+        return {'size': self.offset, 'mtime_ns': modified_time, 'sha256': self.file_hash.hexdigest()}
+
+    def add_read_bytes(self, block):
+        """adds a block of bytes read from the end of the data to the running hash, the size and line count of the
+        data and the bytes kept from its start and end"""
+        self.file_hash.update(block)
+        self.offset = self.offset + len(block)
+        self.line_count = self.line_count + block.count(b'\n')
+        if len(self.head_bytes) < check_window_size:
+            self.head_bytes = (self.head_bytes + block[:check_window_size])[:check_window_size]
+        self.tail_bytes = (self.tail_bytes + block[-check_window_size:])[-check_window_size:]
+
+    def add_read_blocks(self, blocks):
+        """passes blocks of the data file through unchanged, calling add_read_bytes() on each of them"""
+        for block in blocks:
+            self.add_read_bytes(block)
+            yield block
+
+    def parse_blocks(self, blocks):
+        """Parses every line after the header of a whole data file, given as blocks of its bytes, and returns the new
+        table with its sorted indexes built. Each block is parsed up to its last line break and the rest of it is
+        carried on to the next block. When worker_count is more than 1 the blocks are not used and the first
+        offset bytes of the file are parsed by several processes instead"""
+        if self.worker_count > 1:
+            return load_meteorite_table_in_parallel(self.file_name, self.worker_count, self.offset)
+        meteorite_table = Meteorite_Table()
+        malformed_lines = []
+        # the line number of the first line of the next lines parsed, or None until the header has been passed
+        line_number = None
+        remaining_bytes = b''
+        for block in blocks:
+            block = remaining_bytes + block
+            line_end = block.rfind(b'\n') + 1
+            line_bytes, remaining_bytes = block[:line_end], block[line_end:]
+            if line_number is None:
+                if not line_bytes:
+                    continue
+                # the header is the first line of the file and is never part of the data
+                line_bytes = line_bytes[line_bytes.find(b'\n') + 1:]
+                line_number = 2
+            malformed_lines.extend(parse_chunk_bytes(line_bytes, meteorite_table, line_number)[1])
+            line_number = line_number + line_bytes.count(b'\n')
+        if remaining_bytes and line_number is not None:
+            # the last line of a file that does not end with a line break
+            malformed_lines.extend(parse_chunk_bytes(remaining_bytes, meteorite_table, line_number)[1])
+        report_malformed_lines(self.file_name, malformed_lines)
+        meteorite_table.build_sorted_indexes()
+        return meteorite_table
+
+    def update(self, append_lock=None):
+        """Brings the table up to date with the data file. Returns the number of rows appended to the table in
+        place, or None if the file had to be loaded again from the start, in which case meteorite_table is a new
+        table. A file that has been modified without growing is loaded again, and so is a file whose last line had
+        no line break when it was read, since the new bytes carry on that line, and a columnar file, which is
+        rewritten rather than appended to. The new lines are parsed into a table of their own first, and
+        append_lock, a context manager such as Table_Lock.writing(), is only held while they are added to the end
+        of the table and its indexes"""
+        if self.meteorite_table is None:
+            self.load()
+            return None
+        with open(self.file_name, 'rb') as data_file:
+            file_status = os.fstat(data_file.fileno())
+            file_size = file_status.st_size
+            modified_time = file_status.st_mtime_ns
+            if file_size == self.offset and modified_time == self.modified_time:
+                return 0
+            if file_size <= self.offset or not self.tail_bytes.endswith(b'\n') or \
+                    self.head_bytes.startswith(columnar_file_marker) or not self.is_unchanged(data_file):
+                new_bytes = None
+            else:
+                data_file.seek(self.offset)
+                new_bytes = data_file.read(file_size - self.offset)
+        if new_bytes is None:
+            self.load()
+            return None
+        new_table, malformed_lines = parse_chunk_bytes(new_bytes, first_line_number=self.line_count + 1)
+        report_malformed_lines(self.file_name, malformed_lines)
+        self.add_read_bytes(new_bytes)
+        with append_lock or nullcontext():
+            self.meteorite_table.extend(new_table)
+            self.meteorite_table.update_indexes()
+            self.meteorite_table.source_identity = (os.path.abspath(self.file_name), self.offset, modified_time)
+        self.modified_time = modified_time
+        new_row_count = len(self.meteorite_table) - self.row_count
+        self.row_count = len(self.meteorite_table)
+        if self.use_cache:
+            save_meteorite_table_to_cache(self.file_name, self.meteorite_table, self.get_source_identity(modified_time))
+        return new_row_count
+
+    def is_unchanged(self, data_file):
+        """checks that the start of an open data file and the bytes just before the end of the data that was read
+        are the same as when they were read"""
+        data_file.seek(0)
+        if data_file.read(len(self.head_bytes)) != self.head_bytes:
+            return False
+        data_file.seek(self.offset - len(self.tail_bytes))
+        return data_file.read(len(self.tail_bytes)) == self.tail_bytes
@@ -0,0 +1,66 @@
+"""This module turns the lines of a meteorite data file into fields in a single pass. A line is split on tabs once,
+empty fields become None and the numeric columns are converted through a table of converters, so no line goes through
+more than one loop. Lines that can not be read are reported with their line number instead of stopping the whole load"""
+
+field_count = 12
+# the numeric columns of a line, by position, with the name used for them in error messages and their converter
+numeric_field_converters = [(1, 'id', int), (4, 'mass (g)', float), (6, 'year', int), (7, 'reclat', float),
+                            (8, 'reclong', float)]
+# the number of malformed lines that are printed before the rest are only counted
+malformed_line_report_limit = 10
+
+
+def split_line(line):
+    """Splits a line of a data file into a list of exactly 12 fields, with None for every empty field. Short lines
+    are padded with None, the same way a line with blank trailing States and Counties is read. A quoted field, such as
+    GeoLocation, keeps its quotes. Raises a ValueError if the line has more than 12 fields"""
+    fields = line.strip('\n').split('\t')
+    if len(fields) > field_count and '"' in line:
+        fields = _join_quoted_fields(fields)
+    if len(fields) > field_count:
+        raise ValueError(f'has {len(fields)} fields instead of {field_count}')
+    fields = [field or None for field in fields]
+    if len(fields) < field_count:
+        fields.extend([None] * (field_count - len(fields)))
+    return fields
+
+
+def parse_line(line):
+    """Returns the 12 fields of a line with id and year converted to int and mass, reclat and reclong converted to
+    float. Missing values are None. Raises a ValueError naming the column of any number that can not be read"""
+    return convert_numbers(split_line(line))
+
+
+def convert_numbers(fields):
+    """converts the numeric fields of a list of 12 fields from split_line() in place and returns the list. Raises a
+    ValueError naming the column of any number that can not be read"""
+    for index, column_name, converter in numeric_field_converters:
+        value = fields[index]
+        if value is not None:
+            try:
+                fields[index] = converter(value)
+            except ValueError:
+                raise ValueError(f'{column_name} "{value}" is not a valid number') from None
+    return fields
+
+
+def report_malformed_lines(file_name, malformed_lines):
+    """prints an error for each (line number, message) pair of the lines that were skipped while reading a file,
+    only counting the ones past malformed_line_report_limit"""
+    for line_number, message in malformed_lines[:malformed_line_report_limit]:
+        print(f'ERROR: "{file_name}" line {line_number} skipped: {message}')
+    if len(malformed_lines) > malformed_line_report_limit:
+        print(f'ERROR: {len(malformed_lines) - malformed_line_report_limit} more malformed lines skipped in '
+              f'"{file_name}"')
+
+
+def _join_quoted_fields(fields):
+    """puts back together a quoted field that had a tab inside of it and was split apart"""
+    joined_fields = []
+    for field in fields:
+        if joined_fields and joined_fields[-1].startswith('"') and \
+                (len(joined_fields[-1]) == 1 or not joined_fields[-1].endswith('"')):
+            joined_fields[-1] = f'{joined_fields[-1]}\t{field}'
+        else:
+            joined_fields.append(field)
+    return joined_fields
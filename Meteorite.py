@@ -1,73 +1,174 @@
 """This module defines the meteorite object that is used within many functions of Meteorite_Filter to contain data on
 individual meteorites"""
+from Line_Parser import *
 from utility_functions import *
 
+# the names of the 12 pieces of data of a meteorite, in the order they come in a line of the meteorite_landings.txt
+# file. Every other way of reading a meteorite's data by name is built from this tuple
+field_names = ('name', 'id', 'name_type', 'rec_class', 'mass', 'fall', 'year', 'rec_lat', 'rec_long', 'geo_location',
+               'states', 'counties')
+# the positions of mass, year, reclat and reclong in a line, the numbers a meteorite keeps once they are converted
+number_positions = (4, 6, 7, 8)
+# the column name and converter of each number, used to convert a number the first time it is read
+_number_converters = {index: (column_name, converter) for index, column_name, converter in numeric_field_converters}
+# stands in for a number or the coordinates of a meteorite that have not been worked out yet
+_not_converted = object()
+
 
 class Meteorite:
-    """Every meteorite object has variables for the 12 pieces of data that come in the meteorite_landings.txt file.
-    By looping through a complete list of meteorite objects, all these variables can be read by the Meteorite_Filter
-    class"""
-    def __init__(self):
-        """All 12 variables are initialized to None when a meteorite object is created prior to setting any actual
-        values. An attribute list is also created containing these variables so that all attributes can be collected
-        in a single list to make looping possible. This method is more than 10 lines long, however the variables
-        need to be initialized"""
-        self.fall = None
-        self.year = None
-        self.rec_lat = None
-        self.rec_long = None
-        self.geo_location = None
-        self.states = None
-        self.mass = None
-        self.rec_class = None
-        self.name_type = None
-        self.id = None
-        self.name = None
-        self.counties = None
-        self.attribute_list = [self.name, self.id, self.name_type, self.rec_class, self.mass, self.fall, self.year,
-                               self.rec_lat, self.rec_long, self.geo_location, self.states, self.counties]
-
-    def set_meteorite_from_string(self, meteorite_as_string):
+    """Every meteorite object holds the 12 pieces of data that come in the meteorite_landings.txt file, as a tuple of
+    the strings they are written with in the file, in the same order and with None for missing data. Mass, year,
+    reclat and reclong are kept as numbers too, but each one is only converted from its string the first time it is
+    read and then kept, and the coordinates read from GeoLocation are worked out the same way. A meteorite has slots
+    instead of a __dict__ and no way to set any of its data, so its numbers can never go out of step with its strings.
+    Iterating over a meteorite, or indexing it, gives its strings the same way as a tuple"""
+    __slots__ = ('_attributes', '_mass', '_year', '_rec_lat', '_rec_long', '_coordinates')
+
+    def __init__(self, attribute_list=(None,) * field_count, numbers=None):
+        """Creates a meteorite from a list of the 12 attribute strings in field_names order. A meteorite created
+        without a list has None for every attribute. numbers is the mass, year, reclat and reclong already converted,
+        such as the values of a table row, and when it is not given each number is converted when it is first read.
+        A ValueError is raised for a list of any other length, or when a number that can not be read is read"""
+        if len(attribute_list) != field_count:
+            raise ValueError(f'has {len(attribute_list)} fields instead of {field_count}')
+        self._attributes = tuple(attribute_list)
+        self._mass, self._year, self._rec_lat, self._rec_long = numbers or (_not_converted,) * len(number_positions)
+        self._coordinates = _not_converted
+
+    @classmethod
+    def from_string(cls, meteorite_as_string):
         """The original text file containing the meteorite data gives every meteorite as a separate string. This method
-        turns that string into data for each individual variable to instantiate a meteorite object. The string is split
-         on tab characters to create a list of 12 strings. That list is then used to set values for all meteorite
-         variables using set_attributes_from_list()"""
-        clean_meteorite_data = clean_data_list(meteorite_as_string)
-        index = 0
-        for attribute in clean_meteorite_data:
-            self.attribute_list[index] = attribute
-            index = index + 1
-        self.set_attributes_from_list()
-
-    def set_attributes_from_list(self):
-        """This method uses the filled attribute list from set_meteorite_from_string() to set values for all variables
-        in the meteorite object"""
-        self.name = self.attribute_list[0]
-        self.id = self.attribute_list[1]
-        self.name_type = self.attribute_list[2]
-        self.rec_class = self.attribute_list[3]
-        self.set_mass(self.attribute_list[4])
-        self.fall = self.attribute_list[5]
-        self.set_year(self.attribute_list[6])
-        self.rec_lat = self.attribute_list[7]
-        self.rec_long = self.attribute_list[8]
-        self.geo_location = self.attribute_list[9]
-        self.states = self.attribute_list[10]
-        self.counties = self.attribute_list[11]
-
-    def set_mass(self, mass_input):
-        """Unlike most other variables in this class that remain as a string, mass must be represented as a float for
-        computational purposes. Some meteorites have no data for certain variables and a variable of type None can not
-        be turned into a float. This method assures that no math is attempted when mass == None"""
-        if mass_input is None:
-            self.mass = None
-        else:
-            self.mass = float(mass_input)
-
-    def set_year(self, year_input):
-        """similar to mass, year must be an integer value to act as a filtering parameter. None can not be converted
-        into an int and this method prevents that"""
-        if year_input is None:
-            self.year = None
-        else:
-            self.year = int(year_input)
+        splits that string on tab characters into the 12 attribute strings of a new meteorite. A ValueError is raised
+        for a line that can not be parsed, including one with a number that can not be read, so a bad line is skipped
+        when it is read the same way loading it into a table skips it. Checking the numbers converts them, so the
+        converted numbers are handed to the meteorite rather than converted a second time when they are read"""
+        attribute_list = split_line(meteorite_as_string)
+        converted_list = convert_numbers(list(attribute_list))
+        return cls(attribute_list, [converted_list[position] for position in number_positions])
+
+    def __iter__(self):
+        return iter(self._attributes)
+
+    def __len__(self):
+        return field_count
+
+    def __getitem__(self, index):
+        return self._attributes[index]
+
+    def __eq__(self, other):
+        return isinstance(other, Meteorite) and self._attributes == other._attributes
+
+    def __hash__(self):
+        return hash(self._attributes)
+
+    def __repr__(self):
+        return f'Meteorite({list(self._attributes)!r})'
+
+    @property
+    def attribute_list(self):
+        """the 12 attribute strings as a new list, in field_names order"""
+        return list(self._attributes)
+
+    @property
+    def name(self):
+        """the name string, or None when missing"""
+        return self._attributes[0]
+
+    @property
+    def id(self):
+        """the id string, or None when missing"""
+        return self._attributes[1]
+
+    @property
+    def name_type(self):
+        """the nametype string, or None when missing"""
+        return self._attributes[2]
+
+    @property
+    def rec_class(self):
+        """the recclass string, or None when missing"""
+        return self._attributes[3]
+
+    @property
+    def mass(self):
+        """Unlike most other attributes, mass must be represented as a float for computational purposes. Some
+        meteorites have no mass and None can not be turned into a float, so None is given back for them"""
+        if self._mass is _not_converted:
+            self._mass = self._convert_number(4)
+        return self._mass
+
+    @property
+    def fall(self):
+        """the fall string, or None when missing"""
+        return self._attributes[5]
+
+    @property
+    def year(self):
+        """similar to mass, year must be an integer value to act as a filtering parameter, or None when missing"""
+        if self._year is _not_converted:
+            self._year = self._convert_number(6)
+        return self._year
+
+    @property
+    def rec_lat(self):
+        """the latitude as a float, or None when missing"""
+        if self._rec_lat is _not_converted:
+            self._rec_lat = self._convert_number(7)
+        return self._rec_lat
+
+    @property
+    def rec_long(self):
+        """the longitude as a float, or None when missing"""
+        if self._rec_long is _not_converted:
+            self._rec_long = self._convert_number(8)
+        return self._rec_long
+
+    @property
+    def geo_location(self):
+        """the GeoLocation string, or None when missing"""
+        return self._attributes[9]
+
+    @property
+    def states(self):
+        """the States string, or None when missing"""
+        return self._attributes[10]
+
+    @property
+    def counties(self):
+        """the Counties string, or None when missing"""
+        return self._attributes[11]
+
+    def get_coordinates(self):
+        """Returns the latitude and longitude as a tuple of floats. When reclat or reclong is missing they are read
+        from the GeoLocation string instead, and None is returned when neither gives both coordinates. The answer is
+        worked out the first time it is asked for and kept"""
+        if self._coordinates is _not_converted:
+            self._coordinates = self._find_coordinates()
+        return self._coordinates
+
+    def _find_coordinates(self):
+        """works out the coordinates given back by get_coordinates()"""
+        rec_lat = self.rec_lat
+        rec_long = self.rec_long
+        if rec_lat is not None and rec_long is not None:
+            return rec_lat, rec_long
+        geo_location = self._attributes[9]
+        if geo_location is None:
+            return None
+        try:
+            rec_lat, rec_long = geo_location.strip('"()').split(',')
+            return float(rec_lat), float(rec_long)
+        except ValueError:
+            return None
+
+    def _convert_number(self, position):
+        """converts the string at the position of a number, raising a ValueError naming its column if it can not be
+        read"""
+        value = self._attributes[position]
+        if value is None:
+            return None
+        column_name, converter = _number_converters[position]
+        try:
+            return converter(value)
+        except ValueError:
+            raise ValueError(f'{column_name} "{value}" is not a valid number') from None
@@ -1,8 +1,23 @@
 """This module configures the filtering settings as set by the user and then filters a list of meteorites based on
 those settings. The filtered list can then be output in 3 ways according to user input"""
 from Meteorite import *
+from Catalog_Cache import *
+from Columnar_File import *
+from Console_Renderer import *
+from Filter_Backend import *
+from Group_Summary import *
+from Meteorite_Query import *
+from Meteorite_Table import *
+from Parallel_Loader import *
+from Result_Cache import *
+from Sharded_Catalog import *
+from Stage_Profiler import *
 from utility_functions import *
 from xlwt import Workbook
+from Xlsx_Writer import *
+import os
+import sys
+import time
 
 
 class Meteorite_Filter:
@@ -13,8 +28,14 @@ class Meteorite_Filter:
                            'GeoLocation', 'States', 'Counties']
     filtering_options = ['mass', 'year']
     output_format_options = ['terminal', 'text file', 'excel file']
+    # formats that are too large for the menu prompt but can be chosen from the command line or a job file
+    additional_output_format_options = ['xlsx file', 'console table', 'columnar file']
+    all_output_format_options = output_format_options + additional_output_format_options
+    text_file_buffer_size = 1 << 20
+    # mass (g), year, reclat and reclong are written to spreadsheets as numbers rather than text
+    numeric_attribute_indexes = [4, 6, 7, 8]
     accepted_file_modes = ['r', 'w', 'x', 'a']
-    file_name_prompt = 'Enter the name of a file containing meteorite data that you would like filtered, with file extension included(ex: "file_name.txt")\nEnter ">q" or ">Q" to quit\n>>'
+    file_name_prompt = 'Enter the name of a file containing meteorite data that you would like filtered, with file extension included(ex: "file_name.txt"), or a folder or glob pattern(ex: "shards/*.txt") of many data files\nEnter ">q" or ">Q" to quit\n>>'
     file_mode_prompt = 'What mode would you like to open the file with?\n"r" - open for reading(default)\n"w" - open for writing, truncating the file first. (WARNING: this mode will delete the contents of an existing file!)\n"x" - open for exclusive creation, failing if the file already exists\n"a" - open for writing, appending to the end of file if it exists\nEnter ">q" or ">Q" to quit\n>>'
     filtering_parameter_prompt = 'What parameter would you like to filter the meteorites by?\n1. Mass\n2. Year\n3. Quit\n>>'
     lower_bound_prompt = '''What is the lower bound of your filtering parameter?(inclusive)("Q" to quit)\n>>'''
@@ -27,14 +48,26 @@ class Meteorite_Filter:
         all ultimately be used for the filtering process"""
         self.user_input = None
         self.valid_input = None
-        self.meteorite_list = []
+        self.meteorite_table = Meteorite_Table()
         self.filtered_list = []
+        self.filtered_rows = []
         self.file_name = None
         self.file_mode = None
         self.filtering_parameter = None
         self.lower_bound = None
         self.upper_bound = None
         self.output_format = None
+        self.worker_count = 1
+        self.use_cache = True
+        self.query = None
+        self.nearest = None
+        self.backend = 'python'
+        self.filter_backend = None
+        self.group_by = None
+        self.result_cache = None
+        self.console_limit = None
+        self.console_page_size = None
+        self.sharded_catalog = None
 
     def get_input_from_user(self):
         """All information that is needed from the user for the filtering program to run is collected here.
@@ -63,7 +96,7 @@ class Meteorite_Filter:
         quit_options = ['>q', '>Q']
         user_input = input(self.file_name_prompt)
         check_for_quit(user_input, quit_options)
-        self.valid_input = is_file_name(user_input)
+        self.valid_input = is_file_name(user_input) or is_shard_file_name(user_input)
         if not self.valid_input:
             print(f'ERROR: "{user_input}" is not a valid file name')
         return user_input
@@ -179,48 +212,229 @@ class Meteorite_Filter:
 
     def create_meteorite_list(self):
         """Uses the set file name and file mode to open a text file and read it for meteorite data.
-        Creates a list containing all meteorites it finds as meteorite objects"""
-        meteorite_file = open(self.file_name, self.file_mode)
-        # This stray readline function is here to skip over the header in the text file and immediately read the data
-        meteorite_file.readline()
-        for line in meteorite_file:
-            meteorite = Meteorite()
-            meteorite.set_meteorite_from_string(line)
-            self.meteorite_list.append(meteorite)
+        Every meteorite it finds is added as a row of the meteorite_table. When the file is opened for reading, a
+        parsed copy of it is loaded from the cache if the file has not changed since the cache was saved. Otherwise
+        the file is parsed and the cache is saved for the next run. A columnar file, such as one written by the
+        'columnar file' output format, is loaded directly without any parsing. A folder or glob pattern is loaded as a
+        catalog split over many shard files, skipping the shards that can not match the filter"""
+        with profile_stage('load') as stage:
+            if is_shard_pattern(self.file_name):
+                self.meteorite_table = self.get_sharded_catalog().load(self.get_filter_bounds())
+                stage.rows = len(self.meteorite_table)
+                return
+            file_identity = get_file_identity(self.file_name)
+            if self.file_mode == 'r' and is_columnar_file(self.file_name):
+                self.meteorite_table = read_meteorite_table(self.file_name)
+            elif not self.use_cache or self.file_mode != 'r':
+                self.read_meteorite_file()
+            else:
+                cached_table = load_cached_meteorite_table(self.file_name)
+                if cached_table is not None:
+                    self.meteorite_table = cached_table
+                else:
+                    source_identity = get_source_identity(self.file_name)
+                    self.read_meteorite_file()
+                    save_meteorite_table_to_cache(self.file_name, self.meteorite_table, source_identity)
+            self.meteorite_table.source_identity = file_identity
+            stage.rows = len(self.meteorite_table)
+
+    def get_sharded_catalog(self):
+        """returns the Sharded_Catalog for the folder or glob pattern in file_name, creating it if none has been set"""
+        if self.sharded_catalog is None:
+            self.sharded_catalog = Sharded_Catalog(self.file_name, self.worker_count, self.use_cache)
+        return self.sharded_catalog
+
+    def get_filter_bounds(self):
+        """returns the bounds the filtering parameter and the query put on each indexed column, which decide the
+        shards of a sharded catalog that are loaded"""
+        return get_filter_bounds(self.filtering_parameter, self.lower_bound, self.upper_bound, self.query)
+
+    def read_meteorite_file(self):
+        """Parses the text file into the meteorite_table and builds its sorted indexes. When more than one worker is
+        set and the file is opened for reading, the file is split up and parsed by that many processes at once"""
+        with profile_stage('parse') as stage:
+            if self.worker_count > 1 and self.file_mode == 'r':
+                self.meteorite_table = load_meteorite_table_in_parallel(self.file_name, self.worker_count)
+            else:
+                meteorite_file = open(self.file_name, self.file_mode)
+                # This stray readline function is here to skip over the header in the text file and immediately read
+                # the data
+                meteorite_file.readline()
+                malformed_lines = self.meteorite_table.add_meteorites_from_lines(meteorite_file)
+                meteorite_file.close()
+                report_malformed_lines(self.file_name, malformed_lines)
+                self.meteorite_table.build_sorted_indexes()
+            stage.rows = len(self.meteorite_table)
 
     def filter_meteorite_list(self):
-        """Creates a new list of meteorites called filtered_list that consists only of meteorites from meteorite_list
-        that fit the filtering criteria"""
-        for meteorite in self.meteorite_list:
-            if meteorite.mass is not None and self.filtering_parameter == 'mass' and self.lower_bound <= meteorite.mass < self.upper_bound:
-                self.filtered_list.append(meteorite)
-            elif meteorite.year is not None and self.filtering_parameter == 'year' and self.lower_bound <= meteorite.year < self.upper_bound:
-                self.filtered_list.append(meteorite)
-
-    def create_text_file(self):
+        """Creates a new list of meteorites called filtered_list that consists only of meteorites from meteorite_table
+        that fit the filtering criteria. The matching rows are found by a binary search over the sorted index of the
+        filtering parameter, or by a boolean mask over the whole column with the numpy backend, and only those rows
+        are turned into Meteorite objects. When a Meteorite_Query has been set, its predicates are used as the
+        filtering criteria instead. When nearest is set to a latitude, longitude and count, only that many of the
+        closest matching meteorites are kept. A plain parameter filter that has been run before on the same data
+        takes its rows from the result_cache when one has been set"""
+        with profile_stage('filter') as stage:
+            if self.nearest is not None:
+                self.filter_nearest(*self.nearest)
+            elif self.query is not None:
+                self.add_rows_to_filtered_list(self.query.run(self.meteorite_table))
+            elif self.filtering_parameter in Meteorite_Filter.filtering_options:
+                self.add_rows_to_filtered_list(self.get_parameter_filter_rows())
+            stage.rows = len(self.filtered_list)
+
+    def get_parameter_filter_rows(self):
+        """returns the rows with a value for the filtering parameter between the bounds, from the result_cache if
+        the same filter has been run before and otherwise from the filter backend"""
+        result_key = self.get_result_key()
+        row_indices = None if result_key is None else self.result_cache.get_rows(result_key)
+        if row_indices is None:
+            row_indices = self.get_filter_backend().filter_rows(self.filtering_parameter, self.lower_bound,
+                                                                self.upper_bound)
+            if result_key is not None:
+                self.result_cache.put_rows(result_key, row_indices)
+        return row_indices
+
+    def get_result_key(self):
+        """returns the key the results of this filter are kept under in the result_cache, or None if they can not
+        be cached. Only filters on a single parameter are cached, since queries and nearest searches are not part of
+        the key"""
+        if self.result_cache is None or self.query is not None or self.nearest is not None:
+            return None
+        return create_result_key(self.meteorite_table, self.filtering_parameter, self.lower_bound, self.upper_bound)
+
+    def write_formatted_output(self, output_file, output_format, create_lines):
+        """Writes the formatted output of filtered_list for an output format to an open file, where create_lines()
+        returns an iterable of its lines. When the results can be kept in the result_cache, the whole output is
+        taken from the cache if it has been built for the same results before, and is otherwise joined into a
+        single string and added to the cache. Without a cache the lines are streamed to the file one by one, so
+        memory use does not grow with the size of the results"""
+        result_key = self.get_result_key()
+        if result_key is None:
+            output_file.writelines(create_lines())
+            return
+        output = self.result_cache.get_output(result_key, output_format)
+        if output is None:
+            output = ''.join(create_lines())
+            self.result_cache.put_output(result_key, output_format, output)
+        output_file.write(output)
+
+    def add_rows_to_filtered_list(self, row_indices):
+        """turns rows of the meteorite_table into Meteorite objects at the end of filtered_list, and keeps their row
+        indices in filtered_rows so that the results can be summarized straight from the table"""
+        for index in row_indices:
+            self.filtered_rows.append(index)
+            self.filtered_list.append(self.meteorite_table.get_meteorite(index))
+
+    def get_filter_backend(self):
+        """returns the selected backend for the meteorite_table, creating it again if the table has changed since"""
+        if self.filter_backend is None or self.filter_backend.meteorite_table is not self.meteorite_table or \
+                self.filter_backend.row_count != len(self.meteorite_table):
+            self.filter_backend = create_filter_backend(self.meteorite_table, self.backend)
+        return self.filter_backend
+
+    def print_statistics(self):
+        """prints the count, mass totals and year and recclass histograms of the filtered meteorites"""
+        statistics = self.get_filter_backend().summarize(self.filtered_rows)
+        print(f'Meteorites: {statistics["count"]}')
+        print(f'With a known mass: {statistics["mass_count"]}')
+        if statistics['mass_count']:
+            print(f'Total mass (g): {statistics["mass_sum"]:,.2f}')
+            print(f'Mean mass (g): {statistics["mass_mean"]:,.2f}')
+            print(f'Median mass (g): {statistics["mass_median"]:,.2f}')
+        print('Meteorites by decade:')
+        for year_bin, count in statistics['year_histogram'].items():
+            print(f'{year_bin:>8}  {count}')
+        print('Meteorites by recclass:')
+        for rec_class, count in statistics['recclass_histogram'].items():
+            print(f'{rec_class or "":>30}  {count}')
+
+    def filter_by_radius(self, latitude, longitude, radius_km):
+        """fills filtered_list with every meteorite within radius_km of a point, closest first, using the spatial
+        index of the meteorite_table"""
+        spatial_index = self.meteorite_table.get_spatial_index()
+        self.add_rows_to_filtered_list(index for distance, index in
+                                       spatial_index.get_rows_within_radius(latitude, longitude, radius_km))
+
+    def filter_nearest(self, latitude, longitude, count):
+        """fills filtered_list with the count meteorites closest to a point, closest first. When a query has been
+        set, only meteorites matching the query are counted"""
+        row_filter = None
+        if self.query is not None:
+            row_filter = lambda row_indices: self.query.filter_rows(self.meteorite_table, row_indices)
+        spatial_index = self.meteorite_table.get_spatial_index()
+        self.add_rows_to_filtered_list(index for distance, index in
+                                       spatial_index.get_nearest_rows(latitude, longitude, count, row_filter))
+
+    def filter_by_bounding_box(self, lower_latitude, upper_latitude, lower_longitude, upper_longitude):
+        """fills filtered_list with every meteorite whose reclat is in [lower_latitude, upper_latitude) and whose
+        reclong is in [lower_longitude, upper_longitude), in table order. A lower_longitude greater than
+        upper_longitude makes a box that crosses the 180th meridian"""
+        spatial_index = self.meteorite_table.get_spatial_index()
+        self.add_rows_to_filtered_list(spatial_index.get_rows_in_bounding_box(lower_latitude, upper_latitude,
+                                                                              lower_longitude, upper_longitude))
+
+    def create_text_file(self, meteorites=None):
         """creates a new text file in the project folder named based on the exact time of creation, containing the
         filtering results. This text file has the same format as the original meteorite_landings.txt file and can
-        therefore be used as a new data file for another run of the filtering program"""
+        therefore be used as a new data file for another run of the filtering program. Any iterable of meteorites can
+        be written in place of the filtered_list. Each meteorite is joined into a single line and the lines are
+        written through a large buffer, so big results are written in a few large writes"""
         clean_timestamp_str = get_clean_datetime_string()
-        output_file = open(f'{clean_timestamp_str}.txt', 'a')
-        output_file.write(f'{self.table_header} + \n')
-        for meteorite in self.filtered_list:
-            for attribute in meteorite.attribute_list:
-                output_file.write(f'{attribute}\t')
-            output_file.write('\n')
+        with open(f'{clean_timestamp_str}.txt', 'w', buffering=Meteorite_Filter.text_file_buffer_size) as output_file:
+            output_file.write(f'{self.table_header}\n')
+            if meteorites is None:
+                self.write_formatted_output(output_file, 'text file', lambda: (
+                    create_data_string(meteorite) for meteorite in self.filtered_list))
+            else:
+                output_file.writelines(create_data_string(meteorite) for meteorite in meteorites)
         print(f'\n\033Filtered output sent to "{clean_timestamp_str}.txt"\033')
 
-    def create_excel_file(self):
+    def create_columnar_file(self, meteorites=None):
+        """Creates a new columnar file in the project folder named based on the time of creation, containing the
+        filtering results. The rows that matched are copied straight out of the meteorite_table's columns, so mass,
+        year, reclat and reclong stay numbers, and the file can be used as the data file for another run of the
+        filtering program or have single columns read from it by Columnar_File.read_columns(). Any iterable of
+        meteorites can be written in place of the filtered_list"""
+        if meteorites is None:
+            columnar_table = self.meteorite_table.select_rows(self.filtered_rows)
+        else:
+            columnar_table = Meteorite_Table()
+            for meteorite in meteorites:
+                columnar_table.add_meteorite_from_list(meteorite)
+        columnar_table.build_sorted_indexes()
+        file_name = f'{get_clean_datetime_string()}{columnar_file_extension}'
+        write_meteorite_table(columnar_table, file_name, {'filtered_from': os.path.abspath(self.file_name)})
+        print(f'\n\033Filtered output sent to "{file_name}"\033')
+
+    def create_excel_file(self, meteorites=None):
         """sends the filtered list of meteorites to a new excel file in the project folder, named based on time of
         creation. Each attribute is contained within a single cell in the excel document"""
         excel_workbook = Workbook()
         filtered_data_sheet = excel_workbook.add_sheet('filteredMeteoriteData')
         self.label_excel_columns(filtered_data_sheet)
-        self.write_data_to_excel(filtered_data_sheet)
+        self.write_data_to_excel(filtered_data_sheet, meteorites)
         clean_timestamp_str = get_clean_datetime_string()
         excel_workbook.save(f'{clean_timestamp_str}.xls')
         print(f'\n\033Filtered output sent to "{clean_timestamp_str}.xls"\033')
 
+    def create_xlsx_file(self, meteorites=None):
+        """sends the filtered list of meteorites to a new .xlsx excel file in the project folder, named based on time
+        of creation. Rows are streamed to the file in batches instead of building the workbook in memory, so there is
+        no limit on the number of meteorites like there is for the 65,536 rows of an .xls file. Mass, year, reclat
+        and reclong are written as numbers"""
+        if meteorites is None:
+            meteorites = self.filtered_list
+        clean_timestamp_str = get_clean_datetime_string()
+        start_time = time.perf_counter()
+        with Xlsx_Writer(f'{clean_timestamp_str}.xlsx', 'filteredMeteoriteData', Meteorite_Filter.attribute_name_list,
+                         Meteorite_Filter.numeric_attribute_indexes) as xlsx_writer:
+            row_count = xlsx_writer.write_rows(meteorites)
+        elapsed_time = time.perf_counter() - start_time
+        print(f'\n\033Filtered output sent to "{clean_timestamp_str}.xlsx"\033')
+        print(f'{row_count} rows written in {elapsed_time:.2f} seconds '
+              f'({row_count / max(elapsed_time, 1e-9):,.0f} rows per second)')
+
     def label_excel_columns(self, excel_sheet):
         """writes a header into the excel document on the first row. Each column will be named for the attribute
         data it contains"""
@@ -229,36 +443,186 @@ class Meteorite_Filter:
             excel_sheet.write(0, index, name)
             index = index + 1
 
-    def write_data_to_excel(self, excel_sheet):
-        """fills the excel document with meteorite data from the filtered_list. Each row corresponds
-        to a single meteorite"""
-        for index in range(len(self.filtered_list)):
-            meteorite = self.filtered_list[index]
-            attribute_list = meteorite.attribute_list
-            for attribute_index in range(len(attribute_list)):
-                excel_sheet.write(index + 1, attribute_index, attribute_list[attribute_index])
+    def write_data_to_excel(self, excel_sheet, meteorites=None):
+        """fills the excel document with meteorite data from the filtered_list, or from any other iterable of
+        meteorites that is given. Each row corresponds to a single meteorite"""
+        if meteorites is None:
+            meteorites = self.filtered_list
+        for index, meteorite in enumerate(meteorites):
+            for attribute_index, attribute in enumerate(meteorite):
+                excel_sheet.write(index + 1, attribute_index, attribute)
 
-    def output_meteorite_list(self):
+    def output_meteorite_list(self, meteorites=None):
         """Takes a different action depending on the selected output format after filtering is complete. All options
-        are different ways of writing the data entered in the filtered_list"""
+        are different ways of writing the data entered in the filtered_list. Passing an iterable of meteorites writes
+        those instead, which lets a generator be written without ever being turned into a list"""
+        with profile_stage(self.output_format) as stage:
+            if self.output_format == 'terminal':
+                self.print_results_to_console(meteorites)
+            elif self.output_format == 'text file':
+                self.create_text_file(meteorites)
+            elif self.output_format == 'excel file':
+                self.create_excel_file(meteorites)
+            elif self.output_format == 'xlsx file':
+                self.create_xlsx_file(meteorites)
+            elif self.output_format == 'console table':
+                self.print_console_table(meteorites)
+            elif self.output_format == 'columnar file':
+                self.create_columnar_file(meteorites)
+            else:
+                print('could not output filtered meteorite list')
+            if meteorites is None:
+                stage.rows = len(self.filtered_list)
+
+    def create_group_summary(self, meteorites=None):
+        """Returns a Group_Summary of the filtered meteorites grouped by group_by. The rows in filtered_rows are
+        summarized straight from the meteorite_table, and any other iterable of meteorites, such as a stream, is
+        summarized one meteorite at a time"""
+        group_summary = Group_Summary(self.group_by)
+        if meteorites is not None:
+            return group_summary.add_meteorites(meteorites)
+        return group_summary.add_table_rows(self.meteorite_table, self.filtered_rows)
+
+    def output_group_summary(self, group_summary):
+        """writes a summary table in the selected output format, the same way output_meteorite_list() writes
+        meteorites"""
+        header = group_summary.get_header()
+        rows = group_summary.get_rows()
         if self.output_format == 'terminal':
-            self.print_results_to_console()
+            spacing = 30
+            print(''.join(f'{name:<{spacing}}' for name in header))
+            print('=' * spacing * len(header))
+            for group, count, mass_total in rows:
+                print(f'{group:<{spacing}}{count:<{spacing}}{mass_total:<{spacing},.2f}')
         elif self.output_format == 'text file':
-            self.create_text_file()
+            clean_timestamp_str = get_clean_datetime_string()
+            with open(f'{clean_timestamp_str}_summary.txt', 'w') as output_file:
+                output_file.write(create_data_string(header))
+                output_file.writelines(create_data_string([group, count, f'{mass_total:.2f}'])
+                                       for group, count, mass_total in rows)
+            print(f'\n\033Summary sent to "{clean_timestamp_str}_summary.txt"\033')
         elif self.output_format == 'excel file':
-            self.create_excel_file()
+            excel_workbook = Workbook()
+            summary_sheet = excel_workbook.add_sheet('meteoriteSummary')
+            for row_index, row in enumerate([header] + rows):
+                for column_index in range(len(row)):
+                    summary_sheet.write(row_index, column_index, row[column_index])
+            clean_timestamp_str = get_clean_datetime_string()
+            excel_workbook.save(f'{clean_timestamp_str}_summary.xls')
+            print(f'\n\033Summary sent to "{clean_timestamp_str}_summary.xls"\033')
+        elif self.output_format == 'xlsx file':
+            clean_timestamp_str = get_clean_datetime_string()
+            with Xlsx_Writer(f'{clean_timestamp_str}_summary.xlsx', 'meteoriteSummary', header, [1, 2]) as xlsx_writer:
+                xlsx_writer.write_rows(rows)
+            print(f'\n\033Summary sent to "{clean_timestamp_str}_summary.xlsx"\033')
+        elif self.output_format == 'console table':
+            self.create_console_renderer(header).render(
+                [[str(group), f'{count:,}', f'{mass_total:,.2f}'] for group, count, mass_total in rows], len(rows))
+        else:
+            print('could not output summary')
+
+    def stream_meteorites(self):
+        """A generator that reads the data file one line at a time and yields a Meteorite object for each line.
+        Only one line of the file is held in memory at a time. Lines that can not be parsed are reported and skipped.
+        A columnar file has no lines, so it is loaded whole and a Meteorite object is yielded for each of its rows.
+        The shards of a folder or glob pattern are streamed one after another, leaving out meteorites whose id has
+        already been seen, and shards that can not match the filter are skipped the same way they are when loading"""
+        if is_shard_pattern(self.file_name):
+            yield from self.stream_sharded_meteorites()
+            return
+        if self.file_mode == 'r' and is_columnar_file(self.file_name):
+            meteorite_table = read_meteorite_table(self.file_name)
+            for index in range(len(meteorite_table)):
+                yield meteorite_table.get_meteorite(index)
+            return
+        with open(self.file_name, self.file_mode) as meteorite_file:
+            # skip over the header in the text file the same way create_meteorite_list() does
+            meteorite_file.readline()
+            for line_number, line in enumerate(meteorite_file, 2):
+                try:
+                    meteorite = Meteorite.from_string(line)
+                except ValueError as error:
+                    report_malformed_lines(self.file_name, [(line_number, str(error))])
+                    continue
+                yield meteorite
+
+    def stream_sharded_meteorites(self):
+        """yields the meteorites of every shard of a sharded catalog that could match the filter, in shard order"""
+        sharded_catalog = self.get_sharded_catalog()
+        shard_states = sharded_catalog.get_shard_states()
+        selected_shards = {shard_file for shard_file, shard_identity, columnar_file
+                           in sharded_catalog.select_shards(self.get_filter_bounds(), shard_states)}
+        seen_ids = set()
+        for shard_file, shard_identity, columnar_file in shard_states:
+            if shard_file not in selected_shards:
+                seen_ids.update(sharded_catalog.get_shard_ids(columnar_file))
+                continue
+            shard_filter = Meteorite_Filter()
+            shard_filter.file_name = shard_file
+            shard_filter.file_mode = 'r'
+            for meteorite in shard_filter.stream_meteorites():
+                if meteorite.id is not None:
+                    meteorite_id = int(meteorite.id)
+                    if meteorite_id in seen_ids:
+                        continue
+                    seen_ids.add(meteorite_id)
+                yield meteorite
+
+    def stream_filtered_meteorites(self):
+        """A generator that yields only the meteorites from stream_meteorites() that fit the filtering criteria"""
+        for meteorite in self.stream_meteorites():
+            if self.meteorite_fits_filter(meteorite):
+                yield meteorite
+
+    def meteorite_fits_filter(self, meteorite):
+        """checks a single meteorite against the filtering parameter and bounds, or against the query when one has
+        been set. Meteorites missing a value for the filtering parameter never fit"""
+        if self.query is not None:
+            return self.query.matches_meteorite(meteorite)
+        if self.filtering_parameter == 'mass':
+            value = meteorite.mass
+        elif self.filtering_parameter == 'year':
+            value = meteorite.year
         else:
-            print('could not output filtered meteorite list')
+            return False
+        return value is not None and self.lower_bound <= value < self.upper_bound
 
-    def print_results_to_console(self):
-        """prints the meteorite data for each meteorite in filtered_list neatly to the console with a table header"""
+    def stream_meteorite_list(self):
+        """Runs the whole filter as a single pipeline. Lines flow from the data file through the filter and straight
+        into the selected output without the data set or the results ever being stored in a list, so memory use stays
+        the same for any size of file and the first results are written right away"""
+        self.output_meteorite_list(self.stream_filtered_meteorites())
+
+    def print_results_to_console(self, meteorites=None):
+        """prints the meteorite data for each meteorite in filtered_list neatly to the console with a table header.
+        Any iterable of meteorites can be printed in place of the filtered_list, one row at a time. When a
+        result_cache is set, the rows of the filtered_list are printed as a single block of text that is kept in it"""
         spacing = 30
         for name in Meteorite_Filter.attribute_name_list:
             print(f'{name:<{spacing}}', end='')
         print('\n' + '=' * spacing * 10)
-        for meteorite in self.filtered_list:
-            for attribute in meteorite.attribute_list:
-                if attribute is None:
-                    attribute = ''
-                print(f'{attribute:<{spacing}}', end='')
-            print()
+        if meteorites is None:
+            self.write_formatted_output(sys.stdout, 'terminal', lambda: (
+                create_console_row(meteorite, spacing) for meteorite in self.filtered_list))
+            return
+        for meteorite in meteorites:
+            print(create_console_row(meteorite, spacing), end='')
+
+    def print_console_table(self, meteorites=None):
+        """Prints the meteorites in filtered_list, or any other iterable of meteorites, as a table with columns sized
+        to the data. Only the first console_limit meteorites are printed when it is set, and the table is paged every
+        console_page_size meteorites. Returns the number of meteorites printed"""
+        console_renderer = self.create_console_renderer(Meteorite_Filter.attribute_name_list)
+        if meteorites is None:
+            return console_renderer.render(self.filtered_list, len(self.filtered_list))
+        return console_renderer.render(meteorites)
+
+    def create_console_renderer(self, header):
+        """returns a Console_Renderer for a table with the given header, using the filter's limit and page size"""
+        return Console_Renderer(header, limit=self.console_limit, page_size=self.console_page_size)
+
+
+def create_console_row(attribute_list, spacing):
+    """returns a single meteorite as a line of the console table, with every attribute padded to spacing
+    characters"""
+    return ''.join(f'{"" if attribute is None else attribute:<{spacing}}' for attribute in attribute_list) + '\n'
@@ -0,0 +1,280 @@
+"""This module filters a Meteorite_Table on several conditions at once, such as a range of mass AND a range of year AND
+a set of recclass values AND a latitude/longitude bounding box. Each condition is a predicate. Before a query is run,
+every predicate estimates how many rows it will match, and the query starts from the rows matched by the most selective
+predicate, found through a sorted index or the row lists of an encoded column. The remaining predicates are then
+checked from most to least selective on an ever shrinking set of rows"""
+from Meteorite_Table import *
+
+# short names that can be used in place of the data file column names
+column_aliases = {'mass': 'mass (g)', 'states': 'States', 'counties': 'Counties', 'geolocation': 'GeoLocation'}
+# the Sorted_Index in a Meteorite_Table that covers each numeric column, if there is one
+indexed_columns = {'mass (g)': 'mass', 'year': 'year', 'reclat': 'reclat', 'reclong': 'reclong'}
+
+
+def get_column_name(name):
+    """turns a column name or alias into a column name from the data file header. Raises a ValueError for names
+    that do not match any column"""
+    column_name = column_aliases.get(name.lower(), name)
+    if column_name not in Meteorite_Table.column_names:
+        raise ValueError(f'"{name}" is not a meteorite data column')
+    return column_name
+
+
+def get_meteorite_value(meteorite, column_name):
+    """returns the value of a column for a Meteorite object, typed the same way Meteorite_Table.get_value() types it.
+    Mass, year, reclat and reclong are read from the numbers the meteorite already holds"""
+    position = Meteorite_Table.column_names.index(column_name)
+    if position in number_positions:
+        return getattr(meteorite, field_names[position])
+    value = meteorite[position]
+    if value is None or column_name not in Meteorite_Table.numeric_column_names:
+        return value
+    return float(value)
+
+
+class Range_Predicate:
+    """Matches rows whose value for a numeric column is in [lower_bound, upper_bound), the same as the mass and year
+    filters. Rows with no value never match"""
+    def __init__(self, column_name, lower_bound, upper_bound):
+        self.column_name = get_column_name(column_name)
+        if self.column_name not in Meteorite_Table.numeric_column_names:
+            raise ValueError(f'"{column_name}" is not a numeric column')
+        self.lower_bound = lower_bound
+        self.upper_bound = upper_bound
+
+    def estimate_row_count(self, meteorite_table):
+        """counts the matching rows exactly with a sorted index, or assumes every row matches without one"""
+        if self.column_name in indexed_columns:
+            return meteorite_table.get_sorted_index(indexed_columns[self.column_name]).count_range(self.lower_bound,
+                                                                                                    self.upper_bound)
+        return len(meteorite_table)
+
+    def get_candidate_rows(self, meteorite_table):
+        """returns every matching row index in table order"""
+        if self.column_name in indexed_columns:
+            return meteorite_table.get_sorted_index(indexed_columns[self.column_name]).range_query(self.lower_bound,
+                                                                                                    self.upper_bound)
+        return self.filter_rows(meteorite_table, range(len(meteorite_table)))
+
+    def filter_rows(self, meteorite_table, row_indices):
+        """returns only the row indices whose value is inside the bounds. Missing values are nan or MISSING_INTEGER,
+        and neither can land inside the bounds once MISSING_INTEGER is ruled out"""
+        column = meteorite_table.get_column(self.column_name)
+        lower_bound = self.lower_bound
+        upper_bound = self.upper_bound
+        return [index for index in row_indices
+                if lower_bound <= column[index] < upper_bound and column[index] != MISSING_INTEGER]
+
+    def matches_meteorite(self, meteorite):
+        """checks a single Meteorite object against the predicate"""
+        value = get_meteorite_value(meteorite, self.column_name)
+        return value is not None and self.lower_bound <= value < self.upper_bound
+
+
+class Membership_Predicate:
+    """Matches rows whose value for a column is one of a set of values, such as a recclass of 'L5' or 'H5'. A single
+    value makes this an equality check"""
+    def __init__(self, column_name, values):
+        self.column_name = get_column_name(column_name)
+        self.values = set(values)
+        if self.column_name in Meteorite_Table.numeric_column_names:
+            self.values = {float(value) for value in self.values}
+
+    def estimate_row_count(self, meteorite_table):
+        """counts the matching rows exactly for encoded columns, or assumes every row matches for other columns"""
+        if self.column_name in Meteorite_Table.encoded_column_names:
+            column = meteorite_table.get_column(self.column_name)
+            return sum(len(column.get_rows_with_value(value)) for value in self.values)
+        return len(meteorite_table)
+
+    def get_candidate_rows(self, meteorite_table):
+        """returns every matching row index in table order, merging the row lists of an encoded column"""
+        if self.column_name in Meteorite_Table.encoded_column_names:
+            column = meteorite_table.get_column(self.column_name)
+            candidate_rows = []
+            for value in self.values:
+                candidate_rows.extend(column.get_rows_with_value(value))
+            return sorted(candidate_rows)
+        return self.filter_rows(meteorite_table, range(len(meteorite_table)))
+
+    def filter_rows(self, meteorite_table, row_indices):
+        """returns only the row indices whose value is in the set of values"""
+        if self.column_name in Meteorite_Table.encoded_column_names:
+            column = meteorite_table.get_column(self.column_name)
+            codes = {column.codes_by_value[value] for value in self.values if value in column.codes_by_value}
+            return [index for index in row_indices if column.codes[index] in codes]
+        return [index for index in row_indices if meteorite_table.get_value(self.column_name, index) in self.values]
+
+    def matches_meteorite(self, meteorite):
+        """checks a single Meteorite object against the predicate"""
+        return get_meteorite_value(meteorite, self.column_name) in self.values
+
+
+class Bounding_Box_Predicate:
+    """Matches rows whose reclat is in [lower_latitude, upper_latitude) and whose reclong is in
+    [lower_longitude, upper_longitude). When lower_longitude is greater than upper_longitude the box crosses the
+    180th meridian, and longitudes at or above lower_longitude or below upper_longitude match"""
+    def __init__(self, lower_latitude, upper_latitude, lower_longitude, upper_longitude):
+        self.latitude_predicate = Range_Predicate('reclat', lower_latitude, upper_latitude)
+        if lower_longitude > upper_longitude:
+            self.longitude_predicates = [Range_Predicate('reclong', lower_longitude, float('inf')),
+                                         Range_Predicate('reclong', float('-inf'), upper_longitude)]
+        else:
+            self.longitude_predicates = [Range_Predicate('reclong', lower_longitude, upper_longitude)]
+
+    def estimate_row_count(self, meteorite_table):
+        """the box can match no more rows than either its latitude range or its longitude range"""
+        return min(self.latitude_predicate.estimate_row_count(meteorite_table),
+                   self._estimate_longitude_row_count(meteorite_table))
+
+    def get_candidate_rows(self, meteorite_table):
+        """starts from whichever of the latitude or longitude range matches fewer rows and checks the other"""
+        if self.latitude_predicate.estimate_row_count(meteorite_table) <= \
+                self._estimate_longitude_row_count(meteorite_table):
+            return self._filter_longitude_rows(meteorite_table,
+                                               self.latitude_predicate.get_candidate_rows(meteorite_table))
+        candidate_rows = []
+        for predicate in self.longitude_predicates:
+            candidate_rows.extend(predicate.get_candidate_rows(meteorite_table))
+        return self.latitude_predicate.filter_rows(meteorite_table, sorted(candidate_rows))
+
+    def filter_rows(self, meteorite_table, row_indices):
+        """returns only the row indices that are inside the box"""
+        return self._filter_longitude_rows(meteorite_table,
+                                           self.latitude_predicate.filter_rows(meteorite_table, row_indices))
+
+    def matches_meteorite(self, meteorite):
+        """checks a single Meteorite object against the predicate"""
+        return self.latitude_predicate.matches_meteorite(meteorite) and \
+            any(predicate.matches_meteorite(meteorite) for predicate in self.longitude_predicates)
+
+    def _estimate_longitude_row_count(self, meteorite_table):
+        """adds up the longitude ranges, since there are two of them when the box crosses the 180th meridian"""
+        return sum(predicate.estimate_row_count(meteorite_table) for predicate in self.longitude_predicates)
+
+    def _filter_longitude_rows(self, meteorite_table, row_indices):
+        """keeps the rows that match any of the longitude ranges, in their original order"""
+        if len(self.longitude_predicates) == 1:
+            return self.longitude_predicates[0].filter_rows(meteorite_table, row_indices)
+        matching_rows = set()
+        for predicate in self.longitude_predicates:
+            matching_rows.update(predicate.filter_rows(meteorite_table, row_indices))
+        return [index for index in row_indices if index in matching_rows]
+
+
+class Radius_Predicate:
+    """Matches rows whose reclat and reclong are within radius_km of a point, measured along the surface of the
+    earth. Candidate rows come from the cells of the table's Spatial_Index around the point"""
+    def __init__(self, latitude, longitude, radius_km):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+
+    def estimate_row_count(self, meteorite_table):
+        """counts the rows in the grid cells that the circle overlaps, which is never less than the true count"""
+        return len(meteorite_table.get_spatial_index().get_candidate_rows_within_radius(self.latitude, self.longitude,
+                                                                                         self.radius_km))
+
+    def get_candidate_rows(self, meteorite_table):
+        """returns every matching row index in table order"""
+        rows_within_radius = meteorite_table.get_spatial_index().get_rows_within_radius(self.latitude, self.longitude,
+                                                                                        self.radius_km)
+        return sorted(index for distance, index in rows_within_radius)
+
+    def filter_rows(self, meteorite_table, row_indices):
+        """returns only the row indices within the radius, measuring all of their distances in one batch"""
+        row_indices = [index for index in row_indices if meteorite_table.get_value('reclat', index) is not None and
+                       meteorite_table.get_value('reclong', index) is not None]
+        distances = haversine_distances(self.latitude, self.longitude,
+                                        [meteorite_table.rec_lats[index] for index in row_indices],
+                                        [meteorite_table.rec_longs[index] for index in row_indices])
+        return [index for index, distance in zip(row_indices, distances) if distance <= self.radius_km]
+
+    def matches_meteorite(self, meteorite):
+        """checks a single Meteorite object against the predicate"""
+        latitude = get_meteorite_value(meteorite, 'reclat')
+        longitude = get_meteorite_value(meteorite, 'reclong')
+        if latitude is None or longitude is None:
+            return False
+        return haversine_distances(self.latitude, self.longitude, [latitude], [longitude])[0] <= self.radius_km
+
+
+class Meteorite_Query:
+    """A Meteorite_Query is a list of predicates that must all match. Running the query returns the matching row
+    indices of a Meteorite_Table in table order"""
+    def __init__(self, predicates=None):
+        self.predicates = list(predicates or [])
+
+    def add_predicate(self, predicate):
+        """adds another condition that every matching row must meet"""
+        self.predicates.append(predicate)
+
+    def order_predicates(self, meteorite_table):
+        """returns the predicates sorted from the fewest to the most estimated matching rows"""
+        return sorted(self.predicates, key=lambda predicate: predicate.estimate_row_count(meteorite_table))
+
+    def run(self, meteorite_table):
+        """Finds every row that matches all of the predicates. The most selective predicate supplies the starting
+        rows, and each of the others only has to check the rows that are still left"""
+        if not self.predicates:
+            return list(range(len(meteorite_table)))
+        ordered_predicates = self.order_predicates(meteorite_table)
+        row_indices = ordered_predicates[0].get_candidate_rows(meteorite_table)
+        for predicate in ordered_predicates[1:]:
+            if not row_indices:
+                break
+            row_indices = predicate.filter_rows(meteorite_table, row_indices)
+        return row_indices
+
+    def filter_rows(self, meteorite_table, row_indices):
+        """returns only the row indices from a list that match every predicate"""
+        for predicate in self.predicates:
+            row_indices = predicate.filter_rows(meteorite_table, row_indices)
+        return row_indices
+
+    def matches_meteorite(self, meteorite):
+        """checks a single Meteorite object against every predicate, which lets a query be used while streaming"""
+        return all(predicate.matches_meteorite(meteorite) for predicate in self.predicates)
+
+
+def parse_predicate(predicate_string):
+    """Turns a written condition into a predicate. The forms that are understood are
+    "column=lower:upper" for a numeric range, "column=value" or "column=value1,value2" for one of a set of values, and
+    "box=lower_latitude:upper_latitude,lower_longitude:upper_longitude" for a bounding box and
+    "near=latitude,longitude,radius_km" for every meteorite within a distance of a point.
+    Raises a ValueError when the condition can not be understood"""
+    if '=' not in predicate_string:
+        raise ValueError(f'"{predicate_string}" is not a condition of the form column=value')
+    name, value_string = [part.strip() for part in predicate_string.split('=', 1)]
+    if name.lower() == 'box':
+        ranges = [_parse_range(part, predicate_string) for part in value_string.split(',')]
+        if len(ranges) != 2:
+            raise ValueError(f'"{predicate_string}" must give a latitude range and a longitude range')
+        return Bounding_Box_Predicate(ranges[0][0], ranges[0][1], ranges[1][0], ranges[1][1])
+    if name.lower() == 'near':
+        return Radius_Predicate(*_parse_numbers(value_string, 3, predicate_string))
+    column_name = get_column_name(name)
+    if column_name in Meteorite_Table.numeric_column_names and ':' in value_string:
+        lower_bound, upper_bound = _parse_range(value_string, predicate_string)
+        return Range_Predicate(column_name, lower_bound, upper_bound)
+    return Membership_Predicate(column_name, [value.strip() for value in value_string.split(',')])
+
+
+def _parse_numbers(numbers_string, count, predicate_string):
+    """turns a comma separated list of exactly count numbers into a list of floats"""
+    numbers = [convert_string_to_numerical(number) for number in numbers_string.split(',')]
+    if len(numbers) != count or None in numbers:
+        raise ValueError(f'"{predicate_string}" must give {count} numbers separated by commas')
+    return numbers
+
+
+def _parse_range(range_string, predicate_string):
+    """turns "lower:upper" into a pair of numbers. A missing bound is left open"""
+    bounds = range_string.split(':')
+    if len(bounds) != 2:
+        raise ValueError(f'"{predicate_string}" does not give a range in the form lower:upper')
+    lower_bound = convert_string_to_numerical(bounds[0]) if bounds[0].strip() else float('-inf')
+    upper_bound = convert_string_to_numerical(bounds[1]) if bounds[1].strip() else float('inf')
+    if lower_bound is None or upper_bound is None:
+        raise ValueError(f'"{predicate_string}" has a bound that is not a number')
+    return lower_bound, upper_bound
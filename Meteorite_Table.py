@@ -0,0 +1,499 @@
+"""This module defines a columnar store for meteorite data. Instead of holding one Meteorite object per line of the data
+file, a Meteorite_Table keeps every attribute in its own column so that a large catalog only costs a handful of
+Python objects. Meteorite objects are only created for rows that are actually needed, such as filtering results"""
+from array import array
+from math import isnan
+from Line_Parser import *
+from Meteorite import *
+from Sorted_Index import *
+from Spatial_Index import *
+from utility_functions import *
+
+# array('q') can not hold None, so missing integers are stored as this value instead
+MISSING_INTEGER = -2 ** 63
+MISSING_FLOAT = float('nan')
+# the positions in a line of the numbers, and of the numbers that are floats, whose text is checked by
+# _get_number_overrides()
+number_field_positions = [position for position, column_name, converter in numeric_field_converters]
+float_field_positions = {position for position, column_name, converter in numeric_field_converters
+                         if converter is float}
+
+
+class _Encoded_Column:
+    """A string column that stores each distinct value only once. Every row holds an integer code pointing into the
+    list of distinct values. Code 0 is always reserved for None so that missing data costs nothing extra"""
+    def __init__(self):
+        """The column starts out holding only the reserved None value. rows_by_code is only built when a query asks
+        which rows hold a value"""
+        self.values = [None]
+        self.codes_by_value = {None: 0}
+        self.codes = array('i')
+        self.rows_by_code = None
+        self.indexed_row_count = 0
+
+    def __len__(self):
+        return len(self.codes)
+
+    def append(self, value):
+        """adds a value to the end of the column, adding it to the list of distinct values if it is new"""
+        code = self.codes_by_value.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes_by_value[value] = code
+        self.codes.append(code)
+
+    def extend_values(self, values):
+        """adds every value from a list to the end of the column"""
+        codes_by_value = self.codes_by_value
+        codes = []
+        for value in values:
+            code = codes_by_value.get(value)
+            if code is None:
+                code = len(self.values)
+                self.values.append(value)
+                codes_by_value[value] = code
+            codes.append(code)
+        self.codes.extend(codes)
+
+    def extend(self, other_column):
+        """adds every row of another encoded column to the end of this one. The other column's codes are translated
+        into this column's codes since both columns number their distinct values separately"""
+        code_map = array('i')
+        for value in other_column.values:
+            code = self.codes_by_value.get(value)
+            if code is None:
+                code = len(self.values)
+                self.values.append(value)
+                self.codes_by_value[value] = code
+            code_map.append(code)
+        self.codes.extend(code_map[code] for code in other_column.codes)
+
+    def select_rows(self, row_indices):
+        """returns a new encoded column holding only the given rows, in the order given, with only the distinct
+        values those rows use"""
+        selected_column = _Encoded_Column()
+        values = self.values
+        codes = self.codes
+        for index in row_indices:
+            selected_column.append(values[codes[index]])
+        return selected_column
+
+    def get(self, index):
+        """returns the string value stored at a row index"""
+        return self.values[self.codes[index]]
+
+    def update_rows_by_code(self):
+        """builds the list of rows holding each value, or adds the rows appended since the lists were built to the
+        end of them"""
+        if self.rows_by_code is None:
+            self.rows_by_code = []
+            self.indexed_row_count = 0
+        self.rows_by_code.extend(array('q') for code in range(len(self.rows_by_code), len(self.values)))
+        for index in range(self.indexed_row_count, len(self.codes)):
+            self.rows_by_code[self.codes[index]].append(index)
+        self.indexed_row_count = len(self.codes)
+
+    def get_rows_with_value(self, value):
+        """returns an array of the row indices, in order, of every row holding a value. The lists of rows for every
+        value are built together the first time they are needed, and rows added since then are added to the end of
+        their lists"""
+        if self.rows_by_code is None or self.indexed_row_count != len(self.codes):
+            self.update_rows_by_code()
+        code = self.codes_by_value.get(value)
+        if code is None or code >= len(self.rows_by_code):
+            return array('q')
+        return self.rows_by_code[code]
+
+
+class Meteorite_Table:
+    """A Meteorite_Table holds the same 12 pieces of data as a list of Meteorite objects, but stored by column.
+    Mass, reclat and reclong are kept in array('d') columns with nan for missing values, id and year are kept in
+    array('q') columns with MISSING_INTEGER for missing values, and the repetitive string data is dictionary encoded"""
+    column_names = ['name', 'id', 'nametype', 'recclass', 'mass (g)', 'fall', 'year', 'reclat', 'reclong',
+                    'GeoLocation', 'States', 'Counties']
+    # the table attribute holding each column, named the same way as the columns in the data file header
+    column_attribute_names = {'name': 'names', 'id': 'ids', 'nametype': 'name_types', 'recclass': 'rec_classes',
+                              'mass (g)': 'masses', 'fall': 'falls', 'year': 'years', 'reclat': 'rec_lats',
+                              'reclong': 'rec_longs', 'States': 'states', 'Counties': 'counties'}
+    numeric_column_names = ['id', 'mass (g)', 'year', 'reclat', 'reclong']
+    encoded_column_names = ['nametype', 'recclass', 'fall', 'States', 'Counties']
+    # the column each sorted index is built over
+    sorted_index_columns = {'mass': 'mass (g)', 'year': 'year', 'reclat': 'reclat', 'reclong': 'reclong'}
+    # how each sorted index recognizes the values that stand in for missing data
+    sorted_index_missing_checks = {'mass': isnan, 'year': lambda year: year == MISSING_INTEGER, 'reclat': isnan,
+                                   'reclong': isnan}
+
+    def __init__(self):
+        """All columns start out empty. Names are unique to each meteorite and gain nothing from encoding so they are
+        kept in a plain list. GeoLocation is almost always just reclat and reclong written together, so it is only
+        stored for the rare rows where it can not be rebuilt from those two columns"""
+        self.names = []
+        self.ids = array('q')
+        self.masses = array('d')
+        self.years = array('q')
+        self.rec_lats = array('d')
+        self.rec_longs = array('d')
+        self.geo_location_overrides = {}
+        # numbers are written back from their stored values, such as '720' for 720.0, so the text of the rare
+        # numbers that were written some other way in the data file, such as '720.0' or '0.00001', is kept by row
+        self.number_overrides = {}
+        self.name_types = _Encoded_Column()
+        self.rec_classes = _Encoded_Column()
+        self.falls = _Encoded_Column()
+        self.states = _Encoded_Column()
+        self.counties = _Encoded_Column()
+        self.sorted_indexes = {}
+        self.spatial_index = None
+        # the row count and NumPy copies of the numeric columns made by the numpy filter backend, when it is used
+        self.numpy_columns = None
+        # the path, size and modification time of the file the rows were read from, when they were read from one
+        self.source_identity = None
+        # which part of the source the rows were taken from, for a table that only holds part of it, such as the
+        # shards a Sharded_Catalog merged. Results are kept apart for each part, but only dropped when the source
+        # itself changes
+        self.source_selection = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_meteorite_from_string(self, meteorite_as_string):
+        """Adds a single line of the original text file to the table as a new row"""
+        self.add_meteorite_from_list(split_line(meteorite_as_string))
+
+    def add_meteorites_from_lines(self, lines, first_line_number=2):
+        """Adds every line from an iterable of data file lines to the table, such as an open file after its header
+        has been read. A line is split once and its fields are converted straight into the columns, with the values of
+        each string column collected and encoded together at the end. The text of any number that would not be
+        written back the same way is kept in number_overrides. Lines that can not be parsed are skipped, and a
+        list of (line number, message) pairs describing them is returned. first_line_number is the line number of the
+        first line given, which is 2 for the line after the header"""
+        malformed_lines = []
+        names = []
+        ids = []
+        name_types = []
+        rec_classes = []
+        masses = []
+        falls = []
+        years = []
+        rec_lats = []
+        rec_longs = []
+        states = []
+        counties = []
+        geo_location_overrides = self.geo_location_overrides
+        number_overrides = self.number_overrides
+        row_index = len(self.names)
+        for line_number, line in enumerate(lines, first_line_number):
+            fields = line.strip('\n').split('\t')
+            try:
+                if len(fields) != field_count:
+                    # short lines, quoted tabs and lines with too many fields are left to the full parser
+                    raise ValueError
+                name, id_text, name_type, rec_class, mass_text, fall, year_text, rec_lat_text, rec_long_text, \
+                    geo_location, state, county = fields
+                meteorite_id = int(id_text) if id_text else MISSING_INTEGER
+                mass = float(mass_text) if mass_text else MISSING_FLOAT
+                year = int(year_text) if year_text else MISSING_INTEGER
+                rec_lat = float(rec_lat_text) if rec_lat_text else None
+                rec_long = float(rec_long_text) if rec_long_text else None
+            except ValueError:
+                try:
+                    fields = split_line(line)
+                    name, meteorite_id, name_type, rec_class, mass, fall, year, rec_lat, rec_long, geo_location, \
+                        state, county = _replace_missing_numbers(convert_numbers(list(fields)))
+                except ValueError as error:
+                    malformed_lines.append((line_number, str(error)))
+                    continue
+                id_text, mass_text, year_text, rec_lat_text, rec_long_text = [fields[position]
+                                                                              for position in number_field_positions]
+            if rec_lat is None or rec_long is None:
+                if geo_location:
+                    geo_location_overrides[row_index] = geo_location
+                rec_lat = MISSING_FLOAT if rec_lat is None else rec_lat
+                rec_long = MISSING_FLOAT if rec_long is None else rec_long
+                # rows missing a coordinate are rare, so their coordinates are checked with the other numbers below
+                coordinates_kept = not (rec_lat_text or rec_long_text)
+            else:
+                # the repr() of each coordinate is worked out once, for GeoLocation and for checking its text
+                rec_lat_string = repr(rec_lat)
+                rec_long_string = repr(rec_long)
+                if geo_location != f'"({rec_lat_string}, {rec_long_string})"':
+                    geo_location_overrides[row_index] = geo_location or None
+                coordinates_kept = \
+                    (rec_lat_string == rec_lat_text and rec_lat_string[-2:] != '.0' or
+                     rec_lat_string == rec_lat_text + '.0') and \
+                    (rec_long_string == rec_long_text and rec_long_string[-2:] != '.0' or
+                     rec_long_string == rec_long_text + '.0')
+            # most masses are whole numbers, which are written back the same way unless they have a leading zero
+            if not coordinates_kept or (id_text and str(meteorite_id) != id_text) or \
+                    (year_text and str(year) != year_text) or \
+                    (mass_text and not (mass_text.isdigit() and mass_text[0] != '0' and len(mass_text) < 16) and
+                     _float_to_text(mass) != mass_text):
+                row_number_overrides = _get_number_overrides(fields)
+                if row_number_overrides:
+                    number_overrides[row_index] = row_number_overrides
+            row_index = row_index + 1
+            names.append(name or None)
+            ids.append(meteorite_id)
+            name_types.append(name_type or None)
+            rec_classes.append(rec_class or None)
+            masses.append(mass)
+            falls.append(fall or None)
+            years.append(year)
+            rec_lats.append(rec_lat)
+            rec_longs.append(rec_long)
+            states.append(state or None)
+            counties.append(county or None)
+        self.names.extend(names)
+        self.ids.extend(ids)
+        self.masses.extend(masses)
+        self.years.extend(years)
+        self.rec_lats.extend(rec_lats)
+        self.rec_longs.extend(rec_longs)
+        self.name_types.extend_values(name_types)
+        self.rec_classes.extend_values(rec_classes)
+        self.falls.extend_values(falls)
+        self.states.extend_values(states)
+        self.counties.extend_values(counties)
+        return malformed_lines
+
+    def add_meteorite_from_list(self, attribute_list):
+        """Adds a new row to the table from a list of attributes in the same order as Meteorite.attribute_list.
+        Short lists are padded with None the same way an unfilled Meteorite attribute_list would be"""
+        attributes = list(attribute_list) + [None] * (12 - len(attribute_list))
+        index = len(self.names)
+        self.names.append(attributes[0])
+        self.ids.append(_to_integer(attributes[1]))
+        self.name_types.append(attributes[2])
+        self.rec_classes.append(attributes[3])
+        self.masses.append(_to_float(attributes[4]))
+        self.falls.append(attributes[5])
+        self.years.append(_to_integer(attributes[6]))
+        self.rec_lats.append(_to_float(attributes[7]))
+        self.rec_longs.append(_to_float(attributes[8]))
+        if attributes[9] != self._build_geo_location(index):
+            self.geo_location_overrides[index] = attributes[9]
+        number_overrides = _get_number_overrides(attributes)
+        if number_overrides:
+            self.number_overrides[index] = number_overrides
+        self.states.append(attributes[10])
+        self.counties.append(attributes[11])
+
+    def extend(self, other_table):
+        """adds every row of another Meteorite_Table to the end of this table, keeping the rows in order"""
+        row_offset = len(self)
+        self.names.extend(other_table.names)
+        self.ids.extend(other_table.ids)
+        self.masses.extend(other_table.masses)
+        self.years.extend(other_table.years)
+        self.rec_lats.extend(other_table.rec_lats)
+        self.rec_longs.extend(other_table.rec_longs)
+        for index, geo_location in other_table.geo_location_overrides.items():
+            self.geo_location_overrides[index + row_offset] = geo_location
+        for index, number_overrides in other_table.number_overrides.items():
+            self.number_overrides[index + row_offset] = number_overrides
+        self.name_types.extend(other_table.name_types)
+        self.rec_classes.extend(other_table.rec_classes)
+        self.falls.extend(other_table.falls)
+        self.states.extend(other_table.states)
+        self.counties.extend(other_table.counties)
+
+    def select_rows(self, row_indices):
+        """Returns a new table holding only the given rows, in the order given, such as the rows that matched a
+        filter. The values are copied straight from the columns without being turned back into strings. The new table
+        has no indexes until they are built"""
+        selected_table = Meteorite_Table()
+        selected_table.names = [self.names[index] for index in row_indices]
+        for attribute_name in ['ids', 'masses', 'years', 'rec_lats', 'rec_longs']:
+            column = getattr(self, attribute_name)
+            setattr(selected_table, attribute_name, array(column.typecode, [column[index] for index in row_indices]))
+        for column_name in Meteorite_Table.encoded_column_names:
+            attribute_name = Meteorite_Table.column_attribute_names[column_name]
+            setattr(selected_table, attribute_name, getattr(self, attribute_name).select_rows(row_indices))
+        for selected_index, index in enumerate(row_indices):
+            if index in self.geo_location_overrides:
+                selected_table.geo_location_overrides[selected_index] = self.geo_location_overrides[index]
+            if index in self.number_overrides:
+                selected_table.number_overrides[selected_index] = self.number_overrides[index]
+        return selected_table
+
+    def build_sorted_indexes(self):
+        """Builds a Sorted_Index for each column that can be used as a filtering parameter, along with reclat and
+        reclong for bounding box queries. This should be called again whenever rows are added to the table, or
+        update_indexes() can be called instead to add just the new rows"""
+        self.sorted_indexes = {parameter: Sorted_Index(self.get_indexed_column(parameter), is_missing)
+                               for parameter, is_missing in Meteorite_Table.sorted_index_missing_checks.items()}
+
+    def update_indexes(self):
+        """Adds the rows appended to the table since its indexes were built to the sorted indexes, the spatial index
+        and the row lists of the encoded columns, without rebuilding them from the start. Indexes that have not been
+        built yet are left to be built when they are first needed"""
+        for parameter, sorted_index in self.sorted_indexes.items():
+            if sorted_index.row_count < len(self):
+                sorted_index.add_rows(self.get_indexed_column(parameter),
+                                      Meteorite_Table.sorted_index_missing_checks[parameter])
+        if self.spatial_index is not None and self.spatial_index.rec_lats is self.rec_lats and \
+                self.spatial_index.row_count < len(self):
+            self.spatial_index.add_rows()
+        for column_name in Meteorite_Table.encoded_column_names:
+            encoded_column = self.get_column(column_name)
+            if encoded_column.rows_by_code is not None:
+                encoded_column.update_rows_by_code()
+
+    def build_indexes(self):
+        """Builds every index that is otherwise only built the first time a filter needs it: the sorted indexes, the
+        spatial index and the lists of rows holding each value of the encoded columns. A table that several threads
+        filter at once must have its indexes built first, since two threads building the same index would both add
+        the same rows to it"""
+        for parameter in Meteorite_Table.sorted_index_columns:
+            self.get_sorted_index(parameter)
+        self.get_spatial_index()
+        for column_name in Meteorite_Table.encoded_column_names:
+            encoded_column = self.get_column(column_name)
+            if encoded_column.rows_by_code is None or encoded_column.indexed_row_count != len(encoded_column):
+                encoded_column.update_rows_by_code()
+
+    def get_indexed_column(self, parameter):
+        """returns the column behind the sorted index of a filtering parameter"""
+        return self.get_column(Meteorite_Table.sorted_index_columns[parameter])
+
+    def get_sorted_index(self, filtering_parameter):
+        """returns the Sorted_Index for a filtering parameter, building the indexes first if they are missing or
+        out of date"""
+        if filtering_parameter not in self.sorted_indexes or \
+                self.sorted_indexes[filtering_parameter].row_count != len(self):
+            self.build_sorted_indexes()
+        return self.sorted_indexes[filtering_parameter]
+
+    def get_spatial_index(self):
+        """returns the Spatial_Index over reclat and reclong, building it the first time it is needed and again
+        whenever rows have been added since"""
+        if self.spatial_index is None or self.spatial_index.row_count != len(self) or \
+                self.spatial_index.rec_lats is not self.rec_lats:
+            self.spatial_index = Spatial_Index(self.rec_lats, self.rec_longs)
+        return self.spatial_index
+
+    def get_column(self, column_name):
+        """returns the column stored for a column name from the data file header, such as 'recclass'"""
+        return getattr(self, Meteorite_Table.column_attribute_names[column_name])
+
+    def get_value(self, column_name, index):
+        """returns the value of one column for a row. Numeric columns give back an int or float and every column
+        gives back None for missing data"""
+        if column_name == 'GeoLocation':
+            return self.get_geo_location(index)
+        if column_name in Meteorite_Table.encoded_column_names:
+            return self.get_column(column_name).get(index)
+        value = self.get_column(column_name)[index]
+        if value is None or value == MISSING_INTEGER or value != value:
+            return None
+        return value
+
+    def get_mass(self, index):
+        """returns the mass of a row as a float, or None when the row has no mass"""
+        mass = self.masses[index]
+        return None if isnan(mass) else mass
+
+    def get_year(self, index):
+        """returns the year of a row as an int, or None when the row has no year"""
+        year = self.years[index]
+        return None if year == MISSING_INTEGER else year
+
+    def get_attribute_list(self, index):
+        """Rebuilds the list of attribute strings for a row. The list matches the attribute_list that a Meteorite
+        object would have after reading the same line from a text file, with every number written the same way it
+        was written in the file"""
+        attribute_list = [self.names[index], _integer_to_string(self.ids[index]), self.name_types.get(index),
+                          self.rec_classes.get(index), _float_to_string(self.masses[index]), self.falls.get(index),
+                          _integer_to_string(self.years[index]), _float_to_string(self.rec_lats[index]),
+                          _float_to_string(self.rec_longs[index]), self.get_geo_location(index),
+                          self.states.get(index), self.counties.get(index)]
+        if index in self.number_overrides:
+            for position, text in self.number_overrides[index].items():
+                attribute_list[position] = text
+        return attribute_list
+
+    def get_meteorite(self, index):
+        """Creates a Meteorite object for a single row of the table, handing it the numbers already stored in the
+        row so they are not parsed again from the strings"""
+        rec_lat, rec_long = self.rec_lats[index], self.rec_longs[index]
+        numbers = [self.get_mass(index), self.get_year(index), None if isnan(rec_lat) else rec_lat,
+                   None if isnan(rec_long) else rec_long]
+        return Meteorite(self.get_attribute_list(index), numbers)
+
+    def get_geo_location(self, index):
+        """returns the GeoLocation string of a row, rebuilding it from reclat and reclong when possible"""
+        if index in self.geo_location_overrides:
+            return self.geo_location_overrides[index]
+        return self._build_geo_location(index)
+
+    def _build_geo_location(self, index):
+        """GeoLocation in the data file is written as reclat and reclong inside quoted parentheses. Returns None
+        when either coordinate is missing"""
+        if isnan(self.rec_lats[index]) or isnan(self.rec_longs[index]):
+            return None
+        return f'"({self.rec_lats[index]!r}, {self.rec_longs[index]!r})"'
+
+
+def _replace_missing_numbers(fields):
+    """replaces the None of missing numbers in a line parsed by parse_line() with the values the columns store for
+    missing data. reclat and reclong are left as None since GeoLocation is checked against them first"""
+    fields[1] = MISSING_INTEGER if fields[1] is None else fields[1]
+    fields[4] = MISSING_FLOAT if fields[4] is None else fields[4]
+    fields[6] = MISSING_INTEGER if fields[6] is None else fields[6]
+    return fields
+
+
+def _to_float(value):
+    """converts a data string to a float, using nan for missing data"""
+    if value is None:
+        return MISSING_FLOAT
+    return float(value)
+
+
+def _to_integer(value):
+    """converts a data string to an int, using MISSING_INTEGER for missing data"""
+    if value is None:
+        return MISSING_INTEGER
+    return int(value)
+
+
+def _get_number_overrides(fields):
+    """Returns a dictionary mapping the position of each number in a list of 12 attribute strings to its text, for
+    the numbers whose text is not what their stored value would be written back as, or None if there are none"""
+    number_overrides = None
+    for position in number_field_positions:
+        text = fields[position]
+        if not text:
+            continue
+        if position in float_field_positions:
+            written_text = _float_to_text(float(text))
+        else:
+            written_text = str(int(text))
+        if written_text != text:
+            number_overrides = number_overrides or {}
+            number_overrides[position] = text
+    return number_overrides
+
+
+def _float_to_string(value):
+    """Turns a stored float back into a string, returning None for missing data. Whole numbers are written without a
+    trailing '.0' the same way they appear in meteorite_landings.txt"""
+    if isnan(value):
+        return None
+    return _float_to_text(value)
+
+
+def _float_to_text(value):
+    """writes a float that is not missing the way _float_to_string() does"""
+    value_string = repr(value)
+    if value_string.endswith('.0'):
+        return value_string[:-2]
+    return value_string
+
+
+def _integer_to_string(value):
+    """Turns a stored int back into a string, returning None for missing data"""
+    if value == MISSING_INTEGER:
+        return None
+    return str(value)
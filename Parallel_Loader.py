@@ -0,0 +1,79 @@
+"""This module reads a meteorite data file using several processes at once. The file is split into byte ranges that
+always start and end on a line break, each range is parsed into its own Meteorite_Table by a separate process, and the
+tables are then joined back together in their original order. The result is the same table the sequential loader in
+Meteorite_Filter.create_meteorite_list() builds"""
+import io
+import locale
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from Meteorite_Table import *
+
+
+def find_chunk_boundaries(file_name, chunk_count, file_size=None):
+    """Splits the data in a file into at most chunk_count byte ranges of roughly equal size. The header line is left
+    out of every range and every range starts at the beginning of a line. Only the first file_size bytes are split
+    when it is given. Returns a list of (start, end) tuples"""
+    if file_size is None:
+        file_size = os.path.getsize(file_name)
+    with open(file_name, 'rb') as data_file:
+        data_file.readline()
+        data_start = data_file.tell()
+        boundaries = [data_start]
+        for chunk_number in range(1, chunk_count):
+            target = data_start + (file_size - data_start) * chunk_number // chunk_count
+            if target <= boundaries[-1]:
+                continue
+            # move to the start of the first line that begins at or after the target byte
+            data_file.seek(target - 1)
+            data_file.readline()
+            if boundaries[-1] < data_file.tell() < file_size:
+                boundaries.append(data_file.tell())
+    boundaries.append(file_size)
+    return [(boundaries[index], boundaries[index + 1]) for index in range(len(boundaries) - 1)]
+
+
+def parse_chunk(file_name, start, end):
+    """Parses the lines in a single byte range of a file into a new Meteorite_Table. Lines are read the same way
+    open() in text mode would read them, so every chunk parses exactly as it would in the sequential loader. Returns
+    the table, the malformed lines numbered from 1 at the start of the range and the number of lines in the range"""
+    with open(file_name, 'rb') as data_file:
+        data_file.seek(start)
+        chunk_bytes = data_file.read(end - start)
+    meteorite_table, malformed_lines = parse_chunk_bytes(chunk_bytes, first_line_number=1)
+    return meteorite_table, malformed_lines, chunk_bytes.count(b'\n')
+
+
+def parse_chunk_bytes(chunk_bytes, meteorite_table=None, first_line_number=2):
+    """Parses whole lines of a data file, given as bytes, into the end of a Meteorite_Table, creating a new table if
+    none is given. first_line_number is the line number in the file of the first line given. Returns the table and a
+    list of (line number, message) pairs for the lines that were skipped"""
+    if meteorite_table is None:
+        meteorite_table = Meteorite_Table()
+    chunk_text = chunk_bytes.decode(locale.getpreferredencoding(False))
+    malformed_lines = meteorite_table.add_meteorites_from_lines(io.StringIO(chunk_text, newline=None),
+                                                                first_line_number)
+    return meteorite_table, malformed_lines
+
+
+def load_meteorite_table_in_parallel(file_name, worker_count, file_size=None):
+    """Reads a whole data file, or its first file_size bytes, into a single Meteorite_Table using worker_count
+    processes. The chunks are merged in the order they appear in the file and the sorted indexes are built once at
+    the end. Lines that could not be parsed are reported with their line number in the whole file"""
+    chunks = find_chunk_boundaries(file_name, worker_count, file_size)
+    starts = [chunk[0] for chunk in chunks]
+    ends = [chunk[1] for chunk in chunks]
+    meteorite_table = Meteorite_Table()
+    malformed_lines = []
+    # the header is line 1, so the first line of the first chunk is line 2
+    line_offset = 1
+    with ProcessPoolExecutor(max_workers=worker_count) as executor:
+        for chunk_table, chunk_malformed_lines, chunk_line_count in executor.map(parse_chunk, repeat(file_name),
+                                                                                 starts, ends):
+            meteorite_table.extend(chunk_table)
+            malformed_lines.extend((line_offset + line_number, message)
+                                   for line_number, message in chunk_malformed_lines)
+            line_offset = line_offset + chunk_line_count
+    report_malformed_lines(file_name, malformed_lines)
+    meteorite_table.build_sorted_indexes()
+    return meteorite_table
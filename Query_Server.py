@@ -0,0 +1,256 @@
+"""This module runs a long lived server that keeps a meteorite data file loaded in memory and answers filter requests
+from many clients over a local socket, so that no request has to pay for starting the program and parsing the file.
+Requests and responses are single lines of JSON. A request has the same fields as a job in a job file, except that the
+file is always the one the server was started with. The server checks the data file for changes while it runs. Lines
+appended to the file are parsed on their own and then added to the loaded table in place while no request is reading
+it, and a file that has been rewritten is loaded again in the background, answering requests from the old version
+until then"""
+import asyncio
+import json
+import os
+import time
+from Batch_Runner import *
+from Incremental_Loader import *
+from Table_Lock import *
+
+# formats the server can answer with. 'json' sends the results back in the response, and the file formats write the
+# results to a file next to the server the same way a job does. The console formats would print on the server
+server_output_format_options = ['json'] + [output_format for output_format in Meteorite_Filter.all_output_format_options
+                                           if output_format not in ('terminal', 'console table')]
+# the largest request line the server will read, and the largest response line send_request() will read
+max_request_size = 1 << 20
+max_response_size = 1 << 30
+
+
+class Query_Server:
+    """A Query_Server loads its data file once and then answers every request against the table in memory. Requests
+    are filtered in worker threads so that the server keeps accepting connections while a large filter runs"""
+    def __init__(self, file_name, host='127.0.0.1', port=0, socket_path=None, reload_interval=1.0, worker_count=1,
+                 use_cache=True, backend='python', result_cache=None):
+        """The server listens on a TCP port on host, or on a Unix socket when socket_path is given. A port of 0 picks
+        any free port, which can be read from port once the server has started. The data file is checked for changes
+        every reload_interval seconds. Repeated filters are answered from result_cache, or from a new Result_Cache
+        with the default limits when none is given"""
+        self.file_name = file_name
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.reload_interval = reload_interval
+        if result_cache is None:
+            result_cache = Result_Cache()
+        self.batch_runner = Batch_Runner(worker_count=worker_count, use_cache=use_cache, backend=backend,
+                                         result_cache=result_cache)
+        self.table_key = os.path.abspath(file_name)
+        self.incremental_loader = Incremental_Loader(file_name, use_cache, worker_count)
+        # requests hold table_lock as readers, and rows are only appended to the loaded table while holding it as a
+        # writer
+        self.table_lock = Table_Lock()
+        self.server = None
+        self.reload_task = None
+        self.request_count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.reload_count = 0
+
+    async def start(self):
+        """loads the data file and starts listening for clients"""
+        await asyncio.get_running_loop().run_in_executor(None, self.load_meteorite_table)
+        if self.socket_path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_client, self.socket_path,
+                                                          limit=max_request_size)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, self.host, self.port, limit=max_request_size)
+            self.port = self.server.sockets[0].getsockname()[1]
+        self.reload_task = asyncio.create_task(self.watch_data_file())
+
+    async def serve_forever(self):
+        """starts the server and answers requests until it is stopped"""
+        await self.start()
+        print(f'Serving "{self.file_name}" on {self.get_address()}')
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """stops listening for clients and stops watching the data file"""
+        if self.reload_task is not None:
+            self.reload_task.cancel()
+            self.reload_task = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.socket_path is not None and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def get_address(self):
+        """returns the socket path or host:port the server is listening on"""
+        if self.socket_path is not None:
+            return self.socket_path
+        return f'{self.host}:{self.port}'
+
+    def load_meteorite_table(self):
+        """Reads the data file, or its cache, into a new table and then swaps it in for the old one, so requests
+        that are already running finish against the table they started with"""
+        self.incremental_loader.load()
+        self.prepare_meteorite_table(self.incremental_loader.meteorite_table)
+        self.batch_runner.loaded_tables[self.table_key] = self.incremental_loader.meteorite_table
+
+    def update_meteorite_table(self):
+        """Brings the loaded table up to date with the data file, returning the number of rows appended to it in
+        place, or None if the whole file was loaded again. Rows are appended while holding table_lock as a writer, so
+        no request ever sees a table with some of its columns or indexes updated and not others. A table that was
+        loaded again is new and no request can see it until it is swapped in, so nothing is locked for it"""
+        new_row_count = self.incremental_loader.update(self.table_lock.writing())
+        if new_row_count is None:
+            self.prepare_meteorite_table(self.incremental_loader.meteorite_table)
+        elif new_row_count != 0:
+            with self.table_lock.writing():
+                self.prepare_meteorite_table(self.incremental_loader.meteorite_table)
+        self.batch_runner.loaded_tables[self.table_key] = self.incremental_loader.meteorite_table
+        if new_row_count != 0:
+            self.batch_runner.result_cache.invalidate(self.file_name)
+        return new_row_count
+
+    def prepare_meteorite_table(self, meteorite_table):
+        """Builds every index of a table, along with the NumPy columns when the numpy backend is used, before any
+        request can filter it. Requests are answered by several threads at once and only ever read the table, so
+        nothing may be left for the first request to build"""
+        meteorite_table.build_indexes()
+        create_filter_backend(meteorite_table, self.batch_runner.backend)
+
+    async def watch_data_file(self):
+        """checks the data file for changes every reload_interval seconds. A reload that fails keeps the table that
+        was already loaded"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                start_time = time.perf_counter()
+                new_row_count = await loop.run_in_executor(None, self.update_meteorite_table)
+                if new_row_count == 0:
+                    continue
+                self.reload_count = self.reload_count + 1
+                elapsed_time = (time.perf_counter() - start_time) * 1000
+                if new_row_count is None:
+                    print(f'Reloaded "{self.file_name}" in {elapsed_time:.1f} ms')
+                else:
+                    print(f'Added {new_row_count} new rows from "{self.file_name}" in {elapsed_time:.1f} ms')
+            except (OSError, ValueError) as error:
+                print(f'ERROR: could not reload "{self.file_name}": {error}')
+
+    async def handle_client(self, reader, writer):
+        """answers every request a client sends, one line of JSON each, until the client disconnects"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(create_response_line({'ok': False, 'error': 'request is too large'}))
+                    break
+                if not line:
+                    break
+                start_time = time.perf_counter()
+                response = await loop.run_in_executor(None, self.answer_request, line)
+                latency = time.perf_counter() - start_time
+                self.record_latency(latency)
+                response['latency_ms'] = round(latency * 1000, 3)
+                writer.write(create_response_line(response))
+                await writer.drain()
+                print(f'request {self.request_count}: {describe_response(response)} in {response["latency_ms"]:.1f} ms')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def answer_request(self, line):
+        """Answers a single request line, returning the response as a dictionary. A request of {"command": "stats"}
+        returns the number of requests answered and their latency instead of filtering anything. A request that can
+        not be answered, whatever the reason, gets an error response so that the client's connection stays open"""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request must be a JSON object')
+            if request.get('command') == 'stats':
+                return self.get_statistics()
+            return self.run_request(request)
+        except (ValueError, OSError, TypeError, AttributeError) as error:
+            return {'ok': False, 'error': str(error)}
+
+    def run_request(self, request):
+        """Filters the loaded table for a request. The results are sent back in the response for the 'json' output
+        format, which is the default, and written to a file by the server for the other formats"""
+        output_format = request.get('output_format') or 'json'
+        if output_format not in server_output_format_options:
+            raise ValueError(f'"{output_format}" is not a valid output format')
+        # the job is checked with a file format so that Batch_Runner accepts it, and 'json' is set afterwards
+        job = dict(request, file=self.file_name, output_format='text file')
+        meteorite_filter = self.batch_runner.create_filter_from_job(job)
+        meteorite_filter.output_format = output_format
+        with self.table_lock.reading():
+            meteorite_filter.meteorite_table = self.batch_runner.loaded_tables[self.table_key]
+            return self.filter_request(meteorite_filter, output_format)
+
+    def filter_request(self, meteorite_filter, output_format):
+        """filters the table for a request and builds its response, while run_request() holds table_lock"""
+        meteorite_filter.filter_meteorite_list()
+        response = {'ok': True, 'count': len(meteorite_filter.filtered_rows)}
+        if meteorite_filter.group_by is not None:
+            group_summary = meteorite_filter.create_group_summary()
+            if output_format == 'json':
+                response['header'] = group_summary.get_header()
+                response['rows'] = group_summary.get_rows()
+            else:
+                meteorite_filter.output_group_summary(group_summary)
+        elif output_format == 'json':
+            response['header'] = Meteorite_Filter.attribute_name_list
+            response['rows'] = [list(meteorite) for meteorite in meteorite_filter.filtered_list]
+        else:
+            meteorite_filter.output_meteorite_list()
+        return response
+
+    def record_latency(self, latency):
+        """adds the time taken to answer a request to the server's statistics"""
+        self.request_count = self.request_count + 1
+        self.total_latency = self.total_latency + latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def get_statistics(self):
+        """returns the number of requests answered, their mean and largest latency, the number of reloads, the
+        number of meteorites loaded and the statistics of the result cache"""
+        mean_latency = self.total_latency / self.request_count if self.request_count else 0.0
+        return {'ok': True, 'requests': self.request_count, 'mean_latency_ms': round(mean_latency * 1000, 3),
+                'max_latency_ms': round(self.max_latency * 1000, 3), 'reloads': self.reload_count,
+                'meteorites': len(self.batch_runner.loaded_tables[self.table_key]),
+                'result_cache': self.batch_runner.result_cache.get_statistics()}
+
+
+def describe_response(response):
+    """returns a short description of a response for the server's log"""
+    if not response['ok']:
+        return f'error "{response["error"]}"'
+    if 'count' in response:
+        return f'{response["count"]} results'
+    return 'statistics'
+
+
+def create_response_line(response):
+    """turns a response dictionary into a single line of JSON"""
+    return (json.dumps(response) + '\n').encode('utf-8')
+
+
+async def send_request(request, host='127.0.0.1', port=None, socket_path=None):
+    """Sends a single request to a running Query_Server and returns its response as a dictionary"""
+    if socket_path is not None:
+        reader, writer = await asyncio.open_unix_connection(socket_path, limit=max_response_size)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit=max_response_size)
+    try:
+        writer.write((json.dumps(request) + '\n').encode('utf-8'))
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+        await writer.wait_closed()
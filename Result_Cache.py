@@ -0,0 +1,132 @@
+"""This module remembers the results of recent filters so that a filter that is run again over the same data is
+answered without filtering anything. Each result is stored as the row indices that matched, along with any formatted
+output that has been built from those rows, such as the console table or the body of a text file. The least recently
+used results are dropped first once the cache holds too many results or too much memory"""
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+
+def create_result_key(meteorite_table, filtering_parameter, lower_bound, upper_bound):
+    """Returns the key a filter's result is stored under, or None if the table does not record the file it was read
+    from. The key holds the path, size and modification time of the file, the part of it the table holds and the
+    number of rows in the table, so a result can never be found again once the data has changed"""
+    if meteorite_table.source_identity is None:
+        return None
+    return (meteorite_table.source_identity, meteorite_table.source_selection, len(meteorite_table),
+            filtering_parameter, lower_bound, upper_bound)
+
+
+def get_file_identity(file_name):
+    """returns the absolute path, size and modification time of a file, used as the source_identity of a table"""
+    file_status = os.stat(file_name)
+    return os.path.abspath(file_name), file_status.st_size, file_status.st_mtime_ns
+
+
+class Result_Cache:
+    """A Result_Cache holds at most max_entries results using at most about max_bytes of memory. Every lookup is
+    counted as a hit or a miss so the cache can report how useful it has been. A single cache can be shared by
+    several threads, such as the worker threads of a Query_Server, since every method holds the cache's lock"""
+    def __init__(self, max_entries=128, max_bytes=256 << 20):
+        """entries maps each key to a dictionary holding its rows, its formatted outputs and their size in bytes,
+        with the most recently used entry last"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.byte_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.output_hits = 0
+        self.output_misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get_rows(self, key):
+        """returns the matching row indices stored for a key, or None if there are none"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses = self.misses + 1
+                return None
+            self.hits = self.hits + 1
+            self.entries.move_to_end(key)
+            return entry['rows']
+
+    def put_rows(self, key, row_indices):
+        """Stores the row indices that matched a filter. Results for an older version of the same file are dropped,
+        since they can never be used again, while results for other parts of the same version are kept"""
+        with self.lock:
+            self._invalidate(key[0][0], keep_identity=key[0])
+            rows = array('q', row_indices)
+            self._remove(key)
+            self.entries[key] = {'rows': rows, 'outputs': {}, 'size': rows.itemsize * len(rows)}
+            self.byte_count = self.byte_count + self.entries[key]['size']
+            self._evict()
+
+    def get_output(self, key, output_format):
+        """returns the formatted output stored for a key and an output format, or None if there is none"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or output_format not in entry['outputs']:
+                self.output_misses = self.output_misses + 1
+                return None
+            self.output_hits = self.output_hits + 1
+            self.entries.move_to_end(key)
+            return entry['outputs'][output_format]
+
+    def put_output(self, key, output_format, output):
+        """stores formatted output for a result whose rows are already in the cache"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            output_size = sys.getsizeof(output)
+            entry['outputs'][output_format] = output
+            entry['size'] = entry['size'] + output_size
+            self.byte_count = self.byte_count + output_size
+            self.entries.move_to_end(key)
+            self._evict()
+
+    def invalidate(self, file_name=None, keep_identity=None):
+        """Drops every result read from a file, or every result when no file is given. Results from the table
+        identified by keep_identity are kept. Returns the number of results dropped"""
+        with self.lock:
+            return self._invalidate(file_name, keep_identity)
+
+    def get_statistics(self):
+        """returns the number of hits and misses for rows and formatted outputs, the number of results evicted and
+        the number and size of the results held"""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'output_hits': self.output_hits,
+                    'output_misses': self.output_misses, 'evictions': self.evictions, 'entries': len(self.entries),
+                    'bytes': self.byte_count}
+
+    def _invalidate(self, file_name, keep_identity):
+        """drops results the same way invalidate() does, for a caller that already holds the lock"""
+        if file_name is None:
+            stale_keys = list(self.entries)
+        else:
+            path = os.path.abspath(file_name)
+            stale_keys = [key for key in self.entries if key[0][0] == path and key[0] != keep_identity]
+        for key in stale_keys:
+            self._remove(key)
+        return len(stale_keys)
+
+    def _remove(self, key):
+        """drops a single result if it is in the cache"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.byte_count = self.byte_count - entry['size']
+
+    def _evict(self):
+        """drops the least recently used results until the cache is back within its limits. A single result larger
+        than max_bytes is not kept at all"""
+        while self.entries and (len(self.entries) > self.max_entries or self.byte_count > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+            self.evictions = self.evictions + 1
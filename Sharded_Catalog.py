@@ -0,0 +1,205 @@
+"""This module loads a catalog that is split over many data files, or shards, such as one file per source or per range
+of years. The shards are named by a folder or a glob pattern, loaded at the same time by several processes and merged
+into a single Meteorite_Table. A meteorite that appears in more than one shard is only kept the first time its id is
+seen, going through the shards in the order of their file names.
+
+Every shard that has a columnar copy, either its parse cache or the shard itself being a columnar file, records the
+smallest and largest value of its mass, year, reclat and reclong. A shard whose values can not fall inside the bounds
+of a filter is skipped without being loaded, and only its id column is read so that duplicates are still dropped the
+same way as if every shard had been loaded"""
+import glob
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from Incremental_Loader import *
+from Meteorite_Query import *
+from Result_Cache import *
+
+# the files in a shard folder that are read as shards
+shard_file_extensions = ['.txt', columnar_file_extension]
+# files matched by a glob pattern that are never shards, such as the parse caches saved next to each shard
+ignored_shard_file_extensions = ['.cache', '.tmp']
+# the number of merged tables a Sharded_Catalog keeps, so that a few filters that skip different shards can take
+# turns without merging their shards again every time
+merged_table_limit = 4
+
+
+def is_shard_pattern(file_name):
+    """returns True if a file name names a folder of shards or is a glob pattern rather than a single file. A file
+    that exists is never a pattern, even when its name has a glob character in it, such as 'landings[2024].txt'"""
+    if os.path.isfile(file_name):
+        return False
+    return os.path.isdir(file_name) or any(character in file_name for character in '*?[')
+
+
+def is_shard_file_name(file_name):
+    """returns True if a file name is a folder or glob pattern that names at least one shard file"""
+    if not is_shard_pattern(file_name):
+        return False
+    try:
+        return bool(find_shard_files(file_name))
+    except (OSError, ValueError):
+        return False
+
+
+def find_shard_files(file_name):
+    """Returns the sorted list of shard files in a folder, or matched by a glob pattern. Raises a ValueError if there
+    are none"""
+    if os.path.isdir(file_name):
+        shard_files = [os.path.join(file_name, entry) for entry in os.listdir(file_name)
+                       if os.path.splitext(entry)[1].lower() in shard_file_extensions]
+    else:
+        shard_files = [match for match in glob.glob(file_name)
+                       if os.path.splitext(match)[1].lower() not in ignored_shard_file_extensions]
+    shard_files = sorted(shard_file for shard_file in shard_files if os.path.isfile(shard_file))
+    if not shard_files:
+        raise ValueError(f'"{file_name}" does not name any data files')
+    return shard_files
+
+
+def get_filter_bounds(filtering_parameter=None, lower_bound=None, upper_bound=None, query=None):
+    """Returns the [lower, upper) bounds a filter puts on each column that has a sorted index, as a dictionary keyed
+    by the name of the index, such as 'mass'. The bounds of every range condition of a query on the same column are
+    narrowed together. Columns without bounds are left out"""
+    bounds = {}
+    if filtering_parameter is not None:
+        bounds[filtering_parameter] = (lower_bound, upper_bound)
+    for predicate in query.predicates if query is not None else []:
+        if isinstance(predicate, Range_Predicate) and predicate.column_name in indexed_columns:
+            parameter = indexed_columns[predicate.column_name]
+            lower, upper = bounds.get(parameter, (predicate.lower_bound, predicate.upper_bound))
+            bounds[parameter] = (max(lower, predicate.lower_bound), min(upper, predicate.upper_bound))
+    return bounds
+
+
+def can_match(value_ranges, bounds):
+    """Returns False only when the value ranges of a shard show that none of its rows can be inside the bounds. A
+    shard whose column has no values at all can never match, since a missing value never fits a filter"""
+    for parameter, (lower_bound, upper_bound) in bounds.items():
+        if parameter not in value_ranges:
+            continue
+        value_range = value_ranges[parameter]
+        if value_range is None or value_range[1] < lower_bound or value_range[0] >= upper_bound:
+            return False
+    return True
+
+
+def load_shard(file_name, use_cache):
+    """loads a single shard the same way a whole data file is loaded, from its cache when it has one. This is run in
+    a separate process for each shard"""
+    return Incremental_Loader(file_name, use_cache).load()
+
+
+class Sharded_Catalog:
+    """A Sharded_Catalog keeps every shard it has loaded, so later filters on the same shards only merge them again
+    instead of reading them. worker_count is the number of processes that shards are loaded with. Threads would not
+    help, since parsing never lets go of the interpreter"""
+    def __init__(self, file_name, worker_count=1, use_cache=True):
+        """The shard files are found again on every load, so shards added to the folder are picked up. shard_tables
+        keeps each loaded shard under the path, size and modification time it had when it was loaded, so a shard
+        that changes is loaded again. merged_tables keeps the merged table for each of the merged_table_limit sets of
+        shards asked for most recently, with the most recently used last, and merges of shards that have since
+        changed are dropped"""
+        self.file_name = file_name
+        self.worker_count = worker_count
+        self.use_cache = use_cache
+        self.shard_files = find_shard_files(file_name)
+        self.shard_tables = {}
+        self.merged_tables = OrderedDict()
+        self.skipped_shard_count = 0
+
+    def get_columnar_file(self, shard_file):
+        """returns the columnar file holding the rows of a shard as it is now, or None if there is none"""
+        if is_columnar_file(shard_file):
+            return shard_file
+        if self.use_cache and is_cache_valid(shard_file):
+            return get_cache_file_name(shard_file)
+        return None
+
+    def get_shard_states(self):
+        """Finds the shard files again and returns a (shard file, identity, columnar file) tuple for each of them, so
+        every shard is only looked at once however many times a load needs to know about it. Checking a cache hashes
+        the whole shard, so the columnar file is only looked for when the shard has not been loaded yet, since a loaded
+        shard is never skipped. It is None when the shard has no columnar copy"""
+        self.shard_files = find_shard_files(self.file_name)
+        shard_states = []
+        for shard_file in self.shard_files:
+            shard_identity = get_file_identity(shard_file)
+            columnar_file = None if shard_identity in self.shard_tables else self.get_columnar_file(shard_file)
+            shard_states.append((shard_file, shard_identity, columnar_file))
+        return shard_states
+
+    def select_shards(self, bounds, shard_states):
+        """returns the states from get_shard_states() of the shards that could hold rows inside the bounds from
+        get_filter_bounds(). A shard is only skipped when the header of its columnar file shows it can not match"""
+        selected_states = []
+        for shard_state in shard_states:
+            columnar_file = shard_state[2]
+            value_ranges = None
+            if bounds and columnar_file is not None:
+                value_ranges = read_columnar_header(columnar_file).get('value_ranges')
+            if value_ranges is None or can_match(value_ranges, bounds):
+                selected_states.append(shard_state)
+        return selected_states
+
+    def load_shards(self, shard_states):
+        """loads every shard that has not been loaded yet, using worker_count processes at once, and returns the table
+        of every shard given"""
+        new_states = [(shard_file, shard_identity) for shard_file, shard_identity, columnar_file in shard_states
+                      if shard_identity not in self.shard_tables]
+        new_shards = [shard_file for shard_file, shard_identity in new_states]
+        if self.worker_count > 1 and len(new_shards) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.worker_count, len(new_shards))) as executor:
+                shard_tables = list(executor.map(load_shard, new_shards, repeat(self.use_cache)))
+        else:
+            shard_tables = [load_shard(shard_file, self.use_cache) for shard_file in new_shards]
+        self.shard_tables.update(zip([shard_identity for shard_file, shard_identity in new_states], shard_tables))
+        return [self.shard_tables[shard_identity] for shard_file, shard_identity, columnar_file in shard_states]
+
+    def load(self, bounds=None):
+        """Returns a single Meteorite_Table holding every shard that could match the bounds, with its sorted indexes
+        built. Each meteorite id is only kept from the first shard it appears in, including shards that were skipped,
+        and meteorites with no id are always kept"""
+        shard_states = self.get_shard_states()
+        selected_states = self.select_shards(bounds or {}, shard_states)
+        self.skipped_shard_count = len(shard_states) - len(selected_states)
+        selected_shards = {shard_file for shard_file, shard_identity, columnar_file in selected_states}
+        # skipped shards are part of the key too, since their ids decide which duplicates are dropped
+        shard_identities = tuple(shard_identity for shard_file, shard_identity, columnar_file in shard_states)
+        merge_key = (shard_identities, tuple(sorted(selected_shards)))
+        if merge_key in self.merged_tables:
+            self.merged_tables.move_to_end(merge_key)
+            return self.merged_tables[merge_key]
+        shard_tables = iter(self.load_shards(selected_states))
+        merged_table = Meteorite_Table()
+        seen_ids = set()
+        for shard_file, shard_identity, columnar_file in shard_states:
+            if shard_file not in selected_shards:
+                seen_ids.update(self.get_shard_ids(columnar_file))
+                continue
+            shard_table = next(shard_tables)
+            kept_rows = []
+            for index, meteorite_id in enumerate(shard_table.ids):
+                if meteorite_id == MISSING_INTEGER or meteorite_id not in seen_ids:
+                    kept_rows.append(index)
+                    seen_ids.add(meteorite_id)
+            if len(kept_rows) == len(shard_table):
+                merged_table.extend(shard_table)
+            else:
+                merged_table.extend(shard_table.select_rows(kept_rows))
+        merged_table.build_sorted_indexes()
+        # results are only dropped from a result cache when a shard changes, not when a filter merges other shards
+        merged_table.source_identity = (os.path.abspath(self.file_name), shard_identities)
+        merged_table.source_selection = merge_key[1]
+        for stale_key in [key for key in self.merged_tables if key[0] != shard_identities]:
+            del self.merged_tables[stale_key]
+        self.merged_tables[merge_key] = merged_table
+        while len(self.merged_tables) > merged_table_limit:
+            self.merged_tables.popitem(last=False)
+        return merged_table
+
+    def get_shard_ids(self, columnar_file):
+        """returns the ids of a shard that was skipped, read from the columnar file in its state from
+        get_shard_states() without loading anything else"""
+        return read_columns(columnar_file, ['id'])['id']
@@ -0,0 +1,84 @@
+"""This module defines a sorted index over a single numerical column of a Meteorite_Table. The index is built once
+after a file has been loaded so that every range filter afterwards can be answered with a binary search instead of
+checking every meteorite in the table"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class Sorted_Index:
+    """A Sorted_Index keeps the values of a column in sorted order next to the row index each value came from.
+    Rows that have no value for the column are kept apart in a separate bucket and never show up in a range query"""
+    def __init__(self, column, is_missing):
+        """Builds the index from a column of a Meteorite_Table. is_missing is a function that takes a value from the
+        column and returns True when that value stands in for missing data"""
+        self.row_count = len(column)
+        self.missing_rows = array('q')
+        present_rows = []
+        for index in range(len(column)):
+            if is_missing(column[index]):
+                self.missing_rows.append(index)
+            else:
+                present_rows.append(index)
+        present_rows.sort(key=column.__getitem__)
+        self.row_indices = array('q', present_rows)
+        self.sorted_values = array(column.typecode, [column[index] for index in present_rows])
+
+    @classmethod
+    def from_arrays(cls, row_count, row_indices, sorted_values, missing_rows):
+        """Rebuilds an index from arrays that were saved from an earlier index, without sorting anything again"""
+        sorted_index = cls.__new__(cls)
+        sorted_index.row_count = row_count
+        sorted_index.row_indices = row_indices
+        sorted_index.sorted_values = sorted_values
+        sorted_index.missing_rows = missing_rows
+        return sorted_index
+
+    def __len__(self):
+        return len(self.sorted_values)
+
+    def add_rows(self, column, is_missing):
+        """Adds the rows that have been appended to a column since the index was built, without sorting the rows
+        that were already in it. Only the new rows are sorted, and they are then merged into place, so the index ends
+        up exactly the same as one built from the whole column"""
+        new_rows = []
+        for index in range(self.row_count, len(column)):
+            if is_missing(column[index]):
+                self.missing_rows.append(index)
+            else:
+                new_rows.append(index)
+        self.row_count = len(column)
+        if not new_rows:
+            return
+        new_rows.sort(key=column.__getitem__)
+        row_indices = array('q')
+        sorted_values = array(self.sorted_values.typecode)
+        previous_position = 0
+        for index in new_rows:
+            # new rows come after every old row with an equal value, the same place a stable sort would put them
+            position = bisect_right(self.sorted_values, column[index], previous_position)
+            row_indices.extend(self.row_indices[previous_position:position])
+            sorted_values.extend(self.sorted_values[previous_position:position])
+            row_indices.append(index)
+            sorted_values.append(column[index])
+            previous_position = position
+        row_indices.extend(self.row_indices[previous_position:])
+        sorted_values.extend(self.sorted_values[previous_position:])
+        self.row_indices = row_indices
+        self.sorted_values = sorted_values
+
+    def get_position_range(self, lower_bound, upper_bound):
+        """returns the start and stop positions in sorted_values of all values in [lower_bound, upper_bound)"""
+        start = bisect_left(self.sorted_values, lower_bound)
+        stop = bisect_left(self.sorted_values, upper_bound, start)
+        return start, max(start, stop)
+
+    def count_range(self, lower_bound, upper_bound):
+        """returns how many rows have a value in [lower_bound, upper_bound) without collecting them"""
+        start, stop = self.get_position_range(lower_bound, upper_bound)
+        return stop - start
+
+    def range_query(self, lower_bound, upper_bound):
+        """returns the row indices of every value in [lower_bound, upper_bound), in the same order the rows appear
+        in the table. The cost depends on the number of matches rather than the size of the table"""
+        start, stop = self.get_position_range(lower_bound, upper_bound)
+        return sorted(self.row_indices[start:stop])
@@ -0,0 +1,159 @@
+"""This module defines a grid index over the reclat and reclong columns of a Meteorite_Table. The globe is cut into
+cells of a fixed number of degrees and every meteorite with coordinates is filed under the cell it lands in. Radius,
+nearest neighbour and bounding box queries then only have to look at the meteorites in the few cells that can hold an
+answer instead of the whole table. Distances are great circle distances found with the haversine formula"""
+from array import array
+from math import asin, cos, degrees, isnan, radians, sin, sqrt
+
+earth_radius_km = 6371.0088
+# half of the earth's circumference, the largest distance there can be between two points
+max_distance_km = 20015.1
+
+
+def haversine_distances(latitude, longitude, latitudes, longitudes):
+    """returns a list of the distances in km from a single point to every point in two matching sequences of
+    latitudes and longitudes, all in degrees"""
+    latitude_radians = radians(latitude)
+    cos_latitude = cos(latitude_radians)
+    longitude_radians = radians(longitude)
+    distances = []
+    for other_latitude, other_longitude in zip(latitudes, longitudes):
+        other_latitude_radians = radians(other_latitude)
+        half_chord = sin((other_latitude_radians - latitude_radians) / 2) ** 2 + cos_latitude * \
+            cos(other_latitude_radians) * sin((radians(other_longitude) - longitude_radians) / 2) ** 2
+        distances.append(2 * earth_radius_km * asin(min(1.0, sqrt(half_chord))))
+    return distances
+
+
+class Spatial_Index:
+    """A Spatial_Index files the row index of every meteorite with both a reclat and a reclong under a grid cell of
+    cell_size degrees. Rows without coordinates are left out of every spatial query. The few rows with a latitude
+    outside -90 to 90 or a longitude outside -180 to 180 are kept in a separate list that every query checks, so that
+    they are treated the same way as a full scan of the table would treat them"""
+    def __init__(self, rec_lats, rec_longs, cell_size=1.0):
+        """Builds the grid from the reclat and reclong columns of a Meteorite_Table"""
+        self.rec_lats = rec_lats
+        self.rec_longs = rec_longs
+        self.cell_size = cell_size
+        self.row_count = 0
+        self.cells = {}
+        self.irregular_rows = array('q')
+        self.add_rows()
+
+    def add_rows(self):
+        """files every row that has been added to the reclat and reclong columns since the index was last updated
+        under its cell"""
+        rec_lats = self.rec_lats
+        rec_longs = self.rec_longs
+        for index in range(self.row_count, len(rec_lats)):
+            if isnan(rec_lats[index]) or isnan(rec_longs[index]):
+                continue
+            if not (-90 <= rec_lats[index] <= 90 and -180 <= rec_longs[index] <= 180):
+                self.irregular_rows.append(index)
+                continue
+            cell = self._get_cell(rec_lats[index], rec_longs[index])
+            if cell not in self.cells:
+                self.cells[cell] = array('q')
+            self.cells[cell].append(index)
+        self.row_count = len(rec_lats)
+
+    def get_rows_within_radius(self, latitude, longitude, radius_km):
+        """Returns a list of (distance in km, row index) pairs for every meteorite within radius_km of a point,
+        closest first. Only the cells that overlap a box around the circle are checked"""
+        candidate_rows = self.get_candidate_rows_within_radius(latitude, longitude, radius_km)
+        distances = haversine_distances(latitude, longitude, [self.rec_lats[index] for index in candidate_rows],
+                                        [self.rec_longs[index] for index in candidate_rows])
+        return sorted((distance, index) for distance, index in zip(distances, candidate_rows) if distance <= radius_km)
+
+    def get_candidate_rows_within_radius(self, latitude, longitude, radius_km):
+        """returns the rows, in table order, of every cell that overlaps a box drawn around a circle. Some of these
+        rows may still be outside the circle itself"""
+        latitude_change = degrees(min(radius_km, max_distance_km) / earth_radius_km)
+        lower_latitude = latitude - latitude_change
+        upper_latitude = latitude + latitude_change
+        if lower_latitude <= -90 or upper_latitude >= 90 or radius_km >= max_distance_km / 2:
+            # the circle covers a pole, so every longitude has to be checked
+            return self._get_rows_in_cells(max(lower_latitude, -90), min(upper_latitude, 90), -180, 180)
+        longitude_change = degrees(asin(min(1.0, sin(radius_km / earth_radius_km) / cos(radians(latitude)))))
+        return self._get_rows_in_cells(lower_latitude, upper_latitude, longitude - longitude_change,
+                                       longitude + longitude_change)
+
+    def get_nearest_rows(self, latitude, longitude, count, row_filter=None):
+        """Returns a list of (distance in km, row index) pairs for the count meteorites closest to a point, closest
+        first. The search radius starts at about one cell and doubles until enough meteorites are found, since every
+        meteorite outside the radius is further away than every meteorite inside it. row_filter is an optional
+        function that takes a list of row indices and returns only the ones that may be part of the answer"""
+        radius_km = self.cell_size * 111.2
+        while True:
+            rows_within_radius = self.get_rows_within_radius(latitude, longitude, radius_km)
+            if row_filter is not None:
+                allowed_rows = set(row_filter(sorted(index for distance, index in rows_within_radius)))
+                rows_within_radius = [pair for pair in rows_within_radius if pair[1] in allowed_rows]
+            if len(rows_within_radius) >= count or radius_km >= max_distance_km:
+                return rows_within_radius[:count]
+            radius_km = radius_km * 2
+
+    def get_rows_in_bounding_box(self, lower_latitude, upper_latitude, lower_longitude, upper_longitude):
+        """Returns the rows, in table order, with reclat in [lower_latitude, upper_latitude) and reclong in
+        [lower_longitude, upper_longitude). A box whose lower_longitude is greater than its upper_longitude crosses the
+        180th meridian"""
+        # every cell is inside -180 to 180, so the cells to look in are found from the box clamped to the globe. The
+        # rows are still checked against the box as given, which also covers the irregular rows
+        cell_lower_longitude = _clamp(lower_longitude, -180, 180)
+        cell_upper_longitude = _clamp(upper_longitude, -180, 180)
+        if lower_longitude > upper_longitude:
+            candidate_rows = sorted(set(
+                self._get_rows_in_cells(lower_latitude, upper_latitude, cell_lower_longitude, 180) +
+                self._get_rows_in_cells(lower_latitude, upper_latitude, -180, cell_upper_longitude)))
+        else:
+            candidate_rows = self._get_rows_in_cells(lower_latitude, upper_latitude, cell_lower_longitude,
+                                                     cell_upper_longitude)
+        return [index for index in candidate_rows if lower_latitude <= self.rec_lats[index] < upper_latitude and
+                self._longitude_in_range(self.rec_longs[index], lower_longitude, upper_longitude)]
+
+    def _get_rows_in_cells(self, lower_latitude, upper_latitude, lower_longitude, upper_longitude):
+        """collects the rows of every cell overlapping a range of latitude and longitude, in table order. Longitudes
+        outside -180 to 180 wrap around to the other side of the globe. Latitudes are clamped to -90 to 90, since no
+        cell lies outside them, and a range of longitude of a full turn or more looks at every longitude, so infinite
+        or very large ranges only ever look at the cells that exist"""
+        lower_latitude = _clamp(lower_latitude, -90, 90)
+        upper_latitude = _clamp(upper_latitude, -90, 90)
+        rows = list(self.irregular_rows)
+        if upper_longitude - lower_longitude >= 360:
+            lower_latitude_cell = self._get_cell(lower_latitude, 0)[0]
+            upper_latitude_cell = self._get_cell(upper_latitude, 0)[0]
+            for (latitude_cell, longitude_cell), cell_rows in self.cells.items():
+                if lower_latitude_cell <= latitude_cell <= upper_latitude_cell:
+                    rows.extend(cell_rows)
+        else:
+            lower_latitude_cell, lower_longitude_cell = self._get_cell(lower_latitude, lower_longitude)
+            upper_latitude_cell, upper_longitude_cell = self._get_cell(upper_latitude, upper_longitude)
+            cells_around_globe = round(360 / self.cell_size)
+            for latitude_cell in range(lower_latitude_cell, upper_latitude_cell + 1):
+                for longitude_cell in range(lower_longitude_cell, upper_longitude_cell + 1):
+                    rows.extend(self._get_wrapped_cell(latitude_cell, longitude_cell, cells_around_globe))
+        rows.sort()
+        return rows
+
+    def _get_wrapped_cell(self, latitude_cell, longitude_cell, cells_around_globe):
+        """returns the rows in a cell, also checking the cell one full turn of the globe to either side so that
+        searches crossing the 180th meridian find the meteorites on the other side"""
+        rows = []
+        for turn in (-cells_around_globe, 0, cells_around_globe):
+            rows.extend(self.cells.get((latitude_cell, longitude_cell + turn), ()))
+        return rows
+
+    def _get_cell(self, latitude, longitude):
+        """returns the grid cell a point falls in"""
+        return int(latitude // self.cell_size), int(longitude // self.cell_size)
+
+    def _longitude_in_range(self, longitude, lower_longitude, upper_longitude):
+        """checks a longitude against a range that may cross the 180th meridian"""
+        if lower_longitude > upper_longitude:
+            return longitude >= lower_longitude or longitude < upper_longitude
+        return lower_longitude <= longitude < upper_longitude
+
+
+def _clamp(value, lower, upper):
+    """returns value moved inside [lower, upper]"""
+    return min(max(value, lower), upper)
@@ -0,0 +1,225 @@
+"""This module measures the stages of a run of the filtering program: loading the data file, parsing it, filtering it
+and writing each output. Every stage records its wall time, the number of rows it handled and the peak memory it
+allocated, and can also be run under cProfile to see which functions it spends its time in. Profiling is off unless a
+Stage_Profiler has been started, and while it is off profile_stage() hands back a single shared object that does
+nothing, so the stages cost no more than they did before. Stages run by several threads at once, such as the requests
+of a Query_Server, each nest only inside the stages of their own thread"""
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+
+# the profiler that profile_stage() records stages into, or None while profiling is off
+active_profiler = None
+# the number of functions listed for each stage run under cProfile
+profile_function_count = 10
+
+
+class Stage_Record:
+    """The measurements of a single run of a stage. depth is the number of stages it is nested inside of, such as
+    parsing inside of loading. rows can be set by the stage itself once it knows how many rows it handled"""
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.rows = None
+        self.seconds = None
+        self.peak_memory_bytes = None
+        self.start_memory = None
+        self.child_peak_memory = 0
+        self.profile = None
+
+    def get_rows_per_second(self):
+        """returns the rows handled per second, or None if the number of rows is not known"""
+        if self.rows is None or self.seconds is None:
+            return None
+        return self.rows / max(self.seconds, 1e-9)
+
+
+class _Disabled_Stage:
+    """stands in for a stage while profiling is off. It is its own context manager and ignores everything, including
+    the rows a stage sets on it, so the single shared object never carries anything from one caller to the next"""
+    __slots__ = ()
+
+    @property
+    def rows(self):
+        return None
+
+    @rows.setter
+    def rows(self, rows):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        return False
+
+
+disabled_stage = _Disabled_Stage()
+
+
+def profile_stage(name):
+    """Returns a context manager that measures the code inside it as a stage of the given name. The object it gives
+    back has a rows attribute the stage can set. While no profiler has been started this is always disabled_stage"""
+    if active_profiler is None:
+        return disabled_stage
+    return active_profiler.stage(name)
+
+
+class Stage_Profiler:
+    """A Stage_Profiler collects a Stage_Record for every stage run while it is active. Peak memory is measured with
+    tracemalloc when trace_memory is True, which slows down every allocation, so timings are only comparable between
+    runs made with the same settings. tracemalloc and cProfile each measure the whole process at once, so a stage that
+    starts while another thread is running a stage has its time and rows recorded but not its memory or profile"""
+    def __init__(self, trace_memory=True, use_cprofile=False):
+        """records holds every stage in the order they started. Each thread keeps the stages it has open in
+        thread_state, and open_stage_count counts the open stages of every thread"""
+        self.trace_memory = trace_memory
+        self.use_cprofile = use_cprofile
+        self.records = []
+        self.thread_state = threading.local()
+        self.open_stage_count = 0
+        self.lock = threading.Lock()
+        self.started_tracemalloc = False
+
+    def start(self):
+        """makes this the active profiler so that profile_stage() records into it"""
+        global active_profiler
+        active_profiler = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        return self
+
+    def stop(self):
+        """turns profiling off again"""
+        global active_profiler
+        if active_profiler is self:
+            active_profiler = None
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def stage(self, name):
+        """returns a context manager that records a single run of a stage"""
+        return _Stage_Context(self, name)
+
+    def get_open_records(self):
+        """returns the list of stages the calling thread has open, outermost first"""
+        if not hasattr(self.thread_state, 'open_records'):
+            self.thread_state.open_records = []
+        return self.thread_state.open_records
+
+    def enter_stage(self, name):
+        """starts a new Stage_Record. Only the outermost stage is run under cProfile, since one profile can not be
+        started inside of another"""
+        open_records = self.get_open_records()
+        stage_record = Stage_Record(name, len(open_records))
+        with self.lock:
+            # every open stage of other threads is still counted here, so the stage only runs alone if there are none
+            is_alone = self.open_stage_count == len(open_records)
+            self.open_stage_count = self.open_stage_count + 1
+            self.records.append(stage_record)
+        is_measured = is_alone and (not open_records or open_records[-1].start_memory is not None)
+        if is_measured and self.trace_memory and tracemalloc.is_tracing():
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            if open_records:
+                # the peak is reset for the new stage, so the stage around it has to remember the peak it had so far
+                parent_record = open_records[-1]
+                parent_record.child_peak_memory = max(parent_record.child_peak_memory, peak_memory)
+            tracemalloc.reset_peak()
+            stage_record.start_memory = current_memory
+        if is_alone and self.use_cprofile and not open_records:
+            stage_record.profile = cProfile.Profile()
+        open_records.append(stage_record)
+        if stage_record.profile is not None:
+            stage_record.profile.enable()
+        stage_record.seconds = time.perf_counter()
+        return stage_record
+
+    def exit_stage(self, stage_record):
+        """finishes a Stage_Record, passing its peak memory on to the stage around it"""
+        stage_record.seconds = time.perf_counter() - stage_record.seconds
+        if stage_record.profile is not None:
+            stage_record.profile.disable()
+        open_records = self.get_open_records()
+        open_records.pop()
+        with self.lock:
+            self.open_stage_count = self.open_stage_count - 1
+        if stage_record.start_memory is not None and tracemalloc.is_tracing():
+            peak_memory = max(tracemalloc.get_traced_memory()[1], stage_record.child_peak_memory)
+            stage_record.peak_memory_bytes = peak_memory - stage_record.start_memory
+            if open_records:
+                parent_record = open_records[-1]
+                parent_record.child_peak_memory = max(parent_record.child_peak_memory, peak_memory)
+
+    def get_results(self):
+        """returns every stage record as a dictionary, in the order the stages started"""
+        results = []
+        for stage_record in self.records:
+            result = {'stage': stage_record.name, 'depth': stage_record.depth, 'seconds': stage_record.seconds,
+                      'rows': stage_record.rows, 'rows_per_second': stage_record.get_rows_per_second(),
+                      'peak_memory_bytes': stage_record.peak_memory_bytes}
+            if stage_record.profile is not None:
+                result['top_functions'] = get_top_functions(stage_record.profile)
+            results.append(result)
+        return results
+
+    def print_summary(self):
+        """prints a table of every stage, with nested stages indented under the stage they ran in"""
+        print(f'\n{"stage":<24}{"seconds":>10}{"rows":>12}{"rows/second":>14}{"peak MB":>10}')
+        for stage_record in self.records:
+            rows = '' if stage_record.rows is None else f'{stage_record.rows:,}'
+            rows_per_second = stage_record.get_rows_per_second()
+            rows_per_second = '' if rows_per_second is None else f'{rows_per_second:,.0f}'
+            peak_memory = stage_record.peak_memory_bytes
+            peak_memory = '' if peak_memory is None else f'{peak_memory / (1 << 20):,.1f}'
+            stage_name = '  ' * stage_record.depth + stage_record.name
+            print(f'{stage_name:<24}{stage_record.seconds:>10.3f}{rows:>12}{rows_per_second:>14}{peak_memory:>10}')
+        for stage_record in self.records:
+            if stage_record.profile is not None:
+                print(f'\nMost time spent in {stage_record.name}:')
+                print(get_profile_report(stage_record.profile))
+
+    def write_json(self, file_name):
+        """writes the results of every stage to a JSON file"""
+        with open(file_name, 'w') as json_file:
+            json.dump({'stages': self.get_results()}, json_file, indent=2)
+
+
+class _Stage_Context:
+    """the context manager returned by Stage_Profiler.stage()"""
+    def __init__(self, stage_profiler, name):
+        self.stage_profiler = stage_profiler
+        self.name = name
+        self.stage_record = None
+
+    def __enter__(self):
+        self.stage_record = self.stage_profiler.enter_stage(self.name)
+        return self.stage_record
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.stage_profiler.exit_stage(self.stage_record)
+        return False
+
+
+def get_top_functions(profile):
+    """returns the functions a profile spent the most cumulative time in as a list of dictionaries"""
+    profile_statistics = pstats.Stats(profile)
+    top_functions = []
+    for function, (primitive_calls, calls, total_time, cumulative_time, callers) in sorted(
+            profile_statistics.stats.items(), key=lambda item: item[1][3], reverse=True)[:profile_function_count]:
+        file_name, line_number, function_name = function
+        top_functions.append({'function': f'{file_name}:{line_number}({function_name})', 'calls': calls,
+                              'total_seconds': total_time, 'cumulative_seconds': cumulative_time})
+    return top_functions
+
+
+def get_profile_report(profile):
+    """returns the usual pstats listing of the functions a profile spent the most cumulative time in"""
+    report = io.StringIO()
+    pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(profile_function_count)
+    return report.getvalue().rstrip()
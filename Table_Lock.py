@@ -0,0 +1,47 @@
+"""This module lets many threads read a Meteorite_Table at the same time while making sure rows are only ever appended
+to it when no thread is reading it. The Query_Server answers every request in a worker thread, and an update that
+appended rows while a request was running could leave that request looking at columns and indexes of different
+lengths"""
+import threading
+from contextlib import contextmanager
+
+
+class Table_Lock:
+    """A Table_Lock is held by any number of readers at once, or by a single writer. A writer that is waiting stops
+    new readers from starting, so a steady stream of requests can never hold off an update for good"""
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.reader_count = 0
+        self.waiting_writer_count = 0
+        self.is_writing = False
+
+    @contextmanager
+    def reading(self):
+        """holds the lock as a reader for the length of a with block, waiting for any writer to finish first"""
+        with self.condition:
+            while self.is_writing or self.waiting_writer_count:
+                self.condition.wait()
+            self.reader_count = self.reader_count + 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.reader_count = self.reader_count - 1
+                if self.reader_count == 0:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        """holds the lock as the only writer for the length of a with block, waiting for every reader to finish"""
+        with self.condition:
+            self.waiting_writer_count = self.waiting_writer_count + 1
+            while self.is_writing or self.reader_count:
+                self.condition.wait()
+            self.waiting_writer_count = self.waiting_writer_count - 1
+            self.is_writing = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.is_writing = False
+                self.condition.notify_all()
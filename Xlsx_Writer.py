@@ -0,0 +1,173 @@
+"""This module writes .xlsx excel files one row at a time. Unlike xlwt, nothing but the current batch of rows is held
+in memory, so the size of the file is only limited by the disk. An .xlsx file is a zip archive of XML documents, and
+the rows are streamed straight into the compressed worksheet as they are written. A worksheet holds at most 1,048,576
+rows, so once a worksheet is full the rows carry on in a new worksheet"""
+import zipfile
+from xml.sax.saxutils import escape
+
+max_rows_per_sheet = 1048576
+# the characters that can not appear anywhere in an XML 1.0 document, even escaped, mapped to None so that
+# str.translate() removes them. Excel refuses to open a workbook holding any of them
+invalid_xml_characters = dict.fromkeys([*range(0x00, 0x09), 0x0b, 0x0c, *range(0x0e, 0x20), *range(0xd800, 0xe000),
+                                        0xfffe, 0xffff])
+content_types_xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                     '<Default Extension="xml" ContentType="application/xml"/>'
+                     '<Override PartName="/xl/workbook.xml" '
+                     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                     '{sheet_overrides}</Types>')
+sheet_override_xml = ('<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                      'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+root_relationships_xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                          '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                          '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.openxmlformats.org/'
+                          'officeDocument/2006/relationships/officeDocument"/></Relationships>')
+workbook_xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                '<sheets>{sheets}</sheets></workbook>')
+workbook_sheet_xml = '<sheet name="{name}" sheetId="{number}" r:id="rId{number}"/>'
+workbook_relationships_xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                              '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                              '{relationships}</Relationships>')
+workbook_relationship_xml = ('<Relationship Id="rId{number}" Target="worksheets/sheet{number}.xml" '
+                             'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>')
+sheet_start_xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                   '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+sheet_end_xml = '</sheetData></worksheet>'
+
+
+class Xlsx_Writer:
+    """An Xlsx_Writer streams rows into a new .xlsx file. Rows are collected into batches that are compressed and
+    written together. Every worksheet starts with the header row, and the columns listed in numeric_columns are
+    written as number cells instead of text whenever their value is a number"""
+    def __init__(self, file_name, sheet_name, header, numeric_columns=(), batch_size=2000):
+        """Opens the file and starts the first worksheet. Only the rows in the current batch are ever held in
+        memory, so the memory used does not grow with the number of rows"""
+        self.file_name = file_name
+        self.sheet_name = sheet_name
+        self.header = header
+        self.numeric_columns = set(numeric_columns)
+        self.batch_size = batch_size
+        self.column_letters = [_get_column_letters(index) for index in range(len(header))]
+        self.zip_file = zipfile.ZipFile(file_name, 'w', zipfile.ZIP_DEFLATED)
+        self.sheet_file = None
+        self.sheet_count = 0
+        self.sheet_row_count = 0
+        self.row_count = 0
+        self.row_batch = []
+        self._start_sheet()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+    def write_row(self, values):
+        """Adds a row of values to the current batch, writing the batch once it is full and moving on to a new
+        worksheet once the current one is full. None is written as an empty cell"""
+        if self.sheet_row_count == max_rows_per_sheet:
+            self._write_batch()
+            self._finish_sheet()
+            self._start_sheet()
+        self.sheet_row_count = self.sheet_row_count + 1
+        self.row_count = self.row_count + 1
+        self.row_batch.append(self._build_row_xml(values, self.sheet_row_count))
+        if len(self.row_batch) >= self.batch_size:
+            self._write_batch()
+
+    def write_rows(self, rows):
+        """writes every row from an iterable of rows, returning the total number of rows written to the file"""
+        for values in rows:
+            self.write_row(values)
+        return self.row_count
+
+    def close(self):
+        """writes the remaining rows and the parts of the workbook that list its worksheets, then closes the file"""
+        if self.zip_file is None:
+            return
+        self._write_batch()
+        self._finish_sheet()
+        sheet_numbers = range(1, self.sheet_count + 1)
+        self.zip_file.writestr('[Content_Types].xml', content_types_xml.format(
+            sheet_overrides=''.join(sheet_override_xml.format(number=number) for number in sheet_numbers)))
+        self.zip_file.writestr('_rels/.rels', root_relationships_xml)
+        self.zip_file.writestr('xl/workbook.xml', workbook_xml.format(sheets=''.join(
+            workbook_sheet_xml.format(name=_escape_text(self._get_sheet_name(number)), number=number)
+            for number in sheet_numbers)))
+        self.zip_file.writestr('xl/_rels/workbook.xml.rels', workbook_relationships_xml.format(
+            relationships=''.join(workbook_relationship_xml.format(number=number) for number in sheet_numbers)))
+        self.zip_file.close()
+        self.zip_file = None
+
+    def _start_sheet(self):
+        """opens the next worksheet in the zip file and writes its header row"""
+        self.sheet_count = self.sheet_count + 1
+        self.sheet_file = self.zip_file.open(f'xl/worksheets/sheet{self.sheet_count}.xml', 'w', force_zip64=True)
+        self.sheet_file.write(sheet_start_xml.encode('utf-8'))
+        self.sheet_row_count = 1
+        self.row_batch.append(self._build_row_xml(self.header, 1, header_row=True))
+
+    def _finish_sheet(self):
+        """closes off the XML of the current worksheet"""
+        self.sheet_file.write(sheet_end_xml.encode('utf-8'))
+        self.sheet_file.close()
+
+    def _write_batch(self):
+        """writes every row in the current batch to the worksheet in a single write"""
+        if self.row_batch:
+            self.sheet_file.write(''.join(self.row_batch).encode('utf-8'))
+            self.row_batch = []
+
+    def _build_row_xml(self, values, row_number, header_row=False):
+        """builds the XML for a single row. Text is written as inline strings so that no shared string table has to
+        be kept in memory, leaving out any characters XML does not allow and any cell left with no text"""
+        cells = []
+        for index, value in enumerate(values):
+            if value is None or value == '':
+                continue
+            reference = f'{self.column_letters[index]}{row_number}'
+            number = None if header_row or index not in self.numeric_columns else _to_excel_number(value)
+            if number is not None:
+                cells.append(f'<c r="{reference}"><v>{number}</v></c>')
+                continue
+            text = _escape_text(str(value))
+            if text:
+                cells.append(f'<c r="{reference}" t="inlineStr"><is><t>{text}</t></is></c>')
+        return f'<row r="{row_number}">{"".join(cells)}</row>'
+
+    def _get_sheet_name(self, number):
+        """the first worksheet uses sheet_name and every overflow worksheet adds its number to the end"""
+        if number == 1:
+            return self.sheet_name
+        return f'{self.sheet_name}{number}'
+
+
+def _escape_text(text):
+    """returns text ready to be written into XML, with &, < and > escaped and the characters in
+    invalid_xml_characters removed"""
+    return escape(text.translate(invalid_xml_characters))
+
+
+def _get_column_letters(index):
+    """turns a column index starting at 0 into excel column letters, so 0 is 'A' and 26 is 'AA'"""
+    letters = ''
+    index = index + 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _to_excel_number(value):
+    """returns a value written the way excel expects a number cell, or None if the value is not a number that
+    excel can store. nan and infinity can not be stored"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if number != number or number in (float('inf'), float('-inf')):
+        return None
+    return repr(number)
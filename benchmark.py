@@ -0,0 +1,251 @@
+'''This module measures how the stages of the filtering program scale with the size of the data. Synthetic data files
+in the meteorite_landings.txt format are made by copying the real data file many times over, and each stage is timed
+and memory profiled separately on every size of file: loading, filtering and each output format. The results are
+written as JSON and can be compared against a saved baseline to catch stages that have become slower or use more
+memory'''
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from Meteorite_Filter import *
+
+default_scales = [10, 100, 1000]
+# the filter every benchmark runs. It matches about one meteorite in 160, so the filter turns a few hundred thousand
+# rows into Meteorite objects at the largest scale rather than nearly every row of the file
+benchmark_filtering_parameter = 'mass'
+benchmark_lower_bound = 1000
+benchmark_upper_bound = 1100
+# the most meteorites any output stage writes, so the output stages take about the same time at every large scale
+# and their rows per second can still be compared
+output_row_limit = 100000
+# an .xls worksheet holds 65,536 rows including the header, so the excel stage only writes this many meteorites
+excel_row_limit = 65535
+# the largest scale whose memory is measured. Tracing every allocation of tens of millions of rows would take hours,
+# so larger scales are only timed
+default_memory_scale_limit = 100
+stage_names = ['load', 'filter', 'text file', 'excel file', 'xlsx file', 'columnar file', 'terminal',
+               'console table']
+
+
+def generate_synthetic_catalog(source_file_name, scale, output_file_name, seed=390):
+    """Writes a data file holding every meteorite in source_file_name scale times over. Every copy after the first gets
+    a new name and id so that they stay unique, and its mass is changed by up to 10% so that the sorted indexes are
+    not just the same values repeated. Returns the number of meteorites written"""
+    random_generator = random.Random(seed)
+    with open(source_file_name) as source_file:
+        header = source_file.readline()
+        source_rows = [clean_data_list(line) for line in source_file]
+    id_offset = max((int(row[1]) for row in source_rows if row[1] is not None), default=0) + 1
+    with open(output_file_name, 'w', buffering=1 << 20) as output_file:
+        output_file.write(header)
+        for copy_number in range(scale):
+            if copy_number == 0:
+                output_file.writelines(create_data_string(row) for row in source_rows)
+                continue
+            for row in source_rows:
+                row = list(row) + [None] * (12 - len(row))
+                row[0] = f'{row[0]} {copy_number}'
+                if row[1] is not None:
+                    row[1] = str(int(row[1]) + id_offset * copy_number)
+                if row[4] is not None:
+                    row[4] = f'{float(row[4]) * random_generator.uniform(0.9, 1.1):.2f}'
+                output_file.write(create_data_string(row))
+    return len(source_rows) * scale
+
+
+def measure_stage(stage_name, scale, run_stage, trace_memory):
+    """Runs a single stage, returning a dictionary with its time and the number of rows it handled. run_stage must
+    return the number of rows. When trace_memory is True the peak memory allocated during the stage is measured with
+    tracemalloc instead, since tracing slows every allocation down too much to time the stage at the same time"""
+    if trace_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    start_time = time.perf_counter()
+    row_count = run_stage()
+    elapsed_time = time.perf_counter() - start_time
+    result = {'scale': scale, 'stage': stage_name, 'rows': row_count}
+    if trace_memory:
+        result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        result['seconds'] = elapsed_time
+        result['rows_per_second'] = row_count / max(elapsed_time, 1e-9)
+    return result
+
+
+def run_stages(data_file_name, scale, trace_memory):
+    """Runs every stage once on a data file in order, returning a list of stage results. The output stages write
+    their files into the current folder, each writing at most output_row_limit of the rows that matched the filter
+    through the same path a streamed filter writes through"""
+    meteorite_filter = Meteorite_Filter()
+    meteorite_filter.file_name = data_file_name
+    meteorite_filter.file_mode = 'r'
+    meteorite_filter.use_cache = False
+    meteorite_filter.filtering_parameter = benchmark_filtering_parameter
+    meteorite_filter.lower_bound = benchmark_lower_bound
+    meteorite_filter.upper_bound = benchmark_upper_bound
+
+    def load():
+        meteorite_filter.create_meteorite_list()
+        return len(meteorite_filter.meteorite_table)
+
+    def filter_meteorites():
+        meteorite_filter.filter_meteorite_list()
+        return len(meteorite_filter.filtered_rows)
+
+    def get_output_meteorites(row_limit=output_row_limit):
+        """the meteorites the output stages write, made one at a time from the first rows that matched so that no
+        stage holds them all in memory at once"""
+        meteorite_table = meteorite_filter.meteorite_table
+        return (meteorite_table.get_meteorite(index) for index in meteorite_filter.filtered_rows[:row_limit])
+
+    def get_output_row_count(row_limit=output_row_limit):
+        return min(len(meteorite_filter.filtered_rows), row_limit)
+
+    def write_text_file():
+        meteorite_filter.create_text_file(get_output_meteorites())
+        return get_output_row_count()
+
+    def write_excel_file():
+        meteorite_filter.create_excel_file(get_output_meteorites(excel_row_limit))
+        return get_output_row_count(excel_row_limit)
+
+    def write_xlsx_file():
+        meteorite_filter.create_xlsx_file(get_output_meteorites())
+        return get_output_row_count()
+
+    def write_columnar_file():
+        meteorite_filter.create_columnar_file(get_output_meteorites())
+        return get_output_row_count()
+
+    def print_to_console():
+        with open(os.devnull, 'w') as null_file, contextlib.redirect_stdout(null_file):
+            meteorite_filter.print_results_to_console(get_output_meteorites())
+        return get_output_row_count()
+
+    def print_console_table():
+        with open(os.devnull, 'w') as null_file, contextlib.redirect_stdout(null_file):
+            return meteorite_filter.print_console_table(get_output_meteorites())
+
+    stages = dict(zip(stage_names, [load, filter_meteorites, write_text_file, write_excel_file, write_xlsx_file,
+                                    write_columnar_file, print_to_console, print_console_table]))
+    results = []
+    for stage_name in stage_names:
+        # the file names printed by the output stages would only get in the way of the benchmark report
+        with open(os.devnull, 'w') as null_file, contextlib.redirect_stdout(null_file):
+            results.append(measure_stage(stage_name, scale, stages[stage_name], trace_memory))
+    return results
+
+
+def run_benchmarks(source_file_name, scales, work_folder, trace_memory=True,
+                   memory_scale_limit=default_memory_scale_limit):
+    """Generates a synthetic data file for every scale in work_folder and runs every stage on it, first for time and
+    then, when trace_memory is True and the scale is no larger than memory_scale_limit, again for memory. Returns a
+    list with one result per scale and stage, and removes every file it creates"""
+    results = []
+    start_folder = os.getcwd()
+    source_file_name = os.path.abspath(source_file_name)
+    for scale in scales:
+        scale_folder = tempfile.mkdtemp(prefix=f'scale_{scale}_', dir=work_folder)
+        try:
+            os.chdir(scale_folder)
+            data_file_name = os.path.join(scale_folder, 'meteorites.txt')
+            generate_synthetic_catalog(source_file_name, scale, data_file_name)
+            timing_results = run_stages(data_file_name, scale, False)
+            if trace_memory and scale <= memory_scale_limit:
+                for timing_result, memory_result in zip(timing_results, run_stages(data_file_name, scale, True)):
+                    timing_result['peak_memory_bytes'] = memory_result['peak_memory_bytes']
+            results.extend(timing_results)
+        finally:
+            os.chdir(start_folder)
+            shutil.rmtree(scale_folder, ignore_errors=True)
+    return results
+
+
+def find_regressions(results, baseline_results, tolerance=0.2):
+    """Compares results against a baseline, returning a list of messages for every stage that now handles fewer rows
+    per second, or has a higher peak memory, than the baseline by more than the tolerance. Stages missing from the
+    baseline are not compared"""
+    baseline_by_stage = {(result['scale'], result['stage']): result for result in baseline_results}
+    regressions = []
+    for result in results:
+        baseline = baseline_by_stage.get((result['scale'], result['stage']))
+        if baseline is None:
+            continue
+        stage_label = f'{result["stage"]} at {result["scale"]}x'
+        if result['rows_per_second'] < baseline['rows_per_second'] * (1 - tolerance):
+            regressions.append(f'{stage_label}: {result["rows_per_second"]:,.0f} rows per second, baseline '
+                               f'{baseline["rows_per_second"]:,.0f}')
+        if 'peak_memory_bytes' in result and 'peak_memory_bytes' in baseline and \
+                result['peak_memory_bytes'] > baseline['peak_memory_bytes'] * (1 + tolerance):
+            regressions.append(f'{stage_label}: peak memory {result["peak_memory_bytes"]:,} bytes, baseline '
+                               f'{baseline["peak_memory_bytes"]:,}')
+    return regressions
+
+
+def print_results(results):
+    """prints a table of the results"""
+    print(f'{"scale":>8}{"stage":>14}{"rows":>14}{"seconds":>12}{"rows/second":>16}{"peak MB":>12}')
+    for result in results:
+        peak_memory = result.get('peak_memory_bytes')
+        peak_memory = '' if peak_memory is None else f'{peak_memory / (1 << 20):,.1f}'
+        print(f'{result["scale"]:>7}x{result["stage"]:>14}{result["rows"]:>14,}{result["seconds"]:>12.3f}'
+              f'{result["rows_per_second"]:>16,.0f}{peak_memory:>12}')
+
+
+def create_argument_parser():
+    """Builds the command line options of the benchmark"""
+    parser = argparse.ArgumentParser(description='Time and memory profile each stage of the meteorite filter on '
+                                                 'synthetic data files of increasing size.')
+    parser.add_argument('--source', default='meteorite_landings.txt',
+                        help='data file the synthetic data files are copied from (default: meteorite_landings.txt)')
+    parser.add_argument('--scales', default=','.join(str(scale) for scale in default_scales),
+                        help='comma separated list of how many times over to copy the source file (default: '
+                             '10,100,1000)')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='JSON file the results are written to (default: benchmark_results.json)')
+    parser.add_argument('--baseline', help='JSON results file from an earlier run to check for regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='fraction a stage may be slower or use more memory than the baseline (default: 0.2)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='only time the stages, skipping the second run that measures memory')
+    parser.add_argument('--memory-scale-limit', type=int, default=default_memory_scale_limit,
+                        help='largest scale whose memory is measured, larger scales are only timed (default: '
+                             f'{default_memory_scale_limit})')
+    parser.add_argument('--work-folder', default=None,
+                        help='folder the synthetic data files and outputs are written to while running (default: '
+                             'the system temporary folder)')
+    return parser
+
+
+def main(argument_list=None):
+    """Runs the benchmark and returns 1 if any regressions were found against the baseline, otherwise 0"""
+    arguments = create_argument_parser().parse_args(argument_list)
+    scales = [int(scale) for scale in arguments.scales.split(',') if scale.strip()]
+    results = run_benchmarks(arguments.source, scales, arguments.work_folder, not arguments.no_memory,
+                             arguments.memory_scale_limit)
+    print_results(results)
+    with open(arguments.output, 'w') as output_file:
+        json.dump({'python': platform.python_version(), 'platform': platform.platform(), 'results': results},
+                  output_file, indent=2)
+    print(f'Results written to "{arguments.output}"')
+    if arguments.baseline is None:
+        return 0
+    with open(arguments.baseline) as baseline_file:
+        regressions = find_regressions(results, json.load(baseline_file)['results'], arguments.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION: {regression}')
+    if not regressions:
+        print('No regressions against the baseline')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
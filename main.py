@@ -1,6 +1,13 @@
 '''This is the main module of the program. Most of the computation is done by the Meteorite_Filter module. This module
-prints a welcome and exit message along with starting execution'''
+prints a welcome and exit message along with starting execution. When command line arguments are given, the filter is
+run without any prompts, either for a single filter or for every job in a job file, or the file is served to clients
+over a local socket'''
+import argparse
+import asyncio
+from Batch_Runner import *
 from Meteorite_Filter import *
+from Query_Server import *
+from Stage_Profiler import *
 
 welcome_message = '''
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -22,8 +29,143 @@ def run_meteorite_filter_from_user_input():
     filter.output_meteorite_list()
 
 
-print(welcome_message)
-run_meteorite_filter_from_user_input()
-print(exit_message)
+def create_argument_parser():
+    """Builds the command line options. Running with no options at all keeps the original interactive prompts"""
+    parser = argparse.ArgumentParser(description='Filter meteorite data by a range of mass or year.')
+    parser.add_argument('--jobs', metavar='JOB_FILE',
+                        help='JSON or CSV file of jobs, each with a file, parameter, lower_bound, upper_bound and '
+                             'output_format. Every data file is only read once')
+    parser.add_argument('--file', help='file containing meteorite data to filter, or a folder or quoted glob pattern of '
+                                       'shard files that are merged into one catalog')
+    parser.add_argument('--parameter', choices=Meteorite_Filter.filtering_options, help='parameter to filter by')
+    parser.add_argument('--lower-bound', help='lower bound of the filtering parameter (inclusive)')
+    parser.add_argument('--upper-bound', help='upper bound of the filtering parameter (exclusive)')
+    parser.add_argument('--where', action='append', metavar='CONDITION',
+                        help='extra condition every meteorite must meet, repeatable: "column=lower:upper" for a '
+                             'numeric range, "column=value1,value2" for a set of values, or '
+                             '"box=lower_lat:upper_lat,lower_long:upper_long" for a bounding box, or '
+                             '"near=lat,long,radius_km" for a distance from a point')
+    parser.add_argument('--nearest', metavar='LAT,LONG,COUNT',
+                        help='keep only the COUNT meteorites closest to a point, closest first')
+    parser.add_argument('--output-format', choices=Meteorite_Filter.all_output_format_options, default='terminal',
+                        help='where to send the filtered meteorites (default: terminal)')
+    parser.add_argument('--limit', type=int, metavar='N',
+                        help='print only the first N results of a "console table" (default: all of them)')
+    parser.add_argument('--page', type=int, nargs='?', const=0, metavar='ROWS',
+                        help='pause a "console table" after every ROWS results, or after every screen when ROWS is '
+                             'left out')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream each file line by line straight to the output instead of loading it into memory')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes used to parse each data file, or to load shards at once '
+                             '(default: 1)')
+    parser.add_argument('--backend', choices=backend_options, default='python',
+                        help='how filters and statistics are worked out: "numpy" uses whole-column NumPy arrays, '
+                             '"auto" uses NumPy when it is installed, and both fall back to "python" without it')
+    parser.add_argument('--statistics', action='store_true',
+                        help='print the count, mass totals and year and recclass histograms of each result')
+    parser.add_argument('--group-by', choices=group_by_options,
+                        help='output the count and total mass of the results in each group instead of the results')
+    parser.add_argument('--serve', action='store_true',
+                        help='keep --file loaded and answer JSON filter requests over a local socket until stopped')
+    parser.add_argument('--host', default='127.0.0.1', help='address the server listens on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8390, help='TCP port the server listens on (default: 8390)')
+    parser.add_argument('--socket', metavar='PATH', help='listen on a Unix socket at PATH instead of a TCP port')
+    parser.add_argument('--reload-interval', type=float, default=1.0,
+                        help='seconds between checks of the served file for changes (default: 1)')
+    parser.add_argument('--result-cache-entries', type=int, default=128,
+                        help='number of recent filter results kept in memory to answer repeated filters, 0 turns the '
+                             'result cache off (default: 128)')
+    parser.add_argument('--result-cache-mb', type=float, default=256,
+                        help='most memory in MB the result cache may use (default: 256)')
+    parser.add_argument('--profile', action='store_true',
+                        help='print the time, rows and peak memory of every stage of the run when it finishes. '
+                             'Measuring memory slows the run down')
+    parser.add_argument('--profile-json', metavar='FILE',
+                        help='write the profile of every stage to a JSON file, turning on --profile')
+    parser.add_argument('--profile-cprofile', action='store_true',
+                        help='also run every stage under cProfile and list the functions it spent the most time in, '
+                             'turning on --profile')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always parse data files from text instead of using the parsed cache saved next to them')
+    return parser
+
+
+def create_result_cache_from_arguments(arguments):
+    """returns a Result_Cache with the limits given on the command line, or None if it has been turned off"""
+    if arguments.result_cache_entries <= 0:
+        return None
+    return Result_Cache(arguments.result_cache_entries, int(arguments.result_cache_mb * (1 << 20)))
+
+
+def run_meteorite_filter_from_arguments(arguments):
+    """Runs the filter from parsed command line arguments. A job file runs every job in it, otherwise the single
+    filter described by the remaining options is run as a one job batch"""
+    batch_runner = Batch_Runner(arguments.stream, arguments.workers, not arguments.no_cache, arguments.backend,
+                                arguments.statistics, arguments.group_by, create_result_cache_from_arguments(arguments),
+                                arguments.limit, arguments.page)
+    if arguments.jobs is not None:
+        try:
+            jobs = read_jobs_from_file(arguments.jobs)
+        except (ValueError, OSError) as error:
+            print(f'ERROR: {error}')
+            return
+    else:
+        jobs = [{'file': arguments.file, 'parameter': arguments.parameter, 'lower_bound': arguments.lower_bound,
+                 'upper_bound': arguments.upper_bound, 'output_format': arguments.output_format,
+                 'where': arguments.where, 'nearest': arguments.nearest}]
+    completed_jobs = batch_runner.run_jobs(jobs)
+    print(f'{completed_jobs} of {len(jobs)} jobs completed')
+
+
+def run_query_server_from_arguments(arguments):
+    """Serves the data file given on the command line until the server is interrupted"""
+    result_cache = create_result_cache_from_arguments(arguments)
+    if result_cache is None:
+        # the server always has a result cache, so turning it off means keeping no results in it
+        result_cache = Result_Cache(0)
+    query_server = Query_Server(arguments.file, arguments.host, arguments.port, arguments.socket,
+                                arguments.reload_interval, arguments.workers, not arguments.no_cache, arguments.backend,
+                                result_cache)
+    try:
+        asyncio.run(query_server.serve_forever())
+    except KeyboardInterrupt:
+        print(f'Server stopped after {query_server.request_count} requests')
+
+
+def main(argument_list=None):
+    """Starts the program. With no command line arguments the user is prompted for every setting"""
+    parser = create_argument_parser()
+    arguments = parser.parse_args(argument_list)
+    stage_profiler = None
+    if arguments.profile or arguments.profile_json or arguments.profile_cprofile:
+        stage_profiler = Stage_Profiler(use_cprofile=arguments.profile_cprofile).start()
+    try:
+        run_main_from_arguments(parser, arguments)
+    finally:
+        if stage_profiler is not None:
+            stage_profiler.stop()
+            stage_profiler.print_summary()
+            if arguments.profile_json:
+                stage_profiler.write_json(arguments.profile_json)
+                print(f'Profile written to "{arguments.profile_json}"')
+
+
+def run_main_from_arguments(parser, arguments):
+    """runs the server, the command line filter or the interactive prompts depending on the arguments given"""
+    if arguments.serve:
+        if arguments.file is None or not is_file_name(arguments.file):
+            parser.error('--serve needs a --file that can be opened')
+        run_query_server_from_arguments(arguments)
+    elif arguments.jobs is None and arguments.file is None:
+        print(welcome_message)
+        run_meteorite_filter_from_user_input()
+    else:
+        run_meteorite_filter_from_arguments(arguments)
+    print(exit_message)
+
+
+if __name__ == '__main__':
+    main()
 
 
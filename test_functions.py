@@ -1,10 +1,51 @@
+import asyncio
+import json
 import os
+import threading
+import time
+import xml.etree.ElementTree
+import zipfile
 from io import StringIO
 
 import pytest
+from Batch_Runner import *
+from Incremental_Loader import *
 from Meteorite_Filter import *
+from Query_Server import *
+from Stage_Profiler import *
+from Xlsx_Writer import *
+from benchmark import *
 from utility_functions import *
 
+# two meteorites with every column filled in except States and Counties, for tests that only need a small data file
+sample_lines = ['A\t1\tValid\tL5\t10\tFell\t1901\t0\t0\t"(0.0, 0.0)"\t\t\n',
+                'B\t2\tValid\tH5\t30\tFell\t1909\t1\t1\t"(1.0, 1.0)"\t\t\n']
+
+
+def write_data_file(folder, lines, file_name='meteorites.txt'):
+    """writes a data file holding the table header and then each of the lines into folder, returning its path"""
+    data_file = folder / file_name
+    data_file.write_text(Meteorite_Filter.table_header + '\n' + ''.join(lines))
+    return data_file
+
+
+def create_test_filter(data_file, **settings):
+    """returns a Meteorite_Filter that reads data_file without asking for it, with any other attributes of the filter
+    set from settings"""
+    test_filter = Meteorite_Filter()
+    test_filter.file_name = str(data_file)
+    test_filter.file_mode = 'r'
+    for attribute_name, value in settings.items():
+        setattr(test_filter, attribute_name, value)
+    return test_filter
+
+
+def load_test_filter(data_file, **settings):
+    """returns a filter from create_test_filter() that has already loaded data_file into its meteorite_table"""
+    test_filter = create_test_filter(data_file, **settings)
+    test_filter.create_meteorite_list()
+    return test_filter
+
 
 def test_is_file_name():
     """This tests the is_file_name function within the utility_functions module. A boolean is returned based on an
@@ -93,4 +134,792 @@ def test_request_output_format(monkeypatch, capfd):
                        '2. write to a text file\n'
                        '3. write to an excel file\n'
                        '4. Quit\n'
-                       f'>>ERROR: "{test_input}" is not a valid menu option\n')
\ No newline at end of file
+                       f'>>ERROR: "{test_input}" is not a valid menu option\n')
+
+
+def test_meteorite_table_round_trip():
+    """testing that a Meteorite_Table gives back the same attribute lists as Meteorite objects built from the same
+    lines, including rows with missing mass, year, coordinates, States and Counties"""
+    test_lines = ['Aachen\t1\tValid\tL5\t21\tFell\t1880\t50.775\t6.08333\t"(50.775, 6.08333)"\t\t\n',
+                  'Allegan\t2276\tValid\tH5\t32000\tFell\t1899\t42.53333\t-85.88333\t"(42.53333, -85.88333)"\t50\t429\n',
+                  'Northwest Africa 1\t17\tValid\tL6\t\tFound\t\t\t\t\t\t\n',
+                  'Odd\t3\tValid\tL5\t0.15\tFell\t2001\t0\t0\t"(1.0, 2.0)"\t\t']
+    test_table = Meteorite_Table()
+    for line in test_lines:
+        test_table.add_meteorite_from_string(line)
+    assert len(test_table) == len(test_lines)
+    for index in range(len(test_lines)):
+        meteorite = Meteorite.from_string(test_lines[index])
+        assert test_table.get_attribute_list(index) == meteorite.attribute_list
+        assert test_table.get_mass(index) == meteorite.mass
+        assert test_table.get_year(index) == meteorite.year
+    assert test_table.rec_classes.values == [None, 'L5', 'H5', 'L6']
+
+
+def test_number_text_round_trip(tmp_path):
+    """testing that numbers written differently from how their values would be written back, such as '720.0' or
+    '0.00001', come back out of a table as the same text, after being copied, selected and saved to a columnar file"""
+    test_lines = ['A\t1\tValid\tL5\t720.0\tFell\t0990\t0.00001\t-5.50\t"(0.00001, -5.50)"\t\t\n',
+                  'B\t2\tValid\tL5\t21\tFell\t1880\t50.775\t6.08333\t"(50.775, 6.08333)"\t\t\n',
+                  'C\t+3\tValid\tL5\t1e-05\tFell\t1900\t\t7.0\t\t\t\n']
+    test_table = Meteorite_Table()
+    test_table.add_meteorites_from_lines(test_lines)
+    expected_lists = [split_line(line) for line in test_lines]
+    assert [test_table.get_attribute_list(index) for index in range(3)] == expected_lists
+    assert test_table.get_mass(0) == 720.0 and test_table.get_year(0) == 990
+    assert 1 not in test_table.number_overrides
+    single_table = Meteorite_Table()
+    for line in test_lines:
+        single_table.add_meteorite_from_string(line)
+    single_table.extend(test_table.select_rows([2, 0]))
+    write_meteorite_table(single_table, str(tmp_path / 'numbers.metcol'))
+    saved_table = read_meteorite_table(str(tmp_path / 'numbers.metcol'))
+    assert [saved_table.get_attribute_list(index) for index in range(5)] == \
+           expected_lists + [expected_lists[2], expected_lists[0]]
+
+
+def test_meteorite_record():
+    """testing that a Meteorite is an immutable record with no __dict__ that keeps its strings, and that a meteorite
+    built from a list only turns its numbers and GeoLocation into floats when they are asked for"""
+    meteorite = Meteorite.from_string('Aachen\t1\tValid\tL5\t21\tFell\t1880\t\t\t"(50.775, 6.08333)"\t\t\n')
+    assert not hasattr(meteorite, '__dict__')
+    assert [getattr(meteorite, field_name) for field_name in field_names] == \
+           ['Aachen', '1', 'Valid', 'L5', 21.0, 'Fell', 1880, None, None, '"(50.775, 6.08333)"', None, None]
+    assert meteorite.attribute_list == list(meteorite) and meteorite[4] == '21'
+    assert meteorite.get_coordinates() == (50.775, 6.08333)
+    assert Meteorite(['A', '2', 'Valid', 'L5', None, 'Fell', None, '1.5', '-2', None, None, None]).get_coordinates() \
+           == (1.5, -2.0)
+    assert Meteorite().get_coordinates() is None and Meteorite().mass is None
+    with pytest.raises(AttributeError):
+        meteorite.mass = 5
+    with pytest.raises(AttributeError):
+        meteorite.attribute_list = []
+    with pytest.raises(ValueError):
+        Meteorite.from_string('B\t2\tValid\tL5\tten\tFell\t1880\t\t\t\t\t\n')
+    unread_meteorite = Meteorite(['B', '2', 'Valid', 'L5', 'ten', 'Fell', '1880', None, None, None, None, None])
+    assert unread_meteorite.year == 1880
+    with pytest.raises(ValueError):
+        unread_meteorite.mass
+    meteorite_table = Meteorite_Table()
+    meteorite_table.add_meteorites_from_lines(['Aachen\t1\tValid\tL5\t21\tFell\t1880\t50.775\t6.08333\t\t\t\n'])
+    table_meteorite = meteorite_table.get_meteorite(0)
+    assert table_meteorite == Meteorite(list(table_meteorite))
+    assert (table_meteorite.mass, table_meteorite.year, table_meteorite.rec_lat, table_meteorite.rec_long) == \
+           (21.0, 1880, 50.775, 6.08333)
+
+
+def test_filter_meteorite_table(tmp_path):
+    """testing that filtering runs against the columnar table and skips meteorites with missing values"""
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1900\t\t\t\t\t\n',
+                                           'B\t2\tValid\tL5\t\tFell\t1950\t\t\t\t\t\n',
+                                           'C\t3\tValid\tH5\t30\tFound\t\t\t\t\t\t\n',
+                                           'D\t4\tValid\tH6\t40\tFound\t2000\t\t\t\t\t\n'])
+    test_filter = load_test_filter(data_file, filtering_parameter='mass', lower_bound=10, upper_bound=40)
+    test_filter.filter_meteorite_list()
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['A', 'C']
+    test_filter.filtered_list = []
+    test_filter.filtering_parameter = 'year'
+    test_filter.lower_bound = 1900
+    test_filter.upper_bound = 2001
+    test_filter.filter_meteorite_list()
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['A', 'B', 'D']
+
+
+def test_sorted_index_range_query():
+    """testing that a Sorted_Index answers [lower_bound, upper_bound) queries in table order and keeps missing values
+    out of every range"""
+    test_table = Meteorite_Table()
+    for mass in ['50', None, '10', '30', '10', None, '70']:
+        test_table.add_meteorite_from_list(['name', '1', 'Valid', 'L5', mass, 'Fell', None])
+    test_table.build_sorted_indexes()
+    mass_index = test_table.get_sorted_index('mass')
+    assert list(mass_index.missing_rows) == [1, 5]
+    assert mass_index.range_query(10, 50) == [2, 3, 4]
+    assert mass_index.range_query(10.5, 70.5) == [0, 3, 6]
+    assert mass_index.range_query(80, 90) == []
+    assert mass_index.range_query(50, 10) == []
+    assert mass_index.count_range(0, 100) == 5
+    assert list(test_table.get_sorted_index('year').missing_rows) == list(range(7))
+
+
+def test_batch_runner_loads_each_file_once(tmp_path, capfd):
+    """testing that jobs read from JSON and CSV job files run without prompts, that a data file shared by many jobs
+    is only loaded once, and that an invalid job is skipped with an error message"""
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1900\t\t\t\t\t\n',
+                                           'B\t2\tValid\tL5\t20\tFell\t1950\t\t\t\t\t\n'])
+    json_job_file = tmp_path / 'jobs.json'
+    json_job_file.write_text(json.dumps({'jobs': [
+        {'file': str(data_file), 'parameter': 'mass', 'lower_bound': 0, 'upper_bound': 15, 'output_format': 'terminal'},
+        {'file': str(data_file), 'parameter': 'year', 'lower_bound': 1940, 'upper_bound': 1960,
+         'output_format': 'terminal'}]}))
+    csv_job_file = tmp_path / 'jobs.csv'
+    csv_job_file.write_text('file,parameter,lower_bound,upper_bound,output_format\n'
+                            f'{data_file},mass,0,100,terminal\n'
+                            f'{data_file},weight,0,100,terminal\n')
+    jobs = read_jobs_from_file(str(json_job_file)) + read_jobs_from_file(str(csv_job_file))
+    batch_runner = Batch_Runner()
+    assert batch_runner.run_jobs(jobs) == 3
+    assert len(batch_runner.loaded_tables) == 1
+    out, err = capfd.readouterr()
+    assert out.count('\nA ') == 2
+    assert out.count('\nB ') == 2
+    assert 'ERROR: job 4 skipped: "weight" is not a valid filtering parameter' in out
+    bad_jobs = [{'file': str(data_file), 'parameter': 'mass', 'lower_bound': 0, 'upper_bound': 'inf',
+                 'output_format': 'console table', 'limit': 'inf'},
+                {'file': str(data_file), 'parameter': 'mass', 'lower_bound': 'nan', 'upper_bound': 100,
+                 'output_format': 'terminal'},
+                {'file': str(data_file), 'nearest': '1,2,inf', 'output_format': 'terminal'},
+                {'file': str(data_file), 'parameter': 'mass', 'lower_bound': 15, 'upper_bound': 'inf',
+                 'output_format': 'terminal'}]
+    assert batch_runner.run_jobs(bad_jobs) == 1
+    out, err = capfd.readouterr()
+    assert 'ERROR: job 1 skipped: "inf" is not a valid limit' in out
+    assert 'ERROR: job 2 skipped: "nan" and "100" must both be numbers' in out
+    assert 'ERROR: job 3 skipped: "1,2,inf" is not a latitude, longitude and count' in out
+    assert out.count('\nB ') == 1
+    assert batch_runner.run_jobs([5, {'file': str(data_file), 'nearest': 5, 'output_format': 'terminal'},
+                                  {'file': str(data_file), 'where': 7, 'output_format': 'terminal'},
+                                  {'file': 3, 'parameter': 'mass', 'lower_bound': [], 'upper_bound': 1,
+                                   'output_format': 'terminal'}]) == 0
+    out, err = capfd.readouterr()
+    assert 'ERROR: job 1 skipped: a job must be an object of job fields' in out
+    assert 'ERROR: job 2 skipped: nearest must be text or a list of a latitude, longitude and count' in out
+    assert 'ERROR: job 3 skipped: where must be text or a list of conditions' in out
+    assert 'ERROR: job 4 skipped: file must be text' in out
+    bad_json_file = tmp_path / 'bad_jobs.json'
+    bad_json_file.write_text('[{"file": ')
+    with pytest.raises(ValueError):
+        read_jobs_from_file(str(bad_json_file))
+    bad_json_file.write_text('5')
+    with pytest.raises(ValueError):
+        read_jobs_from_file(str(bad_json_file))
+
+
+def test_stream_meteorite_list_matches_filtered_output(tmp_path, capfd):
+    """testing that streaming a file straight to the console prints exactly what filtering a loaded table prints"""
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1900\t\t\t\t\t\n',
+                                           'B\t2\tValid\tL5\t\tFell\t1950\t\t\t\t\t\n',
+                                           'C\t3\tValid\tH5\t30\tFound\t\t1.5\t2\t"(1.5, 2.0)"\t\t\n'])
+    test_filter = create_test_filter(data_file, filtering_parameter='mass', lower_bound=0, upper_bound=100,
+                                     output_format='terminal')
+    test_filter.stream_meteorite_list()
+    streamed_out, err = capfd.readouterr()
+    test_filter.create_meteorite_list()
+    test_filter.filter_meteorite_list()
+    test_filter.output_meteorite_list()
+    filtered_out, err = capfd.readouterr()
+    assert streamed_out == filtered_out
+    assert 'A ' in streamed_out and 'C ' in streamed_out and 'B ' not in streamed_out
+
+
+def test_parallel_loader_matches_sequential_loader(tmp_path):
+    """testing that chunk boundaries skip the header and land on line breaks, and that loading with several worker
+    processes builds the same table as the sequential loader"""
+    lines = [f'M{number}\t{number}\tValid\tL{number % 3}\t{number * 1.5}\tFell\t{1900 + number}\t\t\t\t\t\n'
+             for number in range(40)]
+    data_file = write_data_file(tmp_path, lines)
+    chunks = find_chunk_boundaries(str(data_file), 3)
+    assert len(chunks) == 3
+    assert chunks[0][0] == len(Meteorite_Filter.table_header) + 1
+    assert chunks[-1][1] == os.path.getsize(data_file)
+    file_bytes = data_file.read_bytes()
+    for start, end in chunks:
+        assert file_bytes[start - 1:start] == b'\n'
+    sequential_filter = load_test_filter(data_file)
+    parallel_filter = load_test_filter(data_file, worker_count=3, use_cache=False)
+    assert len(parallel_filter.meteorite_table) == len(lines)
+    for index in range(len(lines)):
+        assert parallel_filter.meteorite_table.get_attribute_list(index) == \
+               sequential_filter.meteorite_table.get_attribute_list(index)
+    assert parallel_filter.meteorite_table.get_sorted_index('mass').range_query(3, 30) == list(range(2, 20))
+
+
+def test_catalog_cache_is_used_until_source_changes(tmp_path):
+    """testing that a second load of an unchanged file comes from the cache, and that changing the file stops the
+    cache from being used"""
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1900\t1.5\t2\t"(1.5, 2.0)"\t\t\n',
+                                           'B\t2\tValid\tL5\t\tFell\t1950\t\t\t\t12\t\n'])
+    first_filter = load_test_filter(data_file)
+    assert os.path.exists(get_cache_file_name(str(data_file)))
+    cached_table = load_cached_meteorite_table(str(data_file))
+    assert cached_table is not None
+    for index in range(2):
+        assert cached_table.get_attribute_list(index) == first_filter.meteorite_table.get_attribute_list(index)
+    assert cached_table.get_sorted_index('year').range_query(1900, 1951) == [0, 1]
+    with open(data_file, 'a') as appended_file:
+        appended_file.write('C\t3\tValid\tH5\t30\tFound\t2000\t\t\t\t\t\n')
+    assert load_cached_meteorite_table(str(data_file)) is None
+    second_filter = load_test_filter(data_file)
+    assert len(second_filter.meteorite_table) == 3
+    assert len(load_cached_meteorite_table(str(data_file))) == 3
+
+
+def test_xlsx_writer_rolls_over_to_new_sheets(tmp_path, monkeypatch):
+    """testing that the streaming xlsx writer writes numeric cells for numeric columns, leaves None cells empty and
+    carries on in a new worksheet, with its own header row, once a worksheet is full"""
+    monkeypatch.setattr('Xlsx_Writer.max_rows_per_sheet', 3)
+    xlsx_file = tmp_path / 'output.xlsx'
+    with Xlsx_Writer(str(xlsx_file), 'data', ['name', 'mass (g)'], [1], batch_size=2) as xlsx_writer:
+        assert xlsx_writer.write_rows([['A & B', '21'], ['C', None], ['D', 'x'], ['E', '-0.5'], ['F', '7']]) == 5
+    with zipfile.ZipFile(xlsx_file) as xlsx_zip:
+        first_sheet = xlsx_zip.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        second_sheet = xlsx_zip.read('xl/worksheets/sheet2.xml').decode('utf-8')
+        third_sheet = xlsx_zip.read('xl/worksheets/sheet3.xml').decode('utf-8')
+        workbook = xlsx_zip.read('xl/workbook.xml').decode('utf-8')
+    assert '<t>A &amp; B</t>' in first_sheet and '<c r="B2"><v>21.0</v></c>' in first_sheet
+    assert '<row r="3"><c r="A3" t="inlineStr"><is><t>C</t></is></c></row>' in first_sheet
+    assert '<t>mass (g)</t>' in second_sheet and '<t>x</t>' in second_sheet and '<v>-0.5</v>' in second_sheet
+    assert '<v>7.0</v>' in third_sheet
+    assert 'name="data"' in workbook and 'name="data3"' in workbook
+
+
+def test_xlsx_writer_leaves_out_characters_xml_does_not_allow(tmp_path):
+    """testing that control characters XML 1.0 does not allow are left out of text cells, so the sheet can still be
+    parsed, while tabs and newlines are kept"""
+    xlsx_file = tmp_path / 'output.xlsx'
+    with Xlsx_Writer(str(xlsx_file), 'data', ['name', 'mass (g)'], [1]) as xlsx_writer:
+        xlsx_writer.write_rows([['A\x00B\x01\x0b\x0c\x1fC', '1'], ['D\tE\nF\ufffe', '\x02']])
+    with zipfile.ZipFile(xlsx_file) as xlsx_zip:
+        sheet = xml.etree.ElementTree.fromstring(xlsx_zip.read('xl/worksheets/sheet1.xml'))
+    texts = [text.text for text in sheet.iter('{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t')]
+    assert texts == ['name', 'mass (g)', 'ABC', 'D\tE\nF']
+
+
+def test_text_file_output_reads_back_for_another_filter(tmp_path, monkeypatch):
+    """testing that the text file output has the exact table header, no stray 'None' or trailing tabs, and can be
+    read back in as the data file for another run of the filter"""
+    monkeypatch.chdir(tmp_path)
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1900\t1.5\t2\t"(1.5, 2.0)"\t\t\n',
+                                           'B\t2\tValid\tL5\t\tFell\t1950\t\t\t\t12\t7\n',
+                                           'C\t3\tValid\tH5\t30\tFound\t\t\t\t\t\t\n'])
+    first_filter = load_test_filter(data_file, filtering_parameter='year', lower_bound=1900, upper_bound=2000)
+    first_filter.create_text_file(first_filter.meteorite_table.get_meteorite(index) for index in range(3))
+    output_file_names = [name for name in os.listdir(tmp_path) if name != 'meteorites.txt' and name.endswith('.txt')]
+    assert len(output_file_names) == 1
+    assert (tmp_path / output_file_names[0]).read_text() == data_file.read_text()
+    second_filter = load_test_filter(output_file_names[0], filtering_parameter='year', lower_bound=1900,
+                                     upper_bound=2000)
+    second_filter.filter_meteorite_list()
+    assert [meteorite.attribute_list for meteorite in second_filter.filtered_list] == \
+           [first_filter.meteorite_table.get_attribute_list(index) for index in range(2)]
+
+
+def test_meteorite_query_combines_predicates(tmp_path):
+    """testing that a query matches only rows meeting every condition, starts from its most selective predicate and
+    gives the same answer when used while streaming"""
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1900\t10\t175\t"(10.0, 175.0)"\t\t\n',
+                                           'B\t2\tValid\tH5\t20\tFell\t1950\t10\t-175\t"(10.0, -175.0)"\t\t\n',
+                                           'C\t3\tValid\tL5\t30\tFound\t1960\t-10\t0\t"(-10.0, 0.0)"\t\t\n',
+                                           'D\t4\tValid\tL6\t\tFell\t1970\t10\t0\t"(10.0, 0.0)"\t\t\n',
+                                           'E\t5\tRelict\tL5\t50\tFell\t1980\t\t\t\t\t\n'])
+    test_filter = load_test_filter(data_file)
+    test_table = test_filter.meteorite_table
+    query = Meteorite_Query([parse_predicate('recclass=L5,H5'), parse_predicate('mass=0:100'),
+                             parse_predicate('fall=Fell')])
+    assert query.run(test_table) == [0, 1, 4]
+    query.add_predicate(parse_predicate('box=0:20,170:-170'))
+    assert query.run(test_table) == [0, 1]
+    assert isinstance(query.order_predicates(test_table)[0], Bounding_Box_Predicate)
+    assert Meteorite_Query([parse_predicate('nametype=Relict'), parse_predicate('year=1900:')]).run(test_table) == [4]
+    assert Meteorite_Query([parse_predicate('recclass=L4')]).run(test_table) == []
+    test_filter.query = query
+    test_filter.filter_meteorite_list()
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['A', 'B']
+    assert [meteorite.name for meteorite in test_filter.stream_filtered_meteorites()] == ['A', 'B']
+    with pytest.raises(ValueError):
+        parse_predicate('colour=red')
+    with pytest.raises(ValueError):
+        Range_Predicate('recclass', 1, 2)
+
+
+def test_spatial_queries(tmp_path):
+    """testing radius, nearest neighbour and bounding box searches through Meteorite_Filter, including searches that
+    cross the 180th meridian and rows that have no coordinates"""
+    data_file = write_data_file(tmp_path, ['Home\t1\tValid\tL5\t10\tFell\t1900\t0\t0\t"(0.0, 0.0)"\t\t\n',
+                                           'East\t2\tValid\tH5\t20\tFell\t1950\t0\t1\t"(0.0, 1.0)"\t\t\n',
+                                           'Far\t3\tValid\tL5\t30\tFound\t1960\t45\t90\t"(45.0, 90.0)"\t\t\n',
+                                           'Dateline\t4\tValid\tL6\t40\tFell\t1970\t0\t179.5\t"(0.0, 179.5)"\t\t\n',
+                                           'Across\t5\tValid\tL6\t50\tFell\t1980\t0\t-179.5\t"(0.0, -179.5)"\t\t\n',
+                                           'Nowhere\t6\tValid\tL5\t60\tFell\t1990\t\t\t\t\t\n'])
+    test_filter = load_test_filter(data_file)
+    test_filter.filter_by_radius(0, 0.2, 120)
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['Home', 'East']
+    test_filter.filtered_list = []
+    test_filter.filter_by_radius(0, 179.9, 100)
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['Dateline', 'Across']
+    test_filter.filtered_list = []
+    test_filter.filter_nearest(1, 0.9, 3)
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['East', 'Home', 'Far']
+    test_filter.filtered_list = []
+    test_filter.query = Meteorite_Query([parse_predicate('recclass=L6')])
+    test_filter.nearest = (0, -1, 1)
+    test_filter.filter_meteorite_list()
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['Across']
+    test_filter.filtered_list = []
+    test_filter.filter_by_bounding_box(-1, 1, 179, -179)
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['Dateline', 'Across']
+    test_filter.filtered_list = []
+    test_filter.filter_by_bounding_box(float('-inf'), float('inf'), -10, 10)
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['Home', 'East']
+    test_filter.filtered_list = []
+    test_filter.filter_by_bounding_box(-1e12, 1e12, 170, float('-inf'))
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['Dateline']
+    assert Meteorite_Query([parse_predicate('near=0,0,200')]).run(test_filter.meteorite_table) == [0, 1]
+    assert haversine_distances(0, 0, [0], [1])[0] == pytest.approx(111.195, abs=0.01)
+
+
+def test_filter_backends(tmp_path, monkeypatch):
+    """testing that the python and numpy backends give the same rows and statistics, and that asking for the numpy
+    backend without NumPy installed falls back to the python backend"""
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1901\t0\t0\t"(0.0, 0.0)"\t\t\n',
+                                           'B\t2\tValid\tH5\t30\tFell\t1909\t1\t1\t"(1.0, 1.0)"\t\t\n',
+                                           'C\t3\tValid\tL5\t\tFound\t1955\t2\t2\t"(2.0, 2.0)"\t\t\n',
+                                           'D\t4\tValid\tL5\t50\tFell\t\t3\t3\t"(3.0, 3.0)"\t\t\n'])
+    test_filter = load_test_filter(data_file, use_cache=False, filtering_parameter='mass', lower_bound=10,
+                                   upper_bound=50)
+    test_filter.filter_meteorite_list()
+    assert [meteorite.name for meteorite in test_filter.filtered_list] == ['A', 'B']
+    assert test_filter.filtered_rows == [0, 1]
+    statistics = Python_Backend(test_filter.meteorite_table).summarize([0, 1, 2, 3])
+    assert statistics['count'] == 4
+    assert statistics['mass_count'] == 3
+    assert statistics['mass_sum'] == 90
+    assert statistics['mass_median'] == 30
+    assert statistics['year_histogram'] == {1900: 2, 1950: 1}
+    assert statistics['recclass_histogram'] == {'H5': 1, 'L5': 3}
+    monkeypatch.setattr('Filter_Backend.numpy', None)
+    assert isinstance(create_filter_backend(test_filter.meteorite_table, 'numpy'), Python_Backend)
+    monkeypatch.undo()
+    pytest.importorskip('numpy')
+    numpy_backend = create_filter_backend(test_filter.meteorite_table, 'numpy')
+    assert isinstance(numpy_backend, Numpy_Backend)
+    for parameter, lower_bound, upper_bound in [('mass', 10, 50), ('year', 1900, 2000), ('reclat', 0, 3)]:
+        assert numpy_backend.filter_rows(parameter, lower_bound, upper_bound) == \
+            test_filter.meteorite_table.get_sorted_index(parameter).range_query(lower_bound, upper_bound)
+    assert numpy_backend.summarize([0, 1, 2, 3]) == statistics
+    # a second backend for the same table shares its arrays, and they are copied again once a row is appended
+    assert create_filter_backend(test_filter.meteorite_table, 'numpy').columns['mass'] is numpy_backend.columns['mass']
+    test_filter.meteorite_table.add_meteorite_from_string('E\t5\tValid\tL5\t40\tFell\t1990\t\t\t\t\t\n')
+    assert create_filter_backend(test_filter.meteorite_table, 'numpy').filter_rows('mass', 10, 50) == [0, 1, 4]
+
+
+def test_group_summary(tmp_path):
+    """testing that summaries from the table and from streamed meteorites match, and that missing values and
+    masses are counted the way Group_Summary describes"""
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1901\t0\t0\t"(0.0, 0.0)"\t\t\n',
+                                           'B\t2\tValid\tH5\t30.5\tFell\t1909\t1\t1\t"(1.0, 1.0)"\t\t\n',
+                                           'C\t3\tValid\tL5\t\tFound\t1955\t2\t2\t"(2.0, 2.0)"\t\t\n',
+                                           'D\t4\tValid\t\t50\tFell\t\t3\t3\t"(3.0, 3.0)"\t\t\n'])
+    test_filter = load_test_filter(data_file, use_cache=False, query=Meteorite_Query([parse_predicate('id=0:10')]))
+    test_filter.filter_meteorite_list()
+    test_filter.group_by = 'recclass'
+    assert test_filter.create_group_summary().get_rows() == [['H5', 1, 30.5], ['L5', 2, 10.0], ['', 1, 50.0]]
+    test_filter.group_by = 'decade'
+    assert test_filter.create_group_summary().get_header() == ['decade', 'count', 'total mass (g)']
+    assert test_filter.create_group_summary().get_rows() == [[1900, 2, 40.5], [1950, 1, 0.0], ['', 1, 50.0]]
+    for group_by in group_by_options:
+        test_filter.group_by = group_by
+        assert test_filter.create_group_summary().get_rows() == \
+            test_filter.create_group_summary(test_filter.stream_filtered_meteorites()).get_rows()
+    with pytest.raises(ValueError):
+        Group_Summary('name')
+
+
+def test_query_server(tmp_path):
+    """testing that the query server answers concurrent requests from memory and reloads its data file when it
+    changes"""
+    data_file = write_data_file(tmp_path, sample_lines)
+
+    async def run_requests():
+        query_server = Query_Server(str(data_file), reload_interval=0.05, use_cache=False)
+        await query_server.start()
+        try:
+            request = {'parameter': 'mass', 'lower_bound': 0, 'upper_bound': 100}
+            responses = await asyncio.gather(*[send_request(request, port=query_server.port) for index in range(3)])
+            assert [response['count'] for response in responses] == [2, 2, 2]
+            assert responses[0]['rows'][1][:2] == ['B', '2']
+            assert responses[0]['latency_ms'] >= 0
+            response = await send_request({'parameter': 'mass', 'output_format': 'terminal'}, port=query_server.port)
+            assert not response['ok']
+            response = await send_request({'nearest': 5, 'where': 7}, port=query_server.port)
+            assert not response['ok'] and 'must be text' in response['error']
+            with open(data_file, 'a') as meteorite_file:
+                meteorite_file.write('C\t3\tValid\tL6\t50\tFound\t1955\t2\t2\t"(2.0, 2.0)"\t\t\n')
+            for attempt in range(100):
+                if query_server.reload_count:
+                    break
+                await asyncio.sleep(0.05)
+            response = await send_request(dict(request, group_by='recclass'), port=query_server.port)
+            assert response['rows'] == [['H5', 1, 30.0], ['L5', 1, 10.0], ['L6', 1, 50.0]]
+            statistics = await send_request({'command': 'stats'}, port=query_server.port)
+            assert statistics['requests'] == 6
+            assert statistics['meteorites'] == 3
+        finally:
+            await query_server.stop()
+
+    asyncio.run(run_requests())
+
+
+def test_query_server_concurrent_requests(tmp_path):
+    """testing that many requests filtering a freshly loaded table at the same time all get the same rows, since
+    every index is built before the first request, and that the shared result cache stays consistent"""
+    data_file = write_data_file(tmp_path, (
+        f'M{number}\t{number}\tValid\tL{number % 4}\t{number}\tFell\t{1900 + number % 100}\t{number % 90}\t'
+        f'{number % 180}\t"({number % 90}.0, {number % 180}.0)"\t\t\n' for number in range(4000)))
+
+    async def run_requests():
+        query_server = Query_Server(str(data_file), reload_interval=60, use_cache=False)
+        await query_server.start()
+        try:
+            meteorite_table = query_server.batch_runner.loaded_tables[query_server.table_key]
+            assert meteorite_table.rec_classes.rows_by_code is not None and meteorite_table.spatial_index is not None
+            requests = [{'where': ['recclass=L2']}, {'parameter': 'mass', 'lower_bound': 0, 'upper_bound': 2000}]
+            responses = await asyncio.gather(*[send_request(requests[index % 2], port=query_server.port)
+                                               for index in range(16)])
+            assert [response['count'] for response in responses] == [1000, 2000] * 8
+        finally:
+            await query_server.stop()
+        statistics = query_server.batch_runner.result_cache.get_statistics()
+        assert statistics['hits'] + statistics['misses'] == 8 and statistics['entries'] == 1
+
+    asyncio.run(run_requests())
+
+
+def test_incremental_loader(tmp_path):
+    """testing that appended lines are added to the table and its indexes in place, and that a file that has been
+    rewritten or truncated is loaded again from the start"""
+    lines = sample_lines + ['C\t3\tValid\tL6\t20\tFound\t1955\t2\t2\t"(2.0, 2.0)"\t\t\n',
+                            'D\t4\tValid\tL5\t\tFound\t1990\t3\t3\t"(3.0, 3.0)"\t\t\n']
+    data_file = write_data_file(tmp_path, lines[:2])
+    incremental_loader = Incremental_Loader(str(data_file))
+    meteorite_table = incremental_loader.load()
+    assert meteorite_table.get_sorted_index('mass').range_query(0, 100) == [0, 1]
+    assert incremental_loader.update() == 0
+    with open(data_file, 'a') as meteorite_file:
+        meteorite_file.writelines(lines[2:])
+    assert incremental_loader.update() == 2
+    assert incremental_loader.meteorite_table is meteorite_table
+    assert incremental_loader.full_load_count == 1
+    mass_index = meteorite_table.sorted_indexes['mass']
+    assert list(mass_index.row_indices) == [0, 2, 1] and list(mass_index.missing_rows) == [3]
+    assert meteorite_table.get_sorted_index('year').range_query(1950, 2000) == [2, 3]
+    assert load_cached_meteorite_table(str(data_file)).get_attribute_list(3) == meteorite_table.get_attribute_list(3)
+    write_data_file(tmp_path, lines[3:])
+    assert incremental_loader.update() is None
+    assert incremental_loader.full_load_count == 2
+    assert incremental_loader.meteorite_table.names == ['D']
+
+
+def test_incremental_loader_blocks(tmp_path, monkeypatch, capfd):
+    """testing that a file read in blocks much smaller than its lines parses the same as a file read whole, with
+    malformed lines reported by their line number, and that its hash matches the one a cache records"""
+    monkeypatch.setattr('Incremental_Loader.read_block_size', 7)
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1901\t0\t0\t"(0.0, 0.0)"\t\t\n',
+                                           'B\t2\tValid\tH5\tten\tFell\t1909\t1\t1\t"(1.0, 1.0)"\t\t\n',
+                                           'C\t3\tValid\tL6\t20\tFound\t1955\t2\t2\t"(2.0, 2.0)"\t\t'])
+    for use_cache in (False, True):
+        incremental_loader = Incremental_Loader(str(data_file), use_cache)
+        assert incremental_loader.load().names == ['A', 'C']
+        assert incremental_loader.offset == data_file.stat().st_size and incremental_loader.line_count == 3
+        assert incremental_loader.file_hash.hexdigest() == get_source_identity(str(data_file))['sha256']
+    out, err = capfd.readouterr()
+    assert out.count('line 3 skipped') == 2
+    assert Incremental_Loader(str(data_file)).load().names == ['A', 'C']
+    assert 'skipped' not in capfd.readouterr().out
+
+
+def test_table_lock(tmp_path):
+    """testing that rows are only appended to a table once no reader holds its Table_Lock, and that a waiting
+    writer keeps new readers from starting"""
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1901\t\t\t\t\t\n'])
+    incremental_loader = Incremental_Loader(str(data_file), use_cache=False)
+    meteorite_table = incremental_loader.load()
+    with open(data_file, 'a') as meteorite_file:
+        meteorite_file.write('B\t2\tValid\tH5\t30\tFell\t1909\t\t\t\t\t\n')
+    table_lock = Table_Lock()
+    reader_started = threading.Event()
+
+    def read_table():
+        with table_lock.reading():
+            reader_started.set()
+
+    with table_lock.reading():
+        update_thread = threading.Thread(target=incremental_loader.update, args=(table_lock.writing(),))
+        update_thread.start()
+        while not table_lock.waiting_writer_count:
+            time.sleep(0.01)
+        reader_thread = threading.Thread(target=read_table)
+        reader_thread.start()
+        time.sleep(0.1)
+        assert len(meteorite_table) == 1 and not reader_started.is_set()
+    update_thread.join()
+    reader_thread.join()
+    assert len(meteorite_table) == 2 and reader_started.is_set()
+    assert meteorite_table.get_sorted_index('mass').range_query(0, 100) == [0, 1]
+
+
+def test_line_parser(tmp_path, capfd):
+    """testing that the fast line parser builds the same table as reading each line on its own, keeps a quoted
+    GeoLocation with a tab inside it together, reads blank trailing States and Counties and skips malformed lines
+    with their line number reported"""
+    lines = ['A\t1\tValid\tL5\t10\tFell\t1901\t0.5\t-2\t"(0.5, -2.0)"\t\t\n',
+             'B\t2\tValid\tH5\tten\tFell\t1909\t1\t1\t"(1.0, 1.0)"\t\t\n',
+             'C\t3\tValid\tL6\t20\tFound\t1955\t2\t2\t"(2.0,\t2.0)"\t6\t12\n',
+             'D\t4\tValid\tL5\t\tFound\t\t\t\t\n',
+             'E\t5\tValid\tL5\t1\tFell\t1900\t0\t0\t"(0.0, 0.0)"\t\t\t\t\n']
+    data_file = write_data_file(tmp_path, lines)
+    assert parse_line(lines[0]) == ['A', 1, 'Valid', 'L5', 10.0, 'Fell', 1901, 0.5, -2.0, '"(0.5, -2.0)"', None, None]
+    meteorite_filter = load_test_filter(data_file, use_cache=False)
+    meteorite_table = meteorite_filter.meteorite_table
+    assert meteorite_table.names == ['A', 'C', 'D']
+    assert meteorite_table.get_attribute_list(1) == ['C', '3', 'Valid', 'L6', '20', 'Found', '1955', '2', '2',
+                                                     '"(2.0,\t2.0)"', '6', '12']
+    expected_table = Meteorite_Table()
+    expected_table.add_meteorite_from_string(lines[0])
+    expected_table.add_meteorite_from_string(lines[3])
+    assert meteorite_table.get_attribute_list(0) == expected_table.get_attribute_list(0)
+    assert meteorite_table.get_attribute_list(2) == expected_table.get_attribute_list(1)
+    output = capfd.readouterr().out
+    assert 'line 3 skipped: mass (g) "ten" is not a valid number' in output
+    assert 'line 6 skipped: has 14 fields instead of 12' in output
+    parallel_table = load_meteorite_table_in_parallel(str(data_file), 2)
+    assert [parallel_table.get_attribute_list(row) for row in range(3)] == \
+           [meteorite_table.get_attribute_list(row) for row in range(3)]
+    assert 'line 6 skipped' in capfd.readouterr().out
+    assert [meteorite.name for meteorite in meteorite_filter.stream_meteorites()] == ['A', 'C', 'D']
+
+
+def test_result_cache(tmp_path, monkeypatch):
+    """testing that repeated filters and their formatted output come from the result cache, that the least recently
+    used results are evicted and that results are dropped once the data changes"""
+    data_file = write_data_file(tmp_path, sample_lines)
+    monkeypatch.chdir(tmp_path)
+    result_cache = Result_Cache(max_entries=2)
+    batch_runner = Batch_Runner(use_cache=False, result_cache=result_cache)
+    job = {'file': str(data_file), 'parameter': 'mass', 'lower_bound': '0', 'upper_bound': '20',
+           'output_format': 'text file'}
+    first_filter = batch_runner.run_job(job)
+    second_filter = batch_runner.run_job(job)
+    assert [meteorite.name for meteorite in second_filter.filtered_list] == ['A']
+    assert result_cache.get_statistics()['hits'] == 1
+    assert result_cache.get_statistics()['output_hits'] == 1
+    output_files = [output_file for output_file in tmp_path.glob('*.txt') if output_file != data_file]
+    assert len(output_files) == 2 and output_files[0].read_text() == output_files[1].read_text()
+    for upper_bound in ['25', '35']:
+        batch_runner.run_job(dict(job, upper_bound=upper_bound, output_format='terminal'))
+    assert len(result_cache) == 2
+    assert result_cache.get_statistics()['evictions'] == 1
+    with open(data_file, 'a') as meteorite_file:
+        meteorite_file.write('C\t3\tValid\tL6\t5\tFound\t1955\t2\t2\t"(2.0, 2.0)"\t\t\n')
+    batch_runner.loaded_tables = {}
+    third_filter = batch_runner.run_job(dict(job, upper_bound='35'))
+    assert [meteorite.name for meteorite in third_filter.filtered_list] == ['A', 'B', 'C']
+    assert len(result_cache) == 1
+    # without a result cache each line is written as soon as it is made instead of being joined into one string
+    third_filter.result_cache = None
+    output_file = StringIO()
+
+    def create_lines():
+        yield 'A\n'
+        assert output_file.getvalue() == 'A\n'
+        yield 'B\n'
+
+    third_filter.write_formatted_output(output_file, 'text file', create_lines)
+    assert output_file.getvalue() == 'A\nB\n'
+
+
+def test_benchmark(tmp_path):
+    """testing that synthetic data files keep every meteorite unique, that every stage is measured at every scale,
+    that memory is only measured up to the memory scale limit and that slower stages are reported as regressions"""
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t1050\tFell\t1901\t0\t0\t"(0.0, 0.0)"\t\t\n',
+                                           'B\t2\tValid\tH5\t\tFell\t1999\t1\t1\t"(1.0, 1.0)"\t\t\n'])
+    synthetic_file = tmp_path / 'synthetic.txt'
+    assert generate_synthetic_catalog(str(data_file), 3, str(synthetic_file)) == 6
+    synthetic_rows = [clean_data_list(line) for line in synthetic_file.read_text().splitlines()[1:]]
+    assert [row[0] for row in synthetic_rows] == ['A', 'B', 'A 1', 'B 1', 'A 2', 'B 2']
+    assert len({row[1] for row in synthetic_rows}) == 6
+    assert synthetic_rows[3][4] is None and 945 <= float(synthetic_rows[2][4]) <= 1155
+    results = run_benchmarks(str(data_file), [1, 2], str(tmp_path), memory_scale_limit=1)
+    assert [(result['scale'], result['stage']) for result in results] == \
+        [(scale, stage_name) for scale in [1, 2] for stage_name in stage_names]
+    assert all(result['rows_per_second'] > 0 for result in results)
+    assert all(result['peak_memory_bytes'] > 0 for result in results if result['scale'] == 1)
+    assert not any('peak_memory_bytes' in result for result in results if result['scale'] == 2)
+    assert results[0]['rows'] == 2 and results[len(stage_names)]['rows'] == 4
+    assert [result['rows'] for result in results[1:len(stage_names)]] == [1] * (len(stage_names) - 1)
+    slower_results = [dict(result, rows_per_second=result['rows_per_second'] / 2) for result in results[:1]]
+    assert find_regressions(results, results) == []
+    assert len(find_regressions(slower_results, results)) == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['meteorites.txt', 'synthetic.txt']
+
+
+def test_stage_profiler(tmp_path):
+    """testing that every stage of a run is recorded while a profiler is active, with parsing nested inside of
+    loading, and that nothing is recorded once it has been stopped"""
+    data_file = write_data_file(tmp_path, sample_lines)
+    assert profile_stage('load') is disabled_stage
+    stage_profiler = Stage_Profiler(use_cprofile=True).start()
+    try:
+        test_filter = load_test_filter(data_file, use_cache=False, output_format='terminal', filtering_parameter='mass',
+                                       lower_bound=0, upper_bound=20)
+        test_filter.filter_meteorite_list()
+        test_filter.output_meteorite_list()
+    finally:
+        stage_profiler.stop()
+    results = stage_profiler.get_results()
+    assert [(result['stage'], result['depth'], result['rows']) for result in results] == \
+        [('load', 0, 2), ('parse', 1, 2), ('filter', 0, 1), ('terminal', 0, 1)]
+    assert all(result['seconds'] >= 0 and result['peak_memory_bytes'] >= 0 for result in results)
+    assert results[0]['peak_memory_bytes'] >= results[1]['peak_memory_bytes']
+    assert 'top_functions' in results[0] and 'top_functions' not in results[1]
+    stage_profiler.write_json(str(tmp_path / 'profile.json'))
+    assert json.loads((tmp_path / 'profile.json').read_text())['stages'][2]['stage'] == 'filter'
+    assert profile_stage('filter') is disabled_stage
+    with profile_stage('filter') as stage:
+        stage.rows = 5
+    assert disabled_stage.rows is None
+
+
+def test_stage_profiler_threads():
+    """testing that stages run by several threads at once each nest only inside the stages of their own thread and
+    keep the rows they set"""
+    both_stages_open = threading.Barrier(2)
+
+    def run_stages(rows):
+        with profile_stage('request') as outer_stage:
+            both_stages_open.wait()
+            with profile_stage('filter') as inner_stage:
+                inner_stage.rows = rows
+            outer_stage.rows = rows
+
+    stage_profiler = Stage_Profiler(use_cprofile=True).start()
+    try:
+        threads = [threading.Thread(target=run_stages, args=(rows,)) for rows in (1, 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        stage_profiler.stop()
+    results = stage_profiler.get_results()
+    assert sorted((result['stage'], result['depth'], result['rows']) for result in results) == \
+        [('filter', 1, 1), ('filter', 1, 2), ('request', 0, 1), ('request', 0, 2)]
+    assert sum('top_functions' in result for result in results) <= 1
+    assert stage_profiler.open_stage_count == 0
+
+
+def test_console_renderer(tmp_path, capfd):
+    """testing that the console table sizes its columns from the data, stops after its limit, pages with a running
+    count of the rows shown and stops paging when the user quits"""
+    header = ['name', 'mass (g)', 'GeoLocation']
+    rows = [['A', '10', None], ['Bbbbbbbbbb', None, '"(1.0, 2.0)"'], ['C', '3000', 'x' * 50]]
+    output_file = StringIO()
+    assert Console_Renderer(header, output_file).render(rows, len(rows)) == 3
+    lines = output_file.getvalue().split('\n')
+    assert lines[0] == 'name        mass (g)  GeoLocation'
+    assert lines[2] == 'A           10        '
+    assert lines[4] == 'C           3000      ' + 'x' * max_column_width
+    assert lines[5] == '3 rows'
+    output_file = StringIO()
+    assert Console_Renderer(header, output_file, limit=2).render(iter(rows)) == 2
+    assert output_file.getvalue().endswith('Bbbbbbbbbb  ' + ' ' * 10 + '"(1.0, 2.0)"\nfirst 2 rows shown\n')
+    prompts = []
+
+    def quit_at_second_page(prompt):
+        prompts.append(prompt)
+        return 'q' if len(prompts) > 1 else ''
+
+    console_renderer = Console_Renderer(header, StringIO(), page_size=1, input_function=quit_at_second_page)
+    assert console_renderer.render(rows, len(rows)) == 2
+    assert prompts == [page_prompt.format(shown='1', total=' of 3'), page_prompt.format(shown='2', total=' of 3')]
+    data_file = write_data_file(tmp_path, sample_lines)
+    batch_runner = Batch_Runner(use_cache=False, console_limit=5)
+    batch_runner.run_job({'file': str(data_file), 'parameter': 'mass', 'lower_bound': 0, 'upper_bound': 100,
+                          'output_format': 'console table', 'limit': '1'})
+    out = capfd.readouterr().out
+    assert out.count('Valid') == 1 and out.endswith('1 of 2 rows shown\n')
+    with pytest.raises(ValueError):
+        batch_runner.create_filter_from_job({'file': str(data_file), 'parameter': 'mass', 'lower_bound': 0,
+                                             'upper_bound': 100, 'output_format': 'console table', 'limit': '1.5'})
+
+
+def test_columnar_file_output(tmp_path, monkeypatch, capfd):
+    """testing that filtered results written as a columnar file keep their values, load straight back as a data file
+    for another filter and can have single columns read from them"""
+    monkeypatch.chdir(tmp_path)
+    data_file = write_data_file(tmp_path, ['A\t1\tValid\tL5\t10\tFell\t1901\t0.5\t-2\t"(0.5, -2.0)"\t\t\n',
+                                           'B\t2\tValid\tH5\t30\tFell\t1909\t1\t1\t"(1.0, 1.0)"\t\t\n',
+                                           'C\t3\tRelict\tL6\t\tFound\t1955\t\t\tsomewhere\t6\t12\n',
+                                           'D\t4\tValid\tL5\t20\tFound\t1990\t3\t3\t"(3.0, 3.0)"\t\t\n'])
+    batch_runner = Batch_Runner(use_cache=False)
+    first_filter = batch_runner.run_job({'file': str(data_file), 'parameter': 'year', 'lower_bound': 1905,
+                                         'upper_bound': 2000, 'output_format': 'columnar file'})
+    columnar_file = next(tmp_path.glob(f'*{columnar_file_extension}'))
+    assert is_columnar_file(str(columnar_file))
+    columns = read_columns(str(columnar_file), ['mass (g)', 'recclass', 'GeoLocation', 'name'])
+    assert list(columns) == ['mass (g)', 'recclass', 'GeoLocation', 'name']
+    assert columns['mass (g)'][0] == 30.0 and isnan(columns['mass (g)'][1]) and columns['mass (g)'][2] == 20.0
+    assert columns['recclass'] == ['H5', 'L6', 'L5'] and columns['name'] == ['B', 'C', 'D']
+    assert columns['GeoLocation'] == ['"(1.0, 1.0)"', 'somewhere', '"(3.0, 3.0)"']
+    with pytest.raises(ValueError):
+        read_columns(str(columnar_file), ['weight'])
+    second_filter = batch_runner.run_job({'file': str(columnar_file), 'parameter': 'mass', 'lower_bound': 0,
+                                          'upper_bound': 100, 'output_format': 'terminal'})
+    assert [meteorite.attribute_list for meteorite in second_filter.filtered_list] == \
+           [first_filter.meteorite_table.get_attribute_list(index) for index in [1, 3]]
+    assert second_filter.meteorite_table.get_attribute_list(1) == first_filter.meteorite_table.get_attribute_list(2)
+    streaming_runner = Batch_Runner(streaming=True)
+    streaming_runner.run_job({'file': str(columnar_file), 'parameter': 'mass', 'lower_bound': 0, 'upper_bound': 100,
+                              'output_format': 'text file'})
+    text_files = list(tmp_path.glob('2*.txt'))
+    assert len(text_files) == 1 and text_files[0].read_text().count('Valid') == 2
+
+
+def test_sharded_catalog(tmp_path, monkeypatch):
+    """testing that a folder or glob of shards loads as one catalog without duplicate ids, and that shards whose year
+    range can not match are skipped while their ids still decide which duplicates are dropped"""
+    monkeypatch.chdir(tmp_path)
+    shard_folder = tmp_path / 'shards'
+    shard_folder.mkdir()
+    write_data_file(shard_folder, ['A\t1\tValid\tL5\t10\tFell\t1850\t0\t0\t"(0.0, 0.0)"\t\t\n'], 'a.txt')
+    write_data_file(shard_folder, ['A again\t1\tValid\tL5\t10\tFell\t1950\t0\t0\t"(0.0, 0.0)"\t\t\n',
+                                   'B\t2\tValid\tH5\t20\tFell\t1960\t1\t1\t"(1.0, 1.0)"\t\t\n',
+                                   'No id\t\tValid\tH5\t5\tFell\t1970\t\t\t\t\t\n'], 'b.txt')
+    (shard_folder / 'notes.md').write_text('not a shard')
+    assert is_shard_file_name(str(shard_folder)) and not is_shard_file_name(str(tmp_path / 'missing' / '*.txt'))
+    write_data_file(tmp_path, [], 'landings[a].txt')
+    assert not is_shard_pattern(str(tmp_path / 'landings[a].txt'))
+    assert is_shard_pattern(str(tmp_path / 'landings[b].txt'))
+    sharded_catalog = Sharded_Catalog(str(shard_folder), worker_count=2)
+    assert [os.path.basename(shard_file) for shard_file in sharded_catalog.shard_files] == ['a.txt', 'b.txt']
+    assert sharded_catalog.load().names == ['A', 'B', 'No id'] and sharded_catalog.skipped_shard_count == 0
+    bounds = get_filter_bounds('year', 1900, 2000)
+    fresh_catalog = Sharded_Catalog(str(shard_folder))
+    assert [shard_state[0] for shard_state in fresh_catalog.select_shards(bounds, fresh_catalog.get_shard_states())] \
+           == [str(shard_folder / 'b.txt')]
+    bounded_catalog = Sharded_Catalog(str(shard_folder))
+    bounded_table = bounded_catalog.load(bounds)
+    assert bounded_table.names == ['B', 'No id'] and bounded_catalog.load(bounds) is bounded_table
+    full_table = bounded_catalog.load()
+    assert full_table.names == ['A', 'B', 'No id'] and len(bounded_catalog.merged_tables) == 2
+    result_cache = Result_Cache()
+    result_cache.put_rows(create_result_key(bounded_table, 'year', 1900, 2000), [0, 1])
+    result_cache.put_rows(create_result_key(full_table, 'year', 1900, 2000), [1, 2])
+    assert list(result_cache.get_rows(create_result_key(bounded_table, 'year', 1900, 2000))) == [0, 1]
+    batch_runner = Batch_Runner()
+    year_filter = batch_runner.run_job({'file': str(shard_folder / '*.txt'), 'parameter': 'year', 'lower_bound': 1900,
+                                        'upper_bound': 2000, 'output_format': 'columnar file'})
+    assert year_filter.sharded_catalog.skipped_shard_count == 1
+    assert year_filter.meteorite_table.names == ['B', 'No id']
+    mass_filter = batch_runner.run_job({'file': str(shard_folder / '*.txt'), 'parameter': 'mass', 'lower_bound': 0,
+                                        'upper_bound': 15, 'output_format': 'text file'})
+    assert mass_filter.sharded_catalog is year_filter.sharded_catalog
+    assert [meteorite.name for meteorite in mass_filter.filtered_list] == ['A', 'No id']
+    year_filter.query = Meteorite_Query([Range_Predicate('year', 1955, 2100)])
+    assert [meteorite.name for meteorite in year_filter.stream_filtered_meteorites()] == ['B', 'No id']
+    with open(shard_folder / 'b.txt', 'a') as shard_file:
+        shard_file.write('C\t3\tValid\tH5\t1\tFell\t1990\t\t\t\t\t\n')
+    changed_table = bounded_catalog.load()
+    assert changed_table.names == ['A', 'B', 'No id', 'C'] and len(bounded_catalog.merged_tables) == 1
+    result_cache.put_rows(create_result_key(changed_table, 'year', 1900, 2000), [1, 2, 3])
+    assert len(result_cache) == 1
@@ -54,6 +54,14 @@ def clean_data_list(data_str):
     return clean_data
 
 
+def create_data_string(data_list):
+    """ this function does the opposite of clean_data_list() - it joins a list of data back into a single tab
+    separated line ending in a newline character. None elements are written as empty strings so that the line reads
+    back into the same list """
+
+    return '\t'.join('' if element is None else str(element) for element in data_list) + '\n'
+
+
 def is_file_name(input_string):
     """checks if a string is the name of a file that can be opened. Returns true if it is. Returns false if it isn't"""
     try: